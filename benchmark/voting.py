@@ -0,0 +1,163 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import cunumeric as cn
+import legateboost as lb
+from legate.core import get_legate_runtime
+
+# bytes of a fixed point gradient pair in a histogram bin
+HISTOGRAM_PAIR_BYTES = 16
+VOTE_BYTES = 4
+
+
+def node_depths(tree):
+    # depth of each node, nodes are numbered so that parents come first
+    feature = tree.feature.__array__()
+    children = tree.children.__array__()
+    depth = np.zeros(feature.size, dtype=np.int64)
+    for node in range(feature.size):
+        if feature[node] != -1:
+            depth[children[node]] = depth[node] + 1
+    return depth
+
+
+def communicated_bytes(model, tree_method, n_processors, ncols, args):
+    # payload of the histogram collectives per worker, derived from the
+    # structure of the fitted trees
+    total = 0
+    for tree in model.models_:
+        num_outputs = tree.leaf_value.shape[1]
+        feature_bytes = args.nbins * num_outputs * HISTOGRAM_PAIR_BYTES
+        depth = node_depths(tree)
+        # every node above the maximum depth was evaluated as a leaf
+        for d in range(args.max_depth):
+            evaluated = int(np.sum(depth == d))
+            if evaluated == 0:
+                break
+            # one child of each split is subtracted from its parent
+            built = 1 if d == 0 else evaluated // 2
+            if tree_method == "allreduce":
+                total += built * ncols * feature_bytes
+            elif tree_method == "voting":
+                selected = min(2 * args.voting_top_k, ncols)
+                total += evaluated * n_processors * args.voting_top_k * VOTE_BYTES
+                total += evaluated * selected * feature_bytes
+    return total
+
+
+def train_model(X, y, tree_method, args):
+    base_models = (
+        lb.models.Tree(
+            max_depth=args.max_depth,
+            n_bins=args.nbins,
+            tree_method=tree_method,
+            voting_top_k=args.voting_top_k,
+        ),
+    )
+    model = lb.LBClassifier(base_models=base_models, n_estimators=args.niters).fit(X, y)
+    # force legate to realise result
+    x = model.predict(X[0:2])[0]  # noqa
+    return model
+
+
+def benchmark(args):
+    tree_methods = args.tree_methods.split(",")
+
+    m = get_legate_runtime().machine
+    n_processors = len(m)
+    gen = cn.random.Generator(cn.random.XORWOW(seed=42))
+    X = gen.normal(size=(args.nrows, args.ncols), dtype=cn.float32)
+    # the label depends on a few of the features
+    y = (X[:, : args.ninformative].sum(axis=1) > 0).astype(cn.int32)
+    # dry run
+    n_dry_run = X.shape[0] // 10
+    for tree_method in tree_methods:
+        train_model(X[0:n_dry_run], y[0:n_dry_run], tree_method, args)
+    dfs = []
+    for tree_method in tree_methods:
+        for j in range(args.repeats):
+            start = time.time()
+            model = train_model(X, y, tree_method, args)
+            elapsed = time.time() - start
+            accuracy = float((model.predict(X) == y).mean())
+            dfs.append(
+                pd.DataFrame(
+                    {
+                        "n_processors": n_processors,
+                        "time": elapsed,
+                        "bytes": communicated_bytes(
+                            model, tree_method, n_processors, args.ncols, args
+                        ),
+                        "train_accuracy": accuracy,
+                        "iteration": j,
+                        "tree_method": tree_method,
+                        "nrows": args.nrows,
+                        "ncols": args.ncols,
+                    },
+                    index=[0],
+                )
+            )
+            del model
+    df = pd.concat(dfs, ignore_index=True)
+    print(df)
+    df.to_csv(args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare histogram communication and training time of"
+        " voting parallel trees against all-reduce."
+    )
+    parser.add_argument(
+        "--nrows", type=int, default=100000, help="Number of dataset rows"
+    )
+    parser.add_argument(
+        "--ncols", type=int, default=1000, help="Number of dataset columns"
+    )
+    parser.add_argument(
+        "--ninformative",
+        type=int,
+        default=10,
+        help="Number of columns the label depends on",
+    )
+    parser.add_argument(
+        "--niters", type=int, default=20, help="Number of boosting iterations"
+    )
+    parser.add_argument("--max_depth", type=int, default=6, help="Tree depth")
+    parser.add_argument(
+        "--nbins", type=int, default=256, help="Number of split candidates"
+    )
+    parser.add_argument(
+        "--voting_top_k",
+        type=int,
+        default=20,
+        help="Number of features each worker votes for",
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=1,
+        help="Number of times to repeat the experiment.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="voting.csv",
+        help="Output file name.",
+    )
+    parser.add_argument(
+        "--tree_methods",
+        type=str,
+        default="allreduce,voting",
+        help="Comma separated list of tree methods."
+        " Can be 'allreduce', 'voting'.",
+    )
+    args = parser.parse_args()
+    benchmark(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ from .metrics import (
     GammaLLMetric,
     QuantileMetric,
 )
+from .numpy_predictor import NumpyPredictor
 from .objectives import (
     BaseObjective,
     ExponentialObjective,
@@ -25,7 +25,7 @@ def check_sample_weight(sample_weight: Any, n: int) -> cn.ndarray:
     return sample_weight.astype(cn.float64)
 
 
-def check_array(x: Any) -> cn.ndarray:
+def check_array(x: Any, allow_nan: bool = False) -> cn.ndarray:
     if sp.issparse(x):
         raise ValueError("Sparse matrix not allowed.")
 
@@ -48,15 +48,18 @@ def check_array(x: Any) -> cn.ndarray:
         raise ValueError("Complex data not supported.")
     # note: taking sum first then checking finiteness uses less memory
     if np.issubdtype(x.dtype, np.floating) and not cn.isfinite(x.sum()):
-        raise ValueError("Input contains NaN or inf")
+        if not allow_nan:
+            raise ValueError("Input contains NaN or inf")
+        if cn.isinf(x).any():
+            raise ValueError("Input contains inf")
 
     x = cn.array(x, copy=False)
 
     return x
 
 
-def check_X_y(X: Any, y: Any = None) -> Any:
-    X = check_array(X)
+def check_X_y(X: Any, y: Any = None, allow_nan: bool = False) -> Any:
+    X = check_array(X, allow_nan=allow_nan)
     if len(X.shape) != 2:
         raise ValueError("X must be 2-dimensional. Reshape your data.")
     if X.shape[0] == 0:
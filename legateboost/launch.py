@@ -0,0 +1,394 @@
+"""Chooses the number of processors and the row tiling of native tasks.
+
+Every native task splits the rows of its inputs into one tile per
+processor. More processors divide the work, but each costs a task launch
+and a share of every collective, so small batches run fastest on few
+processors and wide data, whose histograms are expensive to reduce, on
+fewer processors than tall data.
+
+By default every processor is used as long as each has at least 10 rows.
+Calling :func:`calibrate` times a few trees on this machine and switches to
+a :class:`CostModelPlanner` that uses the fitted costs.
+"""
+
+import json
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+import cunumeric as cn
+from legate.core import TaskTarget, get_legate_runtime
+
+# bytes of a fixed point gradient pair
+_GRADIENT_PAIR_BYTES = 16
+
+
+@dataclass
+class LaunchPlan:
+    """How a native task is launched.
+
+    Attributes:
+        num_procs: The number of processors, one tile of rows each.
+        rows_per_tile: The number of rows of each tile.
+    """
+
+    num_procs: int
+    rows_per_tile: int
+
+    @classmethod
+    def from_procs(cls, num_procs: int, n_rows: int) -> "LaunchPlan":
+        num_procs = max(1, min(num_procs, n_rows))
+        return cls(num_procs, max(1, int(math.ceil(n_rows / num_procs))))
+
+
+class LaunchPlanner(ABC):
+    """Base class for choosing how native tasks are launched.
+
+    Subclasses implement :meth:`plan`. The active planner is set with
+    :func:`set_launch_planner`.
+    """
+
+    @abstractmethod
+    def plan(
+        self,
+        task: str,
+        n_rows: int,
+        n_features: int,
+        n_outputs: int,
+        depth: int,
+        n_bins: int = 256,
+    ) -> LaunchPlan:
+        """Chooses the launch of a task.
+
+        Parameters
+        ----------
+        task :
+            One of "build_tree", "update_tree", "predict" or "objective".
+        n_rows :
+            The number of rows of the input.
+        n_features :
+            The number of features of the input.
+        n_outputs :
+            The number of outputs of the tree.
+        depth :
+            The (maximum) depth of the tree.
+        n_bins :
+            The number of histogram bins per feature.
+
+        Returns
+        -------
+        LaunchPlan
+        """
+        pass
+
+
+class MinRowsPlanner(LaunchPlanner):
+    """Uses every processor as long as each has at least
+    ``min_rows_per_worker`` rows.
+
+    Parameters
+    ----------
+    min_rows_per_worker :
+        The smallest number of rows worth a processor.
+    max_procs :
+        If set, the largest number of processors to use.
+    """
+
+    def __init__(self, min_rows_per_worker: int = 10, max_procs: Optional[int] = None):
+        self.min_rows_per_worker = min_rows_per_worker
+        self.max_procs = max_procs
+
+    def plan(
+        self,
+        task: str,
+        n_rows: int,
+        n_features: int,
+        n_outputs: int,
+        depth: int,
+        n_bins: int = 256,
+    ) -> LaunchPlan:
+        num_procs = _available_procs()
+        if self.max_procs is not None:
+            num_procs = min(num_procs, self.max_procs)
+        num_procs = min(num_procs, int(math.ceil(n_rows / self.min_rows_per_worker)))
+        return LaunchPlan.from_procs(num_procs, n_rows)
+
+
+@dataclass
+class CostModel:
+    """Predicted run time of native tasks.
+
+    Attributes:
+        cell_time: Seconds of work per row, feature, output and level on one
+            processor.
+        launch_time: Seconds added by each extra processor per launch or
+            collective.
+        byte_time: Seconds per byte all-reduced.
+    """
+
+    cell_time: float
+    launch_time: float
+    byte_time: float
+
+    def time(
+        self,
+        task: str,
+        num_procs: int,
+        n_rows: int,
+        n_features: int,
+        n_outputs: int,
+        depth: int,
+        n_bins: int = 256,
+    ) -> float:
+        depth = max(depth, 1)
+        if task == "build_tree":
+            cells = n_rows * n_features * n_outputs * depth
+            # the maximum gradient, the root sums and a histogram per level
+            rounds = depth + 2
+            # one child of each split is built, the other subtracted
+            built_nodes = sum(max(1, 2 ** (d - 1)) for d in range(depth))
+            histogram_bytes = n_features * n_bins * n_outputs * _GRADIENT_PAIR_BYTES
+            reduced = built_nodes * histogram_bytes
+        elif task == "update_tree":
+            cells = n_rows * n_outputs * depth
+            rounds = 2
+            reduced = (2 ** (depth + 1) - 1) * n_outputs * _GRADIENT_PAIR_BYTES
+        elif task == "predict":
+            cells = n_rows * (depth + n_outputs)
+            rounds = 0
+            reduced = 0
+        elif task == "objective":
+            cells = n_rows * n_outputs
+            # the sums that preround the gradient and hessian
+            rounds = 1
+            reduced = n_outputs * _GRADIENT_PAIR_BYTES
+        else:
+            raise ValueError(f"Unknown task {task}")
+        extra_procs = num_procs - 1
+        # a ring all-reduce sends almost twice the reduced bytes
+        communication = 2.0 * reduced * extra_procs / num_procs * self.byte_time
+        return (
+            cells * self.cell_time / num_procs
+            + extra_procs * (rounds + 1) * self.launch_time
+            + communication
+        )
+
+
+class CostModelPlanner(LaunchPlanner):
+    """Chooses the number of processors with the lowest predicted run time.
+
+    The cost model is fitted by :func:`calibrate`, which caches it on disk
+    per machine configuration so later processes reuse it. This planner
+    never calibrates by itself.
+
+    Parameters
+    ----------
+    cost_model :
+        If set, used instead of the cached cost model.
+    cache_path :
+        File caching calibrated cost models. Defaults to
+        ``launch_cost_model.json`` in ``$LEGATEBOOST_CACHE_DIR`` or
+        ``~/.cache/legateboost``.
+    """
+
+    def __init__(
+        self,
+        cost_model: Optional[CostModel] = None,
+        cache_path: Optional[str] = None,
+    ) -> None:
+        self.cost_model = cost_model
+        self.cache_path = cache_path
+
+    def _cache_file(self) -> Path:
+        if self.cache_path is not None:
+            return Path(self.cache_path)
+        cache_dir = os.environ.get(
+            "LEGATEBOOST_CACHE_DIR", os.path.join("~", ".cache", "legateboost")
+        )
+        return Path(cache_dir).expanduser() / "launch_cost_model.json"
+
+    def _read_cache(self) -> Dict[str, Dict[str, float]]:
+        try:
+            cache = json.loads(self._cache_file().read_text())
+        except (OSError, ValueError):
+            return {}
+        return cache if isinstance(cache, dict) else {}
+
+    def _load(self) -> CostModel:
+        try:
+            return CostModel(**self._read_cache()[_machine_key()])
+        except (KeyError, TypeError):
+            raise ValueError(
+                "No cost model is cached for this machine, call "
+                "legateboost.launch.calibrate() first."
+            )
+
+    def _save(self, cost_model: CostModel) -> None:
+        cache = self._read_cache()
+        cache[_machine_key()] = asdict(cost_model)
+        path = self._cache_file()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(cache, indent=2))
+        except OSError:
+            # an unwritable cache only means calibrating again next time
+            pass
+
+    def plan(
+        self,
+        task: str,
+        n_rows: int,
+        n_features: int,
+        n_outputs: int,
+        depth: int,
+        n_bins: int = 256,
+    ) -> LaunchPlan:
+        available = min(_available_procs(), max(n_rows, 1))
+        if available == 1:
+            return LaunchPlan.from_procs(1, n_rows)
+        if self.cost_model is None:
+            self.cost_model = self._load()
+        cost_model = self.cost_model
+        num_procs = min(
+            range(1, available + 1),
+            key=lambda p: cost_model.time(
+                task, p, n_rows, n_features, n_outputs, depth, n_bins
+            ),
+        )
+        return LaunchPlan.from_procs(num_procs, n_rows)
+
+
+def _available_procs() -> int:
+    return len(get_legate_runtime().machine)
+
+
+def _machine_key() -> str:
+    machine = get_legate_runtime().machine
+    return "gpu{}-omp{}-cpu{}".format(
+        machine.count(TaskTarget.GPU),
+        machine.count(TaskTarget.OMP),
+        machine.count(TaskTarget.CPU),
+    )
+
+
+def calibrate(repeats: int = 3, cache_path: Optional[str] = None) -> CostModel:
+    """Fits a cost model of this machine and plans later tasks with it.
+
+    Small trees are timed on one and on every available processor. The
+    fitted model is cached, see :class:`CostModelPlanner`, and a planner
+    using it is set with :func:`set_launch_planner`. On a single processor
+    nothing is timed and the default planner is kept.
+
+    Parameters
+    ----------
+    repeats :
+        Each tree is timed this many times and the fastest is used.
+    cache_path :
+        File caching calibrated cost models, see :class:`CostModelPlanner`.
+
+    Returns
+    -------
+    CostModel
+        The fitted cost model, or a model of the work only on a single
+        processor.
+    """
+    num_procs = _available_procs()
+    if num_procs == 1:
+        # every plan uses the single processor
+        return CostModel(1.0, 0.0, 0.0)
+    cost_model = _fit_cost_model(num_procs, repeats)
+    planner = CostModelPlanner(cost_model, cache_path)
+    planner._save(cost_model)
+    set_launch_planner(planner)
+    return cost_model
+
+
+def _fit_cost_model(num_procs: int, repeats: int) -> CostModel:
+    # Times small trees on one and on num_procs processors. The data is
+    # sketched and quantised before, so only building the trees is timed.
+    from .models import Tree
+    from .quantile import QuantileDMatrix
+
+    rs = np.random.RandomState(0)
+    depth = 4
+    n_bins = 64
+
+    def time_fit(n_rows: int, n_features: int, procs: int) -> float:
+        X = QuantileDMatrix(cn.array(rs.random((n_rows, n_features))))
+        g = cn.array(rs.normal(size=(n_rows, 1)))
+        h = cn.ones((n_rows, 1))
+        tree = Tree(max_depth=depth, n_bins=n_bins)
+        tree.set_random_state(rs)
+        with use_launch_planner(MinRowsPlanner(1, procs)):
+            # the first fit is a warm up and quantises X, so the later fits
+            # only build the tree
+            tree.fit_dmatrix(X, g, h)
+            best = math.inf
+            for _ in range(repeats):
+                start = time.perf_counter()
+                tree.fit_dmatrix(X, g, h)
+                best = min(best, time.perf_counter() - start)
+        return best
+
+    small = (256, 4)
+    large = (2**15, 32)
+    wide = (1024, 1024)
+    small_1 = time_fit(*small, 1)
+    small_p = time_fit(*small, num_procs)
+    large_1 = time_fit(*large, 1)
+    wide_p = time_fit(*wide, num_procs)
+
+    # the extra time of the small tree on more processors is overhead
+    rounds = (depth + 3) * max(num_procs - 1, 1)
+    launch_time = max(small_p - small_1, 0.0) / rounds
+    # the extra time of the large tree is work
+    cells = CostModel(1.0, 0.0, 0.0).time("build_tree", 1, *large, 1, depth, n_bins)
+    cell_time = max(large_1 - small_1, 0.0) / cells
+    # the wide tree is dominated by reducing its histograms
+    model = CostModel(cell_time, launch_time, 0.0)
+    predicted = model.time("build_tree", num_procs, *wide, 1, depth, n_bins)
+    per_byte = CostModel(0.0, 0.0, 1.0).time(
+        "build_tree", num_procs, *wide, 1, depth, n_bins
+    )
+    byte_time = max(wide_p - predicted, 0.0) / per_byte if per_byte > 0 else 0.0
+    return CostModel(cell_time, launch_time, byte_time)
+
+
+_launch_planner: LaunchPlanner = MinRowsPlanner()
+
+
+def get_launch_planner() -> LaunchPlanner:
+    """Returns the planner choosing how native tasks are launched."""
+    return _launch_planner
+
+
+def set_launch_planner(planner: LaunchPlanner) -> None:
+    """Sets the planner choosing how native tasks are launched.
+
+    Parameters
+    ----------
+    planner :
+        The new planner, e.g. a :class:`CostModelPlanner` with a fixed
+        :class:`CostModel` or a :class:`MinRowsPlanner`. :func:`calibrate`
+        sets a :class:`CostModelPlanner` fitted to this machine.
+    """
+    global _launch_planner
+    _launch_planner = planner
+
+
+@contextmanager
+def use_launch_planner(planner: LaunchPlanner) -> Iterator[None]:
+    """Temporarily sets the planner choosing how native tasks are launched."""
+    previous = get_launch_planner()
+    set_launch_planner(planner)
+    try:
+        yield
+    finally:
+        set_launch_planner(previous)
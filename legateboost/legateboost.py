@@ -1,11 +1,12 @@
 from __future__ import annotations
 
+import math
 import warnings
 from copy import deepcopy
 from typing import Any, List, Optional, Tuple, Union
 
 import numpy as np
-from sklearn.base import BaseEstimator, ClassifierMixin, RegressorMixin
+from sklearn.base import BaseEstimator, ClassifierMixin, RegressorMixin, is_classifier
 from sklearn.exceptions import DataConversionWarning
 from sklearn.utils.validation import check_is_fitted, check_random_state
 from typing_extensions import Self, TypeAlias
@@ -15,10 +16,15 @@ import cunumeric as cn
 from .input_validation import check_sample_weight, check_X_y
 from .metrics import BaseMetric, metrics
 from .models import BaseModel, Tree
-from .objectives import BaseObjective, objectives
+from .models.tree import Forest
+from .numpy_predictor import NumpyPredictor
+from .objectives import BaseObjective, native_weighted_gradient, objectives
+from .quantile import QuantileDMatrix
 from .utils import PickleCunumericMixin, preround
 
 EvalResult: TypeAlias = dict[str, dict[str, list[float]]]
+# metric values for each round, kept on the device until they are needed
+MetricHistory: TypeAlias = dict[str, dict[str, cn.ndarray]]
 
 
 class LBBase(BaseEstimator, PickleCunumericMixin):
@@ -33,6 +39,12 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         verbose: int = 0,
         random_state: Optional[np.random.RandomState] = None,
         version: str = "native",
+        early_stopping_rounds: Optional[int] = None,
+        eval_period: int = 1,
+        train_metric_sample: Optional[int] = None,
+        subsample: float = 1.0,
+        goss_top_rate: Optional[float] = None,
+        goss_other_rate: float = 0.1,
     ) -> None:
         self.n_estimators = n_estimators
         self.objective = objective
@@ -42,11 +54,18 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         self.verbose = verbose
         self.random_state = random_state
         self.version = version
+        self.early_stopping_rounds = early_stopping_rounds
+        self.eval_period = eval_period
+        self.train_metric_sample = train_metric_sample
+        self.subsample = subsample
+        self.goss_top_rate = goss_top_rate
+        self.goss_other_rate = goss_other_rate
         self.model_init_: cn.ndarray
         self.base_models = base_models
 
     def _more_tags(self) -> Any:
         return {
+            "allow_nan": self._allow_nan(),
             "_xfail_checks": {
                 "check_sample_weights_invariance": (
                     "zero sample_weight is not equivalent to removing samples"
@@ -58,6 +77,10 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
             },
         }
 
+    def _allow_nan(self) -> bool:
+        # missing values are only accepted if every base model handles them
+        return all(m.supports_missing for m in self.base_models)
+
     def _setup_metrics(self) -> list[BaseMetric]:
         iterable = (self.metric,) if not isinstance(self.metric, list) else self.metric
         metric_instances = []
@@ -75,9 +98,85 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
                 )
         return metric_instances
 
+    def _init_metric_history(
+        self, n_rounds: int, metrics: list[BaseMetric], n_eval_sets: int
+    ) -> MetricHistory:
+        # one buffer per data set and metric, with room for a value each round
+        names = ["train"] + ["eval-{}".format(i) for i in range(n_eval_sets)]
+        return {
+            name: {metric.name(): cn.zeros(n_rounds) for metric in metrics}
+            for name in names
+        }
+
+    def _check_metric_params(self) -> None:
+        if self.eval_period < 1:
+            raise ValueError("eval_period must be at least 1.")
+        if self.train_metric_sample is not None and self.train_metric_sample < 1:
+            raise ValueError("train_metric_sample must be at least 1.")
+
+    def _check_sample_params(self) -> None:
+        if not 0.0 < self.subsample <= 1.0:
+            raise ValueError("subsample must be in (0, 1].")
+        if self.goss_top_rate is None:
+            return
+        if self.subsample < 1.0:
+            raise ValueError("subsample cannot be combined with GOSS.")
+        if (
+            self.goss_top_rate <= 0.0
+            or self.goss_other_rate < 0.0
+            or self.goss_top_rate + self.goss_other_rate > 1.0
+        ):
+            raise ValueError(
+                "Expected goss_top_rate > 0, goss_other_rate >= 0 and"
+                " goss_top_rate + goss_other_rate <= 1."
+            )
+
+    def _sample_weights(self, g: cn.ndarray) -> Optional[cn.ndarray]:
+        # The weight of each row in the next model, zero for rows left out, or
+        # None if every row is used with weight one. Rows are not compacted,
+        # so the shape of the sample never depends on the data.
+        n_rows = g.shape[0]
+        if self.goss_top_rate is not None:
+            n_top = int(math.ceil(self.goss_top_rate * n_rows))
+            if n_top >= n_rows:
+                return None
+            rng = cn.random.default_rng(self.random_state_.randint(2**31))
+            score = cn.abs(g).sum(axis=1)
+            # the n_top-th largest score, kept on the device
+            k = n_rows - n_top
+            threshold = cn.partition(score, k)[k : k + 1]
+            top = score >= threshold
+            weights = top.astype(cn.float64)
+            # sample the remaining rows with the probability that gives
+            # goss_other_rate * n_rows of them in expectation, scaling them up
+            # so their gradient sums are unbiased
+            p_other = self.goss_other_rate / (1.0 - self.goss_top_rate)
+            if p_other > 0.0:
+                other = ~top & (rng.random(n_rows) < p_other)
+                weights = cn.where(other, 1.0 / p_other, weights)
+        elif self.subsample < 1.0:
+            rng = cn.random.default_rng(self.random_state_.randint(2**31))
+            weights = (rng.random(n_rows) < self.subsample).astype(cn.float64)
+        else:
+            return None
+        return weights[:, cn.newaxis]
+
+    def _is_eval_round(self, round_idx: int, n_rounds: int) -> bool:
+        return round_idx % self.eval_period == 0 or round_idx == n_rounds - 1
+
+    def _sample_train_rows(self, n_rows: int) -> Optional[cn.ndarray]:
+        # fixed subset of rows for the training metrics, None to use all rows
+        if self.train_metric_sample is None or self.train_metric_sample >= n_rows:
+            return None
+        rows = self.random_state_.choice(
+            n_rows, self.train_metric_sample, replace=False
+        )
+        return cn.array(np.sort(rows))
+
     def _compute_metrics(
         self,
         iteration: int,
+        round_idx: int,
         pred: cn.ndarray,
         eval_preds: List[cn.ndarray],
         y: cn.ndarray,
@@ -85,14 +184,11 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         metrics: list[BaseMetric],
         verbose: int,
         eval_set: List[Tuple[cn.ndarray, cn.ndarray, cn.ndarray]],
-        eval_result: EvalResult,
+        history: MetricHistory,
+        train_rows: Optional[cn.ndarray] = None,
     ) -> None:
-        # make sure dict is initialised
-        if not eval_result:
-            eval_result.update({"train": {metric.name(): [] for metric in metrics}})
-            for i, _ in enumerate(eval_preds):
-                eval_result[f"eval-{i}"] = {metric.name(): [] for metric in metrics}
-
+        # Metric values are written into the history without being read back,
+        # so that computing them does not stall the next boosting round.
         def add_metric(
             metric_pred: cn.ndarray,
             y: cn.ndarray,
@@ -100,13 +196,15 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
             metric: BaseMetric,
             name: str,
         ) -> None:
-            eval_result[name][metric.name()].append(
-                metric.metric(
-                    y, self._objective_instance.transform(metric_pred), sample_weight
-                )
+            history[name][metric.name()][round_idx] = metric.metric(
+                y, self._objective_instance.transform(metric_pred), sample_weight
             )
 
-        # add the training metrics
+        # add the training metrics, estimated from a subset of rows if given
+        if train_rows is not None:
+            pred = pred[train_rows]
+            y = y[train_rows]
+            sample_weight = sample_weight[train_rows]
         for metric in metrics:
             add_metric(pred, y, sample_weight, metric, "train")
 
@@ -128,11 +226,20 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
                 return "\t{}-{}:".format(set_name, metric_name) + f"{value: 8.4f}"
 
             msg = "[{}]".format(iteration)
-            for k, v in eval_result.items():
+            for k, v in history.items():
                 for m, values in v.items():
-                    msg += format(k, str(m), values[-1])
+                    msg += format(k, str(m), float(values[round_idx]))
             print(msg)
 
+    def _set_eval_result(
+        self, history: MetricHistory, n_rounds: int, eval_result: EvalResult
+    ) -> None:
+        # copy all values to the host at once
+        buffers = [values[:n_rounds] for v in history.values() for values in v.values()]
+        host = iter(np.asarray(cn.stack(buffers)).tolist())
+        for k, v in history.items():
+            eval_result[k] = {m: next(host) for m in v}
+
     # check the types of the eval set and add sample weight if none
     def _process_eval_set(
         self, eval_set: List[Tuple[cn.ndarray, ...]]
@@ -142,11 +249,12 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
             assert len(tuple) in [2, 3]
             if len(tuple) == 2:
                 new_eval_set.append(
-                    check_X_y(tuple[0], tuple[1]) + (cn.ones(tuple[1].shape[0]),)
+                    check_X_y(tuple[0], tuple[1], self._allow_nan())
+                    + (cn.ones(tuple[1].shape[0]),)
                 )
             else:
                 new_eval_set.append(
-                    check_X_y(tuple[0], tuple[1])
+                    check_X_y(tuple[0], tuple[1], self._allow_nan())
                     + (check_sample_weight(tuple[2], tuple[1].shape[0]),)
                 )
 
@@ -158,15 +266,27 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         pred: cn.ndarray,
         sample_weight: cn.ndarray,
         learning_rate: float,
+        preround_gradients: bool = True,
     ) -> Tuple[cn.ndarray, cn.ndarray]:
         """Computes the weighted gradient and Hessian for the given predictions
         and labels.
 
         Also applies a pre-rounding step to ensure reproducible floating
-        point summation.
+        point summation, unless preround_gradients is False because the
+        model sums the gradients exactly.
         """
         # check input dimensions are consistent
         assert y.ndim == pred.ndim == 2, (y.shape, pred.shape)
+        native = native_weighted_gradient(
+            self._objective_instance,
+            y,
+            pred,
+            sample_weight,
+            learning_rate,
+            preround_gradients,
+        )
+        if native is not None:
+            return native
         g, h = self._objective_instance.gradient(
             y, self._objective_instance.transform(pred)
         )
@@ -180,7 +300,13 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         # apply weights and learning rate
         g = g * sample_weight[:, None] * learning_rate
         # ensure hessians are not too small for numerical stability
-        h = cn.maximum(h * sample_weight[:, None], 1e-8)
+        if self._objective_instance.constant_hessian:
+            # the weights are shared by every output instead of repeated
+            h = cn.maximum(sample_weight[:, None], 1e-8)
+        else:
+            h = cn.maximum(h * sample_weight[:, None], 1e-8)
+        if not preround_gradients:
+            return g, h
         return preround(g), preround(h)
 
     def _partial_fit(
@@ -192,7 +318,7 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         eval_result: EvalResult = {},
     ) -> Self:
         # check inputs
-        X, y = check_X_y(X, y)
+        X, y = check_X_y(X, y, self._allow_nan())
         _eval_set = self._process_eval_set(eval_set)
 
         sample_weight = check_sample_weight(sample_weight, y.shape[0])
@@ -216,32 +342,62 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         # avoid appending to an existing eval result
         eval_result.clear()
 
+        if self.early_stopping_rounds is not None and not _eval_set:
+            raise ValueError("early_stopping_rounds requires an eval_set.")
+        self._check_metric_params()
+        self._check_sample_params()
+        train_rows = self._sample_train_rows(X.shape[0])
+        # early stopping follows the first metric on the last eval set
+        stop_metric = self._metrics[0]
+        best_score: Optional[float] = None
+        best_round = 0
+        history = self._init_metric_history(
+            self.n_estimators, self._metrics, len(_eval_set)
+        )
+        n_evaluated = 0
+
         # current model prediction
         train_pred = self._predict(X)
         eval_preds = [self._predict(X_eval) for X_eval, _, _ in _eval_set]
+        # features are quantised once and shared by all rounds
+        dmatrix = QuantileDMatrix(X, sample_weight)
         for i in range(self.n_estimators):
+            # build new model
+            model = deepcopy(
+                self.base_models[i % len(self.base_models)]
+            ).set_random_state(self.random_state_)
+            self.models_.append(model)
+
             # obtain gradients
+            sampled = self.goss_top_rate is not None or self.subsample < 1.0
             g, h = self._get_weighted_gradient(
-                y, train_pred, sample_weight, self.learning_rate
-            )
-
-            # build new model
-            self.models_.append(
-                deepcopy(self.base_models[i % len(self.base_models)]).set_random_state(
-                    self.random_state_
-                )
+                y,
+                train_pred,
+                sample_weight,
+                self.learning_rate,
+                model.requires_preround and not sampled,
             )
-            self.models_[-1].fit(X, g, h)
+            if sampled:
+                # rows left out of the sample get zero weight, prerounded after
+                # weighting so the weighted sums stay reproducible
+                sample = self._sample_weights(g)
+                if sample is not None:
+                    g, h = g * sample, h * sample
+                if model.requires_preround:
+                    g, h = preround(g), preround(h)
 
             # update current predictions
-            train_pred += self.models_[-1].predict(X)
-            for i, (X_eval, _, _) in enumerate(_eval_set):
-                eval_preds[i] += self.models_[-1].predict(X_eval)
+            train_pred += model.fit_predict_dmatrix(dmatrix, g, h)
+            for j, (X_eval, _, _) in enumerate(_eval_set):
+                eval_preds[j] += self.models_[-1].predict(X_eval)
 
             # evaluate our progress
             model_idx = len(self.models_) - 1
+            if not self._is_eval_round(i, self.n_estimators):
+                continue
             self._compute_metrics(
                 model_idx,
+                n_evaluated,
                 train_pred,
                 eval_preds,
                 y,
@@ -249,8 +405,33 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
                 self._metrics,
                 self.verbose,
                 _eval_set,
-                eval_result,
+                history,
+                train_rows,
             )
+            n_evaluated += 1
+
+            if self.early_stopping_rounds is not None:
+                # the only place a metric is read back during training
+                score = float(
+                    history["eval-{}".format(len(_eval_set) - 1)][stop_metric.name()][
+                        n_evaluated - 1
+                    ]
+                )
+                if (
+                    best_score is None
+                    or (stop_metric.minimize() and score < best_score)
+                    or (not stop_metric.minimize() and score > best_score)
+                ):
+                    best_score = score
+                    best_round = model_idx
+                elif model_idx - best_round >= self.early_stopping_rounds:
+                    break
+
+        self._set_eval_result(history, n_evaluated, eval_result)
+        if best_score is not None:
+            self.best_iteration_ = best_round
+            del self.models_[best_round + 1 :]
+        self._build_forest()
         return self
 
     def update(
@@ -285,7 +466,7 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         """
 
         # check inputs
-        X, y = check_X_y(X, y)
+        X, y = check_X_y(X, y, self._allow_nan())
         _eval_set = self._process_eval_set(eval_set)
 
         sample_weight = check_sample_weight(sample_weight, y.shape[0])
@@ -309,26 +490,36 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
 
         for m in self.models_:
             m.clear()
+        self._build_forest()
 
         # current model prediction
         train_pred = self._predict(X)
         eval_preds = [self._predict(X_eval) for X_eval, _, _ in _eval_set]
 
+        self._check_metric_params()
+        train_rows = self._sample_train_rows(X.shape[0])
+        history = self._init_metric_history(
+            len(self.models_), self._metrics, len(_eval_set)
+        )
+        n_evaluated = 0
         for i, m in enumerate(self.models_):
             # obtain gradients
             g, h = self._get_weighted_gradient(
-                y, train_pred, sample_weight, self.learning_rate
+                y, train_pred, sample_weight, self.learning_rate, m.requires_preround
             )
 
             m.update(X, g, h)
 
             train_pred += m.predict(X)
-            for i, (X_eval, _, _) in enumerate(_eval_set):
-                eval_preds[i] += self.models_[-1].predict(X_eval)
+            for j, (X_eval, _, _) in enumerate(_eval_set):
+                eval_preds[j] += self.models_[-1].predict(X_eval)
 
             # evaluate our progress
+            if not self._is_eval_round(i, len(self.models_)):
+                continue
             self._compute_metrics(
                 i,
+                n_evaluated,
                 train_pred,
                 eval_preds,
                 y,
@@ -336,8 +527,12 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
                 self._metrics,
                 self.verbose,
                 _eval_set,
-                eval_result,
+                history,
+                train_rows,
             )
+            n_evaluated += 1
+        self._set_eval_result(history, n_evaluated, eval_result)
+        self._build_forest()
         return self
 
     def fit(
@@ -371,6 +566,7 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         sample_weight = check_sample_weight(sample_weight, len(y))
         self.n_features_in_ = X.shape[1]
         self.models_: List[BaseModel] = []
+        self.forest_: Optional[Forest] = None
         # initialise random state if an integer was passed
         self.random_state_ = check_random_state(self.random_state)
 
@@ -393,8 +589,24 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
 
         return self._partial_fit(X, y, sample_weight, eval_set, eval_result)
 
+    def _build_forest(self) -> None:
+        # pack the trees for prediction whenever models_ changes
+        trees = [m for m in self.models_ if isinstance(m, Tree)]
+        self.forest_ = Forest(trees) if trees else None
+
+    def __getstate__(self) -> dict[str, Any]:
+        # the forest duplicates the trees, it is rebuilt when unpickled
+        state = super().__getstate__()
+        state.pop("forest_", None)
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        super().__setstate__(state)
+        if hasattr(self, "models_"):
+            self._build_forest()
+
     def _predict(self, X: cn.ndarray) -> cn.ndarray:
-        X = check_X_y(X)
+        X = check_X_y(X, allow_nan=self._allow_nan())
         check_is_fitted(self, "is_fitted_")
         if X.shape[1] != self.n_features_in_:
             raise ValueError(
@@ -403,10 +615,38 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
                 )
             )
         pred = cn.repeat(self.model_init_[cn.newaxis, :], X.shape[0], axis=0)
+        # trees are summed by a single task
+        if self.forest_ is not None:
+            pred += self.forest_.predict(X)
         for m in self.models_:
-            pred += m.predict(X)
+            if not isinstance(m, Tree):
+                pred += m.predict(X)
         return pred
 
+    def to_numpy_predictor(self) -> NumpyPredictor:
+        """Export the fitted estimator to a predictor that uses NumPy only.
+
+        Predicting through Legate launches tasks, whose overhead dominates
+        when scoring a few rows at a time. The returned predictor copies the
+        fitted models into host memory and predicts without the Legate
+        runtime.
+
+        Returns
+        -------
+        NumpyPredictor
+            A predictor with the same ``predict`` (and ``predict_proba`` for
+            classifiers) as this estimator.
+        """
+        check_is_fitted(self, "is_fitted_")
+        return NumpyPredictor(
+            self.model_init_,
+            self.models_,
+            self.forest_,
+            self._objective_instance,
+            self.n_features_in_,
+            is_classifier(self),
+        )
+
     def dump_models(self) -> str:
         check_is_fitted(self, "is_fitted_")
         text = "init={}\n".format(self.model_init_)
@@ -444,6 +684,29 @@ class LBRegressor(LBBase, RegressorMixin):
     random_state :
         Controls the randomness of the estimator. Pass an int for reproducible
         results across multiple function calls.
+    early_stopping_rounds :
+        Stop training if the first metric on the last eval set has not
+        improved for this many rounds. Models after the best round are
+        discarded. Requires an eval set.
+    eval_period :
+        Compute metrics every this many rounds, and on the last round. Each
+        list in ``eval_result`` holds one value per evaluated round. Early
+        stopping is only checked on evaluated rounds.
+    train_metric_sample :
+        If set, training metrics are computed on a random subset of this many
+        training rows, chosen once per call to ``fit``, ``partial_fit`` or
+        ``update``. Eval sets always use all rows.
+    subsample :
+        Fraction of rows randomly sampled to fit each model. Only the sampled
+        rows are passed to the model.
+    goss_top_rate :
+        If set, rows are chosen by Gradient-based One-Side Sampling (GOSS)
+        instead. The ``goss_top_rate`` fraction of rows with the largest
+        gradients is kept, together with a random ``goss_other_rate`` fraction
+        of all rows taken from the rest, whose gradients are scaled up to
+        compensate. Cannot be combined with ``subsample``.
+    goss_other_rate :
+        Fraction of rows sampled from those with small gradients by GOSS.
 
     Attributes
     ----------
@@ -453,6 +716,12 @@ class LBRegressor(LBBase, RegressorMixin):
         Whether the estimator has been fitted.
     models_ :
         list of models from each iteration.
+    forest_ :
+        The trees of ``models_`` packed for prediction, or None if there are
+        no trees.
+    best_iteration_ :
+        Index in ``models_`` of the model with the best eval metric. Only set
+        when ``early_stopping_rounds`` is used.
 
 
     See Also
@@ -480,6 +749,12 @@ class LBRegressor(LBBase, RegressorMixin):
         base_models: Tuple[BaseModel, ...] = (Tree(max_depth=3),),
         verbose: int = 0,
         random_state: Optional[np.random.RandomState] = None,
+        early_stopping_rounds: Optional[int] = None,
+        eval_period: int = 1,
+        train_metric_sample: Optional[int] = None,
+        subsample: float = 1.0,
+        goss_top_rate: Optional[float] = None,
+        goss_other_rate: float = 0.1,
     ) -> None:
         super().__init__(
             n_estimators=n_estimators,
@@ -490,6 +765,12 @@ class LBRegressor(LBBase, RegressorMixin):
             base_models=base_models,
             verbose=verbose,
             random_state=random_state,
+            early_stopping_rounds=early_stopping_rounds,
+            eval_period=eval_period,
+            train_metric_sample=train_metric_sample,
+            subsample=subsample,
+            goss_top_rate=goss_top_rate,
+            goss_other_rate=goss_other_rate,
         )
 
     def _more_tags(self) -> Any:
@@ -543,7 +824,7 @@ class LBRegressor(LBBase, RegressorMixin):
         eval_set: List[Tuple[cn.ndarray, ...]] = [],
         eval_result: EvalResult = {},
     ) -> "LBRegressor":
-        X, y = check_X_y(X, y)
+        X, y = check_X_y(X, y, self._allow_nan())
         return super().fit(X, y, sample_weight, eval_set, eval_result)
 
     def predict(self, X: cn.ndarray) -> cn.ndarray:
@@ -594,6 +875,29 @@ class LBClassifier(LBBase, ClassifierMixin):
     random_state :
         Controls the randomness of the estimator. Pass an int for reproducible output
         across multiple function calls.
+    early_stopping_rounds :
+        Stop training if the first metric on the last eval set has not
+        improved for this many rounds. Models after the best round are
+        discarded. Requires an eval set.
+    eval_period :
+        Compute metrics every this many rounds, and on the last round. Each
+        list in ``eval_result`` holds one value per evaluated round. Early
+        stopping is only checked on evaluated rounds.
+    train_metric_sample :
+        If set, training metrics are computed on a random subset of this many
+        training rows, chosen once per call to ``fit``, ``partial_fit`` or
+        ``update``. Eval sets always use all rows.
+    subsample :
+        Fraction of rows randomly sampled to fit each model. Only the sampled
+        rows are passed to the model.
+    goss_top_rate :
+        If set, rows are chosen by Gradient-based One-Side Sampling (GOSS)
+        instead. The ``goss_top_rate`` fraction of rows with the largest
+        gradients is kept, together with a random ``goss_other_rate`` fraction
+        of all rows taken from the rest, whose gradients are scaled up to
+        compensate. Cannot be combined with ``subsample``.
+    goss_other_rate :
+        Fraction of rows sampled from those with small gradients by GOSS.
 
     Attributes
     ----------
@@ -605,6 +909,12 @@ class LBClassifier(LBBase, ClassifierMixin):
         The number of classes.
     models_ :
         list of models from each iteration.
+    forest_ :
+        The trees of ``models_`` packed for prediction, or None if there are
+        no trees.
+    best_iteration_ :
+        Index in ``models_`` of the model with the best eval metric. Only set
+        when ``early_stopping_rounds`` is used.
 
     See Also
     --------
@@ -631,6 +941,12 @@ class LBClassifier(LBBase, ClassifierMixin):
         base_models: Tuple[BaseModel, ...] = (Tree(max_depth=3),),
         verbose: int = 0,
         random_state: Optional[np.random.RandomState] = None,
+        early_stopping_rounds: Optional[int] = None,
+        eval_period: int = 1,
+        train_metric_sample: Optional[int] = None,
+        subsample: float = 1.0,
+        goss_top_rate: Optional[float] = None,
+        goss_other_rate: float = 0.1,
     ) -> None:
         super().__init__(
             n_estimators=n_estimators,
@@ -641,6 +957,12 @@ class LBClassifier(LBBase, ClassifierMixin):
             base_models=base_models,
             verbose=verbose,
             random_state=random_state,
+            early_stopping_rounds=early_stopping_rounds,
+            eval_period=eval_period,
+            train_metric_sample=train_metric_sample,
+            subsample=subsample,
+            goss_top_rate=goss_top_rate,
+            goss_other_rate=goss_other_rate,
         )
 
     def partial_fit(
@@ -721,7 +1043,7 @@ class LBClassifier(LBBase, ClassifierMixin):
                 "A column-vector y was passed when a 1d array was expected.",
                 DataConversionWarning,
             )
-        X, y = check_X_y(X, y)
+        X, y = check_X_y(X, y, self._allow_nan())
 
         # Validate classifier inputs
         if y.size <= 1:
@@ -9,6 +9,16 @@ from .special import erf, loggamma
 from .utils import pick_col_by_idx, sample_average, set_col_by_idx
 
 
+def _safe_weight_sum(w: cn.ndarray) -> cn.ndarray:
+    """Sum of weights, replaced by one if it is zero so that a weighted
+    average of zero weights is zero.
+
+    Checked on the device to avoid waiting for the sum.
+    """
+    w_sum = w.sum()
+    return cn.where(w_sum == 0, 1.0, w_sum)
+
+
 class BaseMetric(ABC):
     """The base class for metrics.
 
@@ -19,7 +29,7 @@ class BaseMetric(ABC):
     one = cn.ones(1, dtype=cn.float64)
 
     @abstractmethod
-    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> float:
+    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> cn.ndarray:
         """Computes the metric between the true labels `y` and predicted labels
         `pred`, weighted by `w`.
 
@@ -30,7 +40,8 @@ class BaseMetric(ABC):
 
         Returns:
             The metric between the true labels `y` and predicted labels
-            `pred`, weighted by `w`.
+            `pred`, weighted by `w`, as a 0-d array. Returning an array rather
+            than a float lets training continue without waiting for the value.
         """
         pass
 
@@ -43,6 +54,16 @@ class BaseMetric(ABC):
         """
         pass
 
+    def minimize(self) -> bool:
+        """Returns True if lower values of the metric are better.
+
+        Used by early stopping to find the best round.
+
+        Returns:
+            Whether the metric should be minimised.
+        """
+        return True
+
     @classmethod
     def create(cls) -> Self:
         return cls()
@@ -58,12 +79,10 @@ class MSEMetric(BaseMetric):
         :class:`legateboost.objectives.SquaredErrorObjective`
     """
 
-    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> float:
+    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> cn.ndarray:
         assert w.ndim == 1
         y = y.reshape(pred.shape)
-        w_sum = w.sum()
-        if w_sum == 0:
-            return 0
+        w_sum = _safe_weight_sum(w)
 
         if y.ndim == 2:
             w = w[:, cn.newaxis]
@@ -72,7 +91,7 @@ class MSEMetric(BaseMetric):
         # per output
         mse = numerator / w_sum
         # average over outputs
-        return float(mse.mean())
+        return mse.mean()
 
     def name(self) -> str:
         return "mse"
@@ -100,11 +119,9 @@ class NormalLLMetric(BaseMetric):
         :class:`legateboost.objectives.NormalObjective`
     """  # noqa: E501
 
-    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> float:
+    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> cn.ndarray:
         y, pred = check_dist_param(y, pred)
-        w_sum = w.sum()
-        if w_sum == 0:
-            return 0
+        w_sum = _safe_weight_sum(w)
         if y.ndim == 2:
             w = w[:, cn.newaxis]
         mean = pred[:, :, 0]
@@ -116,7 +133,7 @@ class NormalLLMetric(BaseMetric):
         # ll = -0.5 * cn.log(2 * cn.pi) + 2 * log_sigma - 0.5 * (diff * diff) / var
         neg_ll = (neg_ll * w).sum(axis=0) / w_sum
         # average over output
-        return float(neg_ll.mean())
+        return neg_ll.mean()
 
     def name(self) -> str:
         return "normal_neg_ll"
@@ -127,18 +144,14 @@ class GammaLLMetric(BaseMetric):
     predicted by the model."""
 
     @override
-    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> float:
+    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> cn.ndarray:
         y, pred = check_dist_param(y, pred)
 
-        w_sum = w.sum()
-        if w_sum == 0:
-            return 0
-
         k = pred[:, :, 0]
         b = pred[:, :, 1]
         error = -(k - 1) * cn.log(y) + y / (b + 1e-6) + k * cn.log(b) + loggamma(k)
 
-        return float(sample_average(error, w))
+        return sample_average(error, w).mean()
 
     @override
     def name(self) -> str:
@@ -165,7 +178,7 @@ class NormalCRPSMetric(BaseMetric):
         `Strictly Proper Scoring Rules, Prediction, and Estimation`
     """
 
-    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> float:
+    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> cn.ndarray:
         y, pred = check_dist_param(y, pred)
         loc = pred[:, :, 0]
         # `NormalObjective` outputs variance instead of scale.
@@ -173,7 +186,7 @@ class NormalCRPSMetric(BaseMetric):
         z = (y - loc) / scale
         # This is negating the definition in [1] to make it a loss.
         v = scale * (z * (2 * norm_cdf(z) - 1) + 2 * norm_pdf(z) - 1 / cn.sqrt(cn.pi))
-        return sample_average(v, w)
+        return sample_average(v, w).mean()
 
     def name(self) -> str:
         return "normal_crps"
@@ -185,15 +198,13 @@ class GammaDevianceMetric(BaseMetric):
     :math:`E = 2[(\\ln{\\frac{p_i}{y_i}} + \\frac{y_i}{p_i} - 1)w_i]`
     """
 
-    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> float:
+    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> cn.ndarray:
         eps = 1e-6
         y = y + eps
         pred = pred + eps
         d = 2.0 * (cn.log(pred / y) + y / pred - self.one)
-        result = sample_average(d, w)
-        if result.size > 1:
-            result = cn.average(result)
-        return float(result)
+        # average over outputs
+        return sample_average(d, w).mean()
 
     def name(self) -> str:
         return "deviance_gamma"
@@ -217,7 +228,7 @@ class QuantileMetric(BaseMetric):
         assert cn.all(0.0 <= quantiles) and cn.all(quantiles <= self.one)
         self.quantiles = quantiles
 
-    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> float:
+    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> cn.ndarray:
         assert w.ndim == 1
         assert y.shape[1] == 1
         assert pred.shape[1] == self.quantiles.size
@@ -249,20 +260,18 @@ class LogLossMetric(BaseMetric):
         :class:`legateboost.objectives.LogLossObjective`
     """  # noqa: E501
 
-    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> float:
+    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> cn.ndarray:
         y = y.squeeze()
         eps = cn.finfo(pred.dtype).eps
         cn.clip(pred, eps, 1 - eps, out=pred)
 
-        w_sum = w.sum()
-        if w_sum == 0:
-            return 0.0
+        w_sum = _safe_weight_sum(w)
 
         # binary case
         if pred.ndim == 1 or pred.shape[1] == 1:
             pred = pred.squeeze()
             logloss = -(y * cn.log(pred) + (self.one - y) * cn.log(self.one - pred))
-            return float((logloss * w).sum() / w_sum)
+            return (logloss * w).sum() / w_sum
 
         # multi-class case
         assert pred.ndim == 2
@@ -271,7 +280,7 @@ class LogLossMetric(BaseMetric):
         logloss = -cn.log(pick_col_by_idx(pred, label))
         # logloss = -cn.log(pred[cn.arange(label.size), label])
 
-        return float((logloss * w).sum() / w_sum)
+        return (logloss * w).sum() / w_sum
 
     def name(self) -> str:
         return "log_loss"
@@ -289,13 +298,13 @@ class ExponentialMetric(BaseMetric):
         :class:`legateboost.objectives.ExponentialObjective`
     """  # noqa: E501
 
-    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> float:
+    def metric(self, y: cn.ndarray, pred: cn.ndarray, w: cn.ndarray) -> cn.ndarray:
         y = y.squeeze()
         # binary case
         if pred.ndim == 1 or pred.shape[1] == 1:
             pred = pred.squeeze()
             exp = cn.power(pred / (self.one - pred), 0.5 - y)
-            return float((exp * w).sum() / w.sum())
+            return (exp * w).sum() / w.sum()
 
         # multi-class case
         # note that exp loss is invariant to adding a constant to prediction
@@ -307,7 +316,7 @@ class ExponentialMetric(BaseMetric):
         # y_k[cn.arange(y.size), y.astype(cn.int32)] = 1.0
 
         exp = cn.exp(-1 / K * cn.sum(y_k * f, axis=1))
-        return float((exp * w).sum() / w.sum())
+        return (exp * w).sum() / w.sum()
 
     def name(self) -> str:
         return "exp"
@@ -4,6 +4,7 @@ import numpy as np
 
 import cunumeric as cn
 
+from ..quantile import QuantileDMatrix
 from ..utils import PickleCunumericMixin
 
 
@@ -13,8 +14,22 @@ class BaseModel(PickleCunumericMixin, ABC):
     Defines the interface for fitting, updating, and predicting a model,
     as well as string representation and equality comparison. Implement
     these methods to create a custom model.
+
+    Attributes
+    ----------
+    requires_preround :
+        Whether the gradients passed to the model are prerounded so that
+        summing them gives the same result for any number of workers. Models
+        that sum gradients exactly, such as in fixed point, may set this to
+        False to skip the prerounding.
+    supports_missing :
+        Whether the model handles missing values (NaN) in the input. The
+        estimator only accepts NaN if every base model supports it.
     """
 
+    requires_preround: bool = True
+    supports_missing: bool = False
+
     def set_random_state(self, random_state: np.random.RandomState) -> "BaseModel":
         self.random_state = random_state
         return self
@@ -38,7 +53,8 @@ class BaseModel(PickleCunumericMixin, ABC):
             respect to the predicted values.
         h :
             The second derivative of the loss function with
-             respect to the predicted values.
+             respect to the predicted values. May have a single column
+             shared by every output.
 
         Returns
         -------
@@ -47,6 +63,66 @@ class BaseModel(PickleCunumericMixin, ABC):
         """
         pass
 
+    def fit_dmatrix(
+        self,
+        X: QuantileDMatrix,
+        g: cn.ndarray,
+        h: cn.ndarray,
+    ) -> "BaseModel":
+        """Fit the model from training data that may have been quantised.
+
+        Models that can train on the quantised representation should
+        override this method. By default the model is fit to the raw data.
+
+        Parameters
+        ----------
+        X :
+            The training data.
+        g :
+            The first derivative of the loss function with
+            respect to the predicted values.
+        h :
+            The second derivative of the loss function with
+             respect to the predicted values. May have a single column
+             shared by every output.
+
+        Returns
+        -------
+        BaseModel
+            The fitted model.
+        """
+        return self.fit(X.data, g, h)
+
+    def fit_predict_dmatrix(
+        self,
+        X: QuantileDMatrix,
+        g: cn.ndarray,
+        h: cn.ndarray,
+    ) -> cn.ndarray:
+        """Fit the model and return its predictions for the training data.
+
+        Models that find the training predictions while fitting should
+        override this method to avoid a second pass over the data.
+
+        Parameters
+        ----------
+        X :
+            The training data.
+        g :
+            The first derivative of the loss function with
+            respect to the predicted values.
+        h :
+            The second derivative of the loss function with
+             respect to the predicted values. May have a single column
+             shared by every output.
+
+        Returns
+        -------
+        cn.ndarray
+            The predictions of the fitted model for X.
+        """
+        return self.fit_dmatrix(X, g, h).predict(X.data)
+
     @abstractmethod
     def update(
         self,
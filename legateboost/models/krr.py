@@ -87,6 +87,7 @@ class KRR(BaseModel):
         K_mm = self._apply_kernel(self.X_train)
         num_outputs = g.shape[1]
         self.betas_ = cn.zeros((self.X_train.shape[0], num_outputs), dtype=X.dtype)
+        h = cn.broadcast_to(h, g.shape)
 
         for k in range(num_outputs):
             W = cn.sqrt(h[:, k]).astype(X.dtype)
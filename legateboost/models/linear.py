@@ -41,6 +41,7 @@ class Linear(BaseModel):
     def _fit_solve(self, X: cn.ndarray, g: cn.ndarray, h: cn.ndarray) -> None:
         self.betas_ = cn.zeros((X.shape[1] + 1, g.shape[1]))
         num_outputs = g.shape[1]
+        h = cn.broadcast_to(h, g.shape)
         for k in range(num_outputs):
             W = cn.sqrt(h[:, k])
             Xw = cn.ones((X.shape[0], X.shape[1] + 1))
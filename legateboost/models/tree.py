@@ -1,12 +1,15 @@
-import math
 from enum import IntEnum
-from typing import Any
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 import cunumeric as cn
 from legate.core import TaskTarget, constant, dimension, get_legate_runtime, types
 
+from ..launch import get_launch_planner
 from ..library import user_context, user_lib
-from ..utils import gather, get_store
+from ..quantile import QuantileDMatrix
+from ..utils import PickleCunumericMixin, get_store
 from .base_model import BaseModel
 
 
@@ -14,40 +17,179 @@ class LegateBoostOpCode(IntEnum):
     BUILD_TREE = user_lib.cffi.BUILD_TREE
     PREDICT = user_lib.cffi.PREDICT
     UPDATE_TREE = user_lib.cffi.UPDATE_TREE
+    PREDICT_FOREST = user_lib.cffi.PREDICT_FOREST
+
+
+# must match GrowPolicy in build_tree.h
+_grow_policies = {"depthwise": 0, "lossguide": 1}
+# must match TreeMethod in build_tree.cc
+_tree_methods = {"allreduce": 0, "reduce_scatter": 1, "voting": 2}
 
 
 class Tree(BaseModel):
     """A structure of arrays representing a decision tree.
 
-    A leaf node has value -1 at feature[node_idx]
+    A leaf node has value -1 at feature[node_idx]. The left and right child of
+    an internal node are given by children[node_idx]. Nodes are numbered in the
+    order they are created. A fitted tree keeps room for the largest tree its
+    parameters allow, with unused nodes as leaves no split reaches, and is
+    compacted to the nodes that exist when it is packed into a
+    :class:`Forest` or pickled.
+
+    Split candidates are taken from a weighted quantile sketch of the
+    training data. Every node evaluates all ``n_bins`` candidates of every
+    feature in a single histogram pass. When trained by an estimator, the
+    training data is sketched and quantised once per call to ``fit`` and
+    shared by all boosting rounds.
+
+    Gradients are summed as 64 bit fixed point integers, so the fitted tree
+    is the same for any number of workers without prerounding the
+    gradients.
+
+    Missing values (NaN) are supported. Each split learns a default
+    direction, given by default_left[node_idx], taken by rows missing its
+    feature: the direction with the higher gain when the training rows at the
+    node have missing values, and right otherwise.
+
+    Features listed in ``categorical_features`` hold integer categories and
+    are split by partitioning their categories into two sets, without one-hot
+    encoding. The categories present at a node are ordered by their mean leaf
+    value and the best prefix of this order goes left, as in LightGBM. A node
+    with categorical[node_idx] set sends a row left if its category is in the
+    bitset categories[node_idx], where bit ``c % 32`` of word ``c // 32`` is
+    category ``c``. Other categories, including ones not seen in training, go
+    right.
+
+    Parameters
+    ----------
+    max_depth :
+        The maximum depth of the tree.
+    n_bins :
+        The number of split candidates per feature.
+    grow_policy :
+        "depthwise" splits every leaf of a level before moving to the next
+        level. "lossguide" always splits the leaf with the highest gain.
+    max_leaves :
+        The maximum number of leaves. If 0, the number of leaves is only
+        limited by ``max_depth``. With a limit, leaves with higher gain are
+        split first.
+    colsample_bytree :
+        Fraction of features randomly sampled for each tree.
+    colsample_bylevel :
+        Fraction of the features of the tree randomly sampled for each depth.
+        Features that are not sampled are not histogrammed. Sampling per
+        level means both children of a split are histogrammed from their
+        rows rather than one being subtracted from the parent.
+    quantised_gradient_bits :
+        If set, gradients and Hessians are stochastically rounded to integers
+        of this many bits (2 to 16) and histograms are summed in 32 bit
+        integers, halving histogram memory and communication. The sums over
+        every training row must fit, so at most ``(2**31 - 1) // (2**(bits -
+        1) - 1)`` rows can be fitted, about 65000 with 16 bits and 16 million
+        with 8 bits. Leaf values are found from the quantised sums.
+    tree_method :
+        How workers combine their histograms. "allreduce" sums every
+        histogram on every worker, which then searches every split.
+        "reduce_scatter" gives each worker the summed histograms of its own
+        block of features, so it only searches those, and the best split of
+        each node is exchanged between workers. This reduces communication
+        and split search per worker for wide data on many CPU workers.
+        "voting" has each worker vote for the ``voting_top_k`` features of
+        each node with the highest gain on its own rows, and only the
+        histograms of the ``2 * voting_top_k`` features with the most votes
+        are summed and searched. This greatly reduces communication for wide
+        data but the split found may not be the best over every feature.
+        GPUs always use "allreduce".
+    voting_top_k :
+        The number of features each worker votes for with
+        ``tree_method="voting"``.
+    categorical_features :
+        Columns of the input holding categories, as integers in
+        ``[0, n_bins)`` or NaN for missing values.
     """
 
     leaf_value: cn.ndarray
     feature: cn.ndarray
+    children: cn.ndarray
     split_value: cn.ndarray
+    default_left: cn.ndarray
+    categorical: cn.ndarray
+    categories: cn.ndarray
     gain: cn.ndarray
     hessian: cn.ndarray
+    requires_preround = False
+    supports_missing = True
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, Tree):
             return NotImplemented
+        self._compact()
+        other._compact()
         eq = [cn.all(self.leaf_value == other.leaf_value)]
         eq.append(cn.all(self.feature == other.feature))
+        eq.append(cn.all(self.children == other.children))
         eq.append(cn.all(self.split_value == other.split_value))
+        eq.append(cn.all(self.default_left == other.default_left))
+        eq.append(cn.all(self.categorical == other.categorical))
+        eq.append(cn.all(self.categories == other.categories))
         eq.append(cn.all(self.gain == other.gain))
         eq.append(cn.all(self.hessian == other.hessian))
         return all(eq)
 
-    def num_procs_to_use(self, num_rows: int) -> int:
-        min_rows_per_worker = 10
-        available_procs = len(get_legate_runtime().machine)
-        return min(available_procs, int(math.ceil(num_rows / min_rows_per_worker)))
-
     def __init__(
         self,
         max_depth: int,
+        n_bins: int = 256,
+        grow_policy: str = "depthwise",
+        max_leaves: int = 0,
+        colsample_bytree: float = 1.0,
+        colsample_bylevel: float = 1.0,
+        quantised_gradient_bits: Optional[int] = None,
+        tree_method: str = "allreduce",
+        voting_top_k: int = 20,
+        categorical_features: Optional[Sequence[int]] = None,
     ) -> None:
         self.max_depth = max_depth
+        self.n_bins = n_bins
+        self.grow_policy = grow_policy
+        self.max_leaves = max_leaves
+        self.colsample_bytree = colsample_bytree
+        self.colsample_bylevel = colsample_bylevel
+        self.quantised_gradient_bits = quantised_gradient_bits
+        self.tree_method = tree_method
+        self.voting_top_k = voting_top_k
+        self.categorical_features = categorical_features
+
+    def _feature_sets(self, num_features: int) -> cn.ndarray:
+        # The features evaluated at each depth, one row per depth. A single
+        # row is used for every depth if features are not sampled by level.
+        for name in ["colsample_bytree", "colsample_bylevel"]:
+            if not 0.0 < getattr(self, name) <= 1.0:
+                raise ValueError(f"{name} must be in (0, 1].")
+        features = np.arange(num_features)
+        if self.colsample_bytree < 1.0:
+            size = max(1, int(self.colsample_bytree * num_features))
+            features = np.sort(self.random_state.choice(features, size, replace=False))
+        if self.colsample_bylevel == 1.0:
+            return cn.array(features[np.newaxis, :].astype(np.int32))
+        size = max(1, int(self.colsample_bylevel * features.size))
+        levels = [
+            np.sort(self.random_state.choice(features, size, replace=False))
+            for _ in range(max(self.max_depth, 1))
+        ]
+        return cn.array(np.array(levels, dtype=np.int32))
+
+    def _categorical_features(self, num_features: int) -> Tuple[int, ...]:
+        if self.categorical_features is None:
+            return ()
+        features = tuple(sorted(set(int(j) for j in self.categorical_features)))
+        if features and not 0 <= features[0] <= features[-1] < num_features:
+            raise ValueError(
+                "categorical_features must be columns of X, got {}.".format(
+                    list(features)
+                )
+            )
+        return features
 
     def fit(
         self,
@@ -55,17 +197,62 @@ class Tree(BaseModel):
         g: cn.ndarray,
         h: cn.ndarray,
     ) -> "Tree":
-        # dont let legate create a future - make sure at least 2 sample rows
-        sample_rows = cn.array(
-            self.random_state.randint(0, X.shape[0], max(2, self.max_depth))
-        )
-        split_proposals = gather(X, sample_rows)
+        # split candidates are sketched weighted by the hessian
+        return self.fit_dmatrix(QuantileDMatrix(X, h.sum(axis=1)), g, h)
 
-        num_features = X.shape[1]
+    def fit_dmatrix(
+        self,
+        X: QuantileDMatrix,
+        g: cn.ndarray,
+        h: cn.ndarray,
+    ) -> "Tree":
+        self.fit_predict_dmatrix(X, g, h)
+        return self
+
+    def fit_predict_dmatrix(
+        self,
+        X: QuantileDMatrix,
+        g: cn.ndarray,
+        h: cn.ndarray,
+    ) -> cn.ndarray:
+        if self.grow_policy not in _grow_policies:
+            raise ValueError(f"Unknown grow_policy {self.grow_policy}")
+        if self.tree_method not in _tree_methods:
+            raise ValueError(f"Unknown tree_method {self.tree_method}")
+        if self.voting_top_k < 1:
+            raise ValueError("voting_top_k must be at least 1.")
+        bits = self.quantised_gradient_bits
+        if bits is not None and not 2 <= bits <= 16:
+            raise ValueError("quantised_gradient_bits must be between 2 and 16.")
+        n_rows, num_features = X.shape
+        if bits is not None and n_rows > (2**31 - 1) // (2 ** (bits - 1) - 1):
+            raise ValueError(
+                "quantised_gradient_bits={} sums at most {} rows in 32 bits, got {}. "
+                "Use fewer bits or full precision gradients.".format(
+                    bits, (2**31 - 1) // (2 ** (bits - 1) - 1), n_rows
+                )
+            )
         num_outputs = g.shape[1]
-        n_rows = X.shape[0]
-        num_procs = self.num_procs_to_use(n_rows)
-        rows_per_tile = int(cn.ceil(n_rows / num_procs))
+        plan = get_launch_planner().plan(
+            "build_tree", n_rows, num_features, num_outputs, self.max_depth, self.n_bins
+        )
+        num_procs, rows_per_tile = plan.num_procs, plan.rows_per_tile
+        categorical_features = self._categorical_features(num_features)
+        # quantised with the same row tiles so they are reused without copies
+        split_proposals, X_binned = X.quantise(self.n_bins, categorical_features, plan)
+
+        is_categorical = np.zeros(num_features, dtype=bool)
+        is_categorical[list(categorical_features)] = True
+        # one bit per bin of a categorical feature
+        num_words = (
+            (split_proposals.shape[0] + 31) // 32 if categorical_features else 1
+        )
+
+        # outputs are allocated for the largest tree the parameters allow and
+        # compacted once the number of nodes is needed, see _compact
+        max_nodes = min(2 ** (self.max_depth + 1) - 1, 2 * n_rows - 1)
+        if self.max_leaves > 0:
+            max_nodes = min(max_nodes, 2 * self.max_leaves - 1)
 
         task = get_legate_runtime().create_manual_task(
             user_context, LegateBoostOpCode.BUILD_TREE, [num_procs, 1]
@@ -73,8 +260,19 @@ class Tree(BaseModel):
 
         # inputs
         task.add_scalar_arg(self.max_depth, types.int32)
+        task.add_scalar_arg(self.max_leaves, types.int32)
+        task.add_scalar_arg(_grow_policies[self.grow_policy], types.int32)
+        task.add_scalar_arg(max_nodes, types.int32)
+        task.add_scalar_arg(n_rows, types.int64)
+        task.add_scalar_arg(0 if bits is None else bits, types.int32)
+        # seeds the stochastic rounding of quantised gradients
+        seed = 0 if bits is None else self.random_state.randint(2**31)
+        task.add_scalar_arg(seed, types.int64)
+        task.add_scalar_arg(_tree_methods[self.tree_method], types.int32)
+        task.add_scalar_arg(self.voting_top_k, types.int32)
+        task.add_scalar_arg(num_words, types.int32)
         task.add_input(
-            get_store(X).partition_by_tiling((rows_per_tile, num_features)),
+            get_store(X_binned).partition_by_tiling((rows_per_tile, num_features)),
             projection=(dimension(0), constant(0)),
         )
         task.add_input(
@@ -82,23 +280,30 @@ class Tree(BaseModel):
             projection=(dimension(0), constant(0)),
         )
         task.add_input(
-            get_store(h).partition_by_tiling((rows_per_tile, num_outputs)),
+            get_store(h).partition_by_tiling((rows_per_tile, h.shape[1])),
             projection=(dimension(0), constant(0)),
         )
         task.add_input(get_store(split_proposals))
+        task.add_input(get_store(self._feature_sets(num_features)))
+        task.add_input(get_store(cn.array(is_categorical)))
 
         # outputs
         # force 1d arrays to be 2d otherwise we get the dreaded assert proj_id == 0
-        max_nodes = 2 ** (self.max_depth + 1)
         leaf_value = get_legate_runtime().create_store(
             types.float64, (max_nodes, num_outputs)
         )
         feature = get_legate_runtime().create_store(types.int32, (max_nodes, 1))
+        children = get_legate_runtime().create_store(types.int32, (max_nodes, 2))
         split_value = get_legate_runtime().create_store(types.float64, (max_nodes, 1))
         gain = get_legate_runtime().create_store(types.float64, (max_nodes, 1))
         hessian = get_legate_runtime().create_store(
             types.float64, (max_nodes, num_outputs)
         )
+        default_left = get_legate_runtime().create_store(types.bool_, (max_nodes, 1))
+        categorical = get_legate_runtime().create_store(types.bool_, (max_nodes, 1))
+        categories = get_legate_runtime().create_store(
+            types.uint32, (max_nodes, num_words)
+        )
 
         # All outputs belong to a single tile on worker 0
         task.add_output(
@@ -121,6 +326,30 @@ class Tree(BaseModel):
             hessian.partition_by_tiling((max_nodes, num_outputs)),
             projection=(dimension(0), constant(0)),
         )
+        task.add_output(
+            children.partition_by_tiling((max_nodes, 2)),
+            projection=(dimension(0), constant(0)),
+        )
+        # the leaf value of each training row, partitioned like the rows
+        row_leaf_value = get_legate_runtime().create_store(
+            types.float64, (n_rows, num_outputs)
+        )
+        task.add_output(
+            row_leaf_value.partition_by_tiling((rows_per_tile, num_outputs)),
+            projection=(dimension(0), constant(0)),
+        )
+        task.add_output(
+            default_left.partition_by_tiling((max_nodes, 1)),
+            projection=(dimension(0), constant(0)),
+        )
+        task.add_output(
+            categorical.partition_by_tiling((max_nodes, 1)),
+            projection=(dimension(0), constant(0)),
+        )
+        task.add_output(
+            categories.partition_by_tiling((max_nodes, num_words)),
+            projection=(dimension(0), constant(0)),
+        )
 
         if get_legate_runtime().machine.count(TaskTarget.GPU) > 1:
             task.add_nccl_communicator()
@@ -130,12 +359,38 @@ class Tree(BaseModel):
         task.execute()
 
         self.leaf_value = cn.array(leaf_value, copy=False)
-        self.feature = cn.array(feature, copy=False).squeeze()
-        self.split_value = cn.array(split_value, copy=False).squeeze()
-        self.gain = cn.array(gain, copy=False).squeeze()
+        self.feature = cn.array(feature, copy=False).squeeze(axis=1)
+        self.children = cn.array(children, copy=False)
+        self.split_value = cn.array(split_value, copy=False).squeeze(axis=1)
+        self.default_left = cn.array(default_left, copy=False).squeeze(axis=1)
+        self.categorical = cn.array(categorical, copy=False).squeeze(axis=1)
+        self.categories = cn.array(categories, copy=False)
+        self.gain = cn.array(gain, copy=False).squeeze(axis=1)
         self.hessian = cn.array(hessian, copy=False)
-
-        return self
+        # every split adds two nodes, counted without waiting for the task
+        self._num_nodes = (self.feature != -1).sum() * 2 + 1
+
+        return cn.array(row_leaf_value, copy=False)
+
+    def _compact(self) -> None:
+        # drop the unused node capacity of a fitted tree
+        num_nodes = self.__dict__.pop("_num_nodes", None)
+        if num_nodes is None:
+            return
+        num_nodes = int(num_nodes)
+        self.leaf_value = cn.array(self.leaf_value[:num_nodes])
+        self.feature = cn.array(self.feature[:num_nodes])
+        self.children = cn.array(self.children[:num_nodes])
+        self.split_value = cn.array(self.split_value[:num_nodes])
+        self.default_left = cn.array(self.default_left[:num_nodes])
+        self.categorical = cn.array(self.categorical[:num_nodes])
+        self.categories = cn.array(self.categories[:num_nodes])
+        self.gain = cn.array(self.gain[:num_nodes])
+        self.hessian = cn.array(self.hessian[:num_nodes])
+
+    def __getstate__(self) -> Dict[str, Any]:
+        self._compact()
+        return super().__getstate__()
 
     def clear(self) -> None:
         self.leaf_value.fill(0)
@@ -150,12 +405,15 @@ class Tree(BaseModel):
         num_features = X.shape[1]
         num_outputs = g.shape[1]
         n_rows = X.shape[0]
-        num_procs = self.num_procs_to_use(n_rows)
-        rows_per_tile = int(cn.ceil(n_rows / num_procs))
+        plan = get_launch_planner().plan(
+            "update_tree", n_rows, num_features, num_outputs, self.max_depth
+        )
+        num_procs, rows_per_tile = plan.num_procs, plan.rows_per_tile
 
         task = get_legate_runtime().create_manual_task(
             user_context, LegateBoostOpCode.UPDATE_TREE, [num_procs, 1]
         )
+        task.add_scalar_arg(n_rows, types.int64)
 
         task.add_input(
             get_store(X).partition_by_tiling((rows_per_tile, num_features)),
@@ -166,13 +424,17 @@ class Tree(BaseModel):
             projection=(dimension(0), constant(0)),
         )
         task.add_input(
-            get_store(h).partition_by_tiling((rows_per_tile, num_outputs)),
+            get_store(h).partition_by_tiling((rows_per_tile, h.shape[1])),
             projection=(dimension(0), constant(0)),
         )
 
         # broadcast the tree structure
         task.add_input(get_store(self.feature))
         task.add_input(get_store(self.split_value))
+        task.add_input(get_store(self.children))
+        task.add_input(get_store(self.default_left))
+        task.add_input(get_store(self.categorical))
+        task.add_input(get_store(self.categories))
 
         leaf_value = get_legate_runtime().create_store(
             types.float64, self.leaf_value.shape
@@ -201,8 +463,10 @@ class Tree(BaseModel):
         n_rows = X.shape[0]
         n_features = X.shape[1]
         n_outputs = self.leaf_value.shape[1]
-        num_procs = self.num_procs_to_use(n_rows)
-        rows_per_tile = int(cn.ceil(n_rows / num_procs))
+        plan = get_launch_planner().plan(
+            "predict", n_rows, n_features, n_outputs, self.max_depth
+        )
+        num_procs, rows_per_tile = plan.num_procs, plan.rows_per_tile
         task = get_legate_runtime().create_manual_task(
             user_context, LegateBoostOpCode.PREDICT, [num_procs, 1]
         )
@@ -216,6 +480,10 @@ class Tree(BaseModel):
         task.add_input(get_store(self.leaf_value))
         task.add_input(get_store(self.feature))
         task.add_input(get_store(self.split_value))
+        task.add_input(get_store(self.children))
+        task.add_input(get_store(self.default_left))
+        task.add_input(get_store(self.categorical))
+        task.add_input(get_store(self.categories))
 
         pred = get_legate_runtime().create_store(types.float64, (n_rows, n_outputs))
         task.add_output(
@@ -229,10 +497,16 @@ class Tree(BaseModel):
         return self.feature[id] == -1
 
     def left_child(self, id: int) -> int:
-        return id * 2 + 1
+        return int(self.children[id, 0])
 
     def right_child(self, id: int) -> int:
-        return id * 2 + 2
+        return int(self.children[id, 1])
+
+    def left_categories(self, id: int) -> List[int]:
+        """Returns the categories going left at a categorical split."""
+        words = np.asarray(self.categories[id], dtype="<u4")
+        bits = np.unpackbits(words.view(np.uint8), bitorder="little")
+        return [int(c) for c in np.flatnonzero(bits)]
 
     def __str__(self) -> str:
         def format_vector(v: cn.ndarray) -> str:
@@ -248,14 +522,27 @@ class Tree(BaseModel):
                     format_vector(self.hessian[id]),
                 )
             else:
+                if self.categorical[id]:
+                    condition = "f{} in {{{}}}".format(
+                        self.feature[id],
+                        ",".join(str(c) for c in self.left_categories(id)),
+                    )
+                else:
+                    condition = "f{}<={:0.4f}".format(
+                        self.feature[id], self.split_value[id]
+                    )
                 text = (
                     "\t" * depth
-                    + "{}:[f{}<={:0.4f}] yes={},no={},gain={:0.4f},hess={}\n".format(
+                    + "{}:[{}] yes={},no={},missing={},gain={:0.4f},hess={}\n".format(
                         id,
-                        self.feature[id],
-                        self.split_value[id],
+                        condition,
                         self.left_child(id),
                         self.right_child(id),
+                        (
+                            self.left_child(id)
+                            if self.default_left[id]
+                            else self.right_child(id)
+                        ),
                         self.gain[id],
                         self.hessian[id],
                     )
@@ -265,3 +552,106 @@ class Tree(BaseModel):
             return text
 
         return recurse_print(0, 0)
+
+
+class Forest(PickleCunumericMixin):
+    """An inference-optimised ensemble of trees.
+
+    The nodes of all trees are packed into contiguous arrays, split features
+    and thresholds first, followed by the leaf values, so predicting any
+    number of trees is a single task over arrays that are built once.
+    Child indices are relative to the root of each tree, which starts at
+    ``tree_offset[i]``. Missing values follow the default direction of each
+    split and categorical splits use the bitsets of categories, as in
+    :class:`Tree`, padded to the widest bitset of any tree.
+
+    Parameters
+    ----------
+    trees :
+        Fitted trees with the same number of outputs.
+    """
+
+    feature: cn.ndarray
+    split_value: cn.ndarray
+    children: cn.ndarray
+    default_left: cn.ndarray
+    categorical: cn.ndarray
+    categories: cn.ndarray
+    leaf_value: cn.ndarray
+    tree_offset: cn.ndarray
+    depth: int
+
+    def __init__(self, trees: Sequence[Tree]) -> None:
+        if len(trees) == 0:
+            raise ValueError("A forest needs at least one tree.")
+        for t in trees:
+            t._compact()
+        self.feature = cn.concatenate([t.feature for t in trees])
+        self.split_value = cn.concatenate([t.split_value for t in trees])
+        self.children = cn.concatenate([t.children for t in trees])
+        self.default_left = cn.concatenate([t.default_left for t in trees])
+        self.categorical = cn.concatenate([t.categorical for t in trees])
+        num_words = max(t.categories.shape[1] for t in trees)
+        self.categories = cn.zeros((self.feature.shape[0], num_words), dtype=cn.uint32)
+        offset = 0
+        for t in trees:
+            n_nodes, tree_words = t.categories.shape
+            self.categories[offset : offset + n_nodes, :tree_words] = t.categories
+            offset += n_nodes
+        self.leaf_value = cn.concatenate([t.leaf_value for t in trees])
+        # the levels each row may walk through, to plan predictions
+        self.depth = sum(t.max_depth for t in trees)
+        self.tree_offset = cn.array(
+            np.cumsum([0] + [t.feature.shape[0] for t in trees], dtype=np.int64)
+        )
+
+    @property
+    def n_trees(self) -> int:
+        return self.tree_offset.shape[0] - 1
+
+    def predict(self, X: cn.ndarray) -> cn.ndarray:
+        """Sums the predictions of every tree.
+
+        Parameters
+        ----------
+        X :
+            The input samples.
+
+        Returns
+        -------
+        cn.ndarray of shape (n_rows, n_outputs)
+            The sum of the tree predictions.
+        """
+        n_rows = X.shape[0]
+        n_features = X.shape[1]
+        n_outputs = self.leaf_value.shape[1]
+        plan = get_launch_planner().plan(
+            "predict", n_rows, n_features, n_outputs, self.depth
+        )
+        num_procs, rows_per_tile = plan.num_procs, plan.rows_per_tile
+
+        task = get_legate_runtime().create_manual_task(
+            user_context, LegateBoostOpCode.PREDICT_FOREST, [num_procs, 1]
+        )
+        task.add_input(
+            get_store(X).partition_by_tiling((rows_per_tile, n_features)),
+            projection=(dimension(0), constant(0)),
+        )
+
+        # broadcast the forest structure
+        task.add_input(get_store(self.leaf_value))
+        task.add_input(get_store(self.feature))
+        task.add_input(get_store(self.split_value))
+        task.add_input(get_store(self.children))
+        task.add_input(get_store(self.tree_offset))
+        task.add_input(get_store(self.default_left))
+        task.add_input(get_store(self.categorical))
+        task.add_input(get_store(self.categories))
+
+        pred = get_legate_runtime().create_store(types.float64, (n_rows, n_outputs))
+        task.add_output(
+            get_store(pred).partition_by_tiling((rows_per_tile, n_outputs)),
+            projection=(dimension(0), constant(0)),
+        )
+        task.execute()
+        return cn.array(pred)
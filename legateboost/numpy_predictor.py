@@ -0,0 +1,232 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+import numpy as np
+
+import cunumeric as cn
+
+from .models import KRR, BaseModel, Linear, Tree
+from .models.tree import Forest
+from .objectives import (
+    BaseObjective,
+    ExponentialObjective,
+    GammaDevianceObjective,
+    GammaObjective,
+    LogLossObjective,
+    NormalObjective,
+    QuantileObjective,
+    SquaredErrorObjective,
+)
+
+
+def _logloss_transform(pred: np.ndarray) -> np.ndarray:
+    if pred.shape[1] == 1:
+        return 1.0 / (1.0 + np.exp(-pred))
+    # softmax function
+    e_x = np.exp(pred - pred.max(axis=1)[:, np.newaxis])
+    return e_x / e_x.sum(axis=1)[:, np.newaxis]
+
+
+def _normal_transform(pred: np.ndarray) -> np.ndarray:
+    pred = pred.reshape((pred.shape[0], pred.shape[1] // 2, 2))
+    pred[:, :, 1] = np.clip(pred[:, :, 1], -5, 5)
+    return pred
+
+
+def _exponential_transform(pred: np.ndarray) -> np.ndarray:
+    if pred.shape[1] == 1:
+        return _logloss_transform(2 * pred)
+    return _logloss_transform((1 / (pred.shape[1] - 1)) * pred)
+
+
+# NumPy equivalents of BaseObjective.transform
+_transforms: Dict[Type[BaseObjective], Callable[[np.ndarray], np.ndarray]] = {
+    SquaredErrorObjective: lambda pred: pred,
+    QuantileObjective: lambda pred: pred,
+    NormalObjective: _normal_transform,
+    GammaDevianceObjective: np.exp,
+    GammaObjective: lambda pred: np.exp(
+        pred.reshape((pred.shape[0], pred.shape[1] // 2, 2))
+    ),
+    LogLossObjective: _logloss_transform,
+    ExponentialObjective: _exponential_transform,
+}
+
+
+def _to_numpy(x: Any) -> np.ndarray:
+    return np.asarray(x, dtype=np.float64)
+
+
+class NumpyPredictor:
+    """A copy of a fitted estimator that predicts with NumPy only.
+
+    Scoring a handful of rows through Legate is dominated by the cost of
+    launching tasks. This predictor holds the fitted models as NumPy arrays
+    and evaluates them in process, walking all trees at once one level at a
+    time. Use ``to_numpy_predictor`` on a fitted estimator to create it.
+
+    Linear models are summed into a single model as their predictions add.
+    Objectives with a custom ``transform`` fall back to cunumeric for that
+    step.
+    """
+
+    def __init__(
+        self,
+        model_init: cn.ndarray,
+        models: List[BaseModel],
+        forest: Optional[Forest],
+        objective: BaseObjective,
+        n_features: int,
+        is_classifier: bool,
+    ) -> None:
+        self.model_init = _to_numpy(model_init)
+        self.n_features = n_features
+        self.is_classifier = is_classifier
+        self.objective = objective
+
+        self.forest: Optional[Tuple[np.ndarray, ...]] = None
+        if forest is not None:
+            self.forest = (
+                np.asarray(forest.feature, dtype=np.int64),
+                _to_numpy(forest.split_value),
+                np.asarray(forest.children, dtype=np.int64),
+                _to_numpy(forest.leaf_value),
+                np.asarray(forest.tree_offset[:-1], dtype=np.int64),
+                np.asarray(forest.default_left, dtype=bool),
+                np.asarray(forest.categorical, dtype=bool),
+                np.asarray(forest.categories, dtype=np.uint32),
+            )
+
+        self.linear: Optional[np.ndarray] = None
+        self.krr: List[Tuple[np.ndarray, np.ndarray, float]] = []
+        for m in models:
+            if isinstance(m, Linear):
+                betas = _to_numpy(m.betas_)
+                self.linear = betas if self.linear is None else self.linear + betas
+            elif isinstance(m, KRR):
+                # sigma is estimated when fitting if not given
+                assert m.sigma is not None
+                self.krr.append(
+                    (_to_numpy(m.X_train), _to_numpy(m.betas_), float(m.sigma))
+                )
+            elif not isinstance(m, Tree):
+                raise ValueError(
+                    "Cannot convert model of type {} to NumPy.".format(type(m))
+                )
+
+    def _predict_forest(self, X: np.ndarray, pred: np.ndarray) -> None:
+        assert self.forest is not None
+        (
+            feature,
+            split_value,
+            children,
+            leaf_value,
+            roots,
+            default_left,
+            categorical,
+            categories,
+        ) = self.forest
+        num_categories = 32 * categories.shape[1]
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        # the current node of every row in every tree
+        pos = np.repeat(roots[np.newaxis, :], X.shape[0], axis=0)
+        while True:
+            node_feature = feature[pos]
+            internal = node_feature != -1
+            if not internal.any():
+                break
+            x = X[rows, np.maximum(node_feature, 0)]
+            # categories outside the bitset, or not integers, go right
+            valid = (x >= 0) & (x < num_categories) & (x == np.floor(x))
+            category = np.where(valid, x, 0).astype(np.int64)
+            word = categories[pos, category // 32]
+            shift = (category % 32).astype(np.uint32)
+            in_categories = valid & ((word >> shift) & 1 == 1)
+            go_left = np.where(categorical[pos], in_categories, x <= split_value[pos])
+            # missing values follow the default direction of the split
+            go_left = np.where(np.isnan(x), default_left[pos], go_left)
+            side = np.where(go_left, 0, 1)
+            pos = np.where(internal, roots + children[pos, side], pos)
+        pred += leaf_value[pos].sum(axis=1)
+
+    def predict_raw(self, X: Any) -> np.ndarray:
+        """Predict pre-transformed values for samples in X.
+
+        Parameters
+        ----------
+        X :
+            The input samples. A single sample may be passed as a 1-d array.
+
+        Returns
+        -------
+        np.ndarray of shape (n_samples, n_outputs)
+            The predicted raw values for each sample in X.
+        """
+        X = _to_numpy(X)
+        if X.ndim == 1:
+            X = X.reshape((1, -1))
+        if X.shape[1] != self.n_features:
+            raise ValueError(
+                "X.shape[1] = {} should be equal to {}".format(
+                    X.shape[1], self.n_features
+                )
+            )
+        pred = np.repeat(self.model_init[np.newaxis, :], X.shape[0], axis=0)
+        if self.forest is not None:
+            self._predict_forest(X, pred)
+        if self.linear is not None:
+            pred += self.linear[0] + X.dot(self.linear[1:])
+        for X_train, betas, sigma in self.krr:
+            D_2 = np.maximum(
+                (X * X).sum(axis=1)[:, np.newaxis]
+                + (X_train * X_train).sum(axis=1)
+                - 2 * X.dot(X_train.T),
+                0.0,
+            )
+            pred += np.exp(-D_2 / (2 * sigma * sigma)).dot(betas)
+        return pred
+
+    def _transform(self, pred: np.ndarray) -> np.ndarray:
+        transform = _transforms.get(type(self.objective))
+        if transform is None:
+            return np.asarray(self.objective.transform(cn.asarray(pred)))
+        return transform(pred)
+
+    def predict_proba(self, X: Any) -> np.ndarray:
+        """Predict class probabilities for samples in X.
+
+        Parameters
+        ----------
+        X :
+            The input samples.
+
+        Returns
+        -------
+        np.ndarray of shape (n_samples, n_classes)
+            The predicted class probabilities for each sample in X.
+        """
+        if not self.is_classifier:
+            raise ValueError("predict_proba is only available for classifiers.")
+        pred = self._transform(self.predict_raw(X))
+        if pred.shape[1] == 1:
+            pred = np.concatenate([1.0 - pred, pred], axis=1)
+        return pred
+
+    def predict(self, X: Any) -> np.ndarray:
+        """Predict labels for samples in X, as the estimator would.
+
+        Parameters
+        ----------
+        X :
+            The input samples.
+
+        Returns
+        -------
+        np.ndarray
+            The predicted labels for each sample in X.
+        """
+        if self.is_classifier:
+            return np.argmax(self.predict_proba(X), axis=1)
+        pred = self._transform(self.predict_raw(X))
+        if pred.shape[1] == 1:
+            pred = pred.squeeze(axis=1)
+        return pred
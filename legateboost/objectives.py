@@ -1,12 +1,22 @@
 from abc import ABC, abstractmethod
-from typing import Tuple
+from enum import IntEnum
+from typing import Dict, Optional, Tuple, Type
 
 from scipy.stats import norm
 from typing_extensions import TypeAlias, override
 
 import cunumeric as cn
+from legate.core import (
+    TaskTarget,
+    constant,
+    dimension,
+    get_legate_runtime,
+    types as ty,
+)
 
 from . import special
+from .launch import get_launch_planner
+from .library import user_context, user_lib
 from .metrics import (
     BaseMetric,
     ExponentialMetric,
@@ -17,7 +27,13 @@ from .metrics import (
     NormalLLMetric,
     QuantileMetric,
 )
-from .utils import mod_col_by_idx, preround, sample_average, set_col_by_idx
+from .utils import (
+    get_store,
+    mod_col_by_idx,
+    preround,
+    sample_average,
+    set_col_by_idx,
+)
 
 GradPair: TypeAlias = Tuple[cn.ndarray, cn.ndarray]
 
@@ -31,6 +47,11 @@ class BaseObjective(ABC):
     # utility constant
     one = cn.ones(1, dtype=cn.float64)
 
+    #: Whether the hessian is one for every element. If True, the hessian
+    #: returned by ``gradient`` is ignored and the models are passed the
+    #: sample weights as a single hessian column shared by every output.
+    constant_hessian = False
+
     @abstractmethod
     def gradient(self, y: cn.ndarray, pred: cn.ndarray) -> GradPair:
         """Computes the functional gradient and hessian of the squared error
@@ -96,6 +117,8 @@ class SquaredErrorObjective(BaseObjective):
         :class:`legateboost.metrics.MSEMetric`
     """
 
+    constant_hessian = True
+
     def gradient(self, y: cn.ndarray, pred: cn.ndarray) -> GradPair:
         return pred - y, cn.ones(pred.shape)
 
@@ -405,6 +428,8 @@ class QuantileObjective(BaseObjective):
         :class:`legateboost.metrics.QuantileMetric`
     """  # noqa
 
+    constant_hessian = True
+
     def __init__(self, quantiles: cn.ndarray = cn.array([0.25, 0.5, 0.75])) -> None:
         super().__init__()
         assert cn.all(0.0 < quantiles) and cn.all(quantiles < self.one)
@@ -571,3 +596,103 @@ objectives = {
     "gamma_deviance": GammaDevianceObjective,
     "gamma": GammaObjective,
 }
+
+
+class _ObjectiveOpCode(IntEnum):
+    OBJECTIVE_GRADIENT = user_lib.cffi.OBJECTIVE_GRADIENT
+
+
+# Objectives with a native gradient, must match the Objective enum in gradient.h
+# Subclasses may override the gradient so types are matched exactly
+_native_objectives: Dict[Type[BaseObjective], int] = {
+    SquaredErrorObjective: 0,
+    LogLossObjective: 1,
+    ExponentialObjective: 2,
+    GammaDevianceObjective: 3,
+    GammaObjective: 4,
+    QuantileObjective: 5,
+}
+
+
+def native_weighted_gradient(
+    objective: BaseObjective,
+    y: cn.ndarray,
+    pred: cn.ndarray,
+    sample_weight: cn.ndarray,
+    learning_rate: float,
+    preround_gradients: bool = True,
+) -> Optional[GradPair]:
+    """Computes the weighted and prerounded gradient and Hessian of a built-in
+    objective in a single task.
+
+    The generic path launches a task for each elementwise operation of the
+    transform, the gradient, the weighting and the two prerounding steps. The
+    native task reads the raw predictions once and writes the final gradient
+    pair, reducing only the sums needed for prerounding between workers.
+
+    Parameters
+    ----------
+    objective :
+        The objective function.
+    y :
+        The labels of shape (n_samples, n_targets).
+    pred :
+        The untransformed predictions of shape (n_samples, n_outputs).
+    sample_weight :
+        The weight of each sample.
+    learning_rate :
+        Multiplies the gradient.
+    preround_gradients :
+        Whether to preround the gradient and Hessian. Without prerounding the
+        task needs no reduction between workers, except for the quantile
+        objective.
+
+    Returns
+    -------
+    Optional[GradPair]
+        The gradient and Hessian, or None if the objective has no native
+        implementation. The Hessian has a single column if the objective has
+        a constant hessian.
+    """
+    code = _native_objectives.get(type(objective))
+    if code is None:
+        return None
+    n_rows, n_outputs = pred.shape
+    y = y.astype(cn.float64)
+    pred = pred.astype(cn.float64)
+    sample_weight = sample_weight.astype(cn.float64).reshape((n_rows, 1))
+    plan = get_launch_planner().plan("objective", n_rows, 1, n_outputs, 1)
+    num_procs, rows_per_tile = plan.num_procs, plan.rows_per_tile
+
+    task = get_legate_runtime().create_manual_task(
+        user_context, _ObjectiveOpCode.OBJECTIVE_GRADIENT, [num_procs, 1]
+    )
+    for array in (y, pred, sample_weight):
+        task.add_input(
+            get_store(array).partition_by_tiling((rows_per_tile, array.shape[1])),
+            projection=(dimension(0), constant(0)),
+        )
+    if isinstance(objective, QuantileObjective):
+        task.add_input(get_store(objective.quantiles.astype(cn.float64)))
+    task.add_scalar_arg(code, ty.int32)
+    task.add_scalar_arg(learning_rate, ty.float64)
+    task.add_scalar_arg(pred.size, ty.int64)
+    task.add_scalar_arg(preround_gradients, ty.bool_)
+
+    # a constant hessian is written as a single column of weights
+    h_columns = 1 if objective.constant_hessian else n_outputs
+    g = get_legate_runtime().create_store(ty.float64, (n_rows, n_outputs))
+    h = get_legate_runtime().create_store(ty.float64, (n_rows, h_columns))
+    for store in (g, h):
+        task.add_output(
+            store.partition_by_tiling((rows_per_tile, store.shape[1])),
+            projection=(dimension(0), constant(0)),
+        )
+
+    if get_legate_runtime().machine.count(TaskTarget.GPU) > 1:
+        task.add_nccl_communicator()
+    elif get_legate_runtime().machine.count() > 1:
+        task.add_cpu_communicator()
+
+    task.execute()
+    return cn.array(g, copy=False), cn.array(h, copy=False)
@@ -0,0 +1,361 @@
+import math
+from enum import IntEnum
+from typing import Dict, Optional, Sequence, Tuple
+
+import cunumeric as cn
+from legate.core import constant, dimension, get_legate_runtime, types
+
+from .launch import LaunchPlan, get_launch_planner
+from .library import user_context, user_lib
+from .utils import get_store
+
+
+class _QuantileOpCode(IntEnum):
+    QUANTILE_SKETCH = user_lib.cffi.QUANTILE_SKETCH
+    QUANTILE_MERGE = user_lib.cffi.QUANTILE_MERGE
+    QUANTISE = user_lib.cffi.QUANTISE
+
+
+# Each tile of rows is summarised with this many weighted points per bin, so
+# the rank error of the merged sketch is at most 1 / (8 * n_bins)
+_SUMMARY_POINTS_PER_BIN = 8
+# The rows are summarised in at most this many tiles of at least this many
+# rows, whatever the number of processors
+_SKETCH_MAX_TILES = 32
+_SKETCH_MIN_ROWS_PER_TILE = 1024
+
+
+def quantile_sketch(
+    X: cn.ndarray, sample_weight: Optional[cn.ndarray], n_bins: int
+) -> cn.ndarray:
+    """Computes approximate weighted quantiles of each feature, to be used as
+    split proposals for tree models.
+
+    Each tile of rows is summarised with a fixed number of weighted points
+    per feature. The summaries are merged to find ``n_bins`` cut points per
+    feature, in parallel over blocks of features, so the data is read only
+    once. The tiles depend only on the
+    number of rows, not on the number of processors, so the cut points, and
+    the trees built on them, are the same on any machine.
+
+    Parameters
+    ----------
+    X :
+        The training data.
+    sample_weight :
+        Weight of each row. If None, rows are equally weighted. Rows with zero
+        weight are ignored.
+    n_bins :
+        The number of cut points for each feature. Clipped to the number of rows.
+
+    Returns
+    -------
+    cn.ndarray of shape (n_bins, n_features)
+        Sorted cut points for each feature. The last cut point is the maximum
+        value of the feature. Cut points may be repeated if a feature has
+        fewer than ``n_bins`` distinct values.
+    """
+    n_rows, n_features = X.shape
+    n_bins = max(1, min(n_bins, n_rows))
+    if sample_weight is None:
+        sample_weight = cn.ones(n_rows)
+    sample_weight = sample_weight.astype(cn.float64).reshape((n_rows, 1))
+
+    num_tiles = max(1, min(_SKETCH_MAX_TILES, n_rows // _SKETCH_MIN_ROWS_PER_TILE))
+    rows_per_tile = max(1, int(math.ceil(n_rows / num_tiles)))
+    summary_size = n_bins * _SUMMARY_POINTS_PER_BIN
+
+    # Sketch tasks run on CPUs and need no communication, so there may be more
+    # tiles than processors
+    task = get_legate_runtime().create_manual_task(
+        user_context, _QuantileOpCode.QUANTILE_SKETCH, [num_tiles, 1]
+    )
+    task.add_input(
+        get_store(X).partition_by_tiling((rows_per_tile, n_features)),
+        projection=(dimension(0), constant(0)),
+    )
+    task.add_input(
+        get_store(sample_weight).partition_by_tiling((rows_per_tile, 1)),
+        projection=(dimension(0), constant(0)),
+    )
+    summaries = [
+        get_legate_runtime().create_store(
+            types.float64, (num_tiles * summary_size, n_features)
+        )
+        for _ in range(2)
+    ]
+    for summary in summaries:
+        task.add_output(
+            summary.partition_by_tiling((summary_size, n_features)),
+            projection=(dimension(0), constant(0)),
+        )
+    task.execute()
+
+    # Features are merged independently, in one block of features per processor
+    num_blocks = max(1, min(n_features, len(get_legate_runtime().machine)))
+    features_per_block = int(math.ceil(n_features / num_blocks))
+    num_blocks = int(math.ceil(n_features / features_per_block))
+    task = get_legate_runtime().create_manual_task(
+        user_context, _QuantileOpCode.QUANTILE_MERGE, [1, num_blocks]
+    )
+    for summary in summaries:
+        task.add_input(
+            summary.partition_by_tiling((num_tiles * summary_size, features_per_block)),
+            projection=(constant(0), dimension(1)),
+        )
+    split_proposals = get_legate_runtime().create_store(
+        get_store(X).type, (n_bins, n_features)
+    )
+    task.add_output(
+        split_proposals.partition_by_tiling((n_bins, features_per_block)),
+        projection=(constant(0), dimension(1)),
+    )
+    task.execute()
+    return cn.array(split_proposals, copy=False)
+
+
+def quantise(
+    X: cn.ndarray, split_proposals: cn.ndarray, plan: Optional[LaunchPlan] = None
+) -> cn.ndarray:
+    """Replaces each feature value with the index of its bin.
+
+    A value is assigned to the first bin whose split proposal is greater than
+    or equal to it, so ``x <= split_proposals[b, j]`` exactly when the bin of
+    ``x`` is at most ``b``. Values above every proposal go to the last bin and
+    missing values (NaN) go to an extra bin ``n_bins`` after every proposal.
+
+    Parameters
+    ----------
+    X :
+        The training data.
+    split_proposals :
+        Sorted split candidates of shape (n_bins, n_features).
+    plan :
+        The launch of the tree task reading the result, so its row tiles are
+        reused without copies. If None, a tree of depth one is planned.
+
+    Returns
+    -------
+    cn.ndarray of shape (n_rows, n_features)
+        Bin indices, stored as uint8 if there are at most 256 bins (including
+        the bin of missing values, if any) and as uint16 otherwise.
+    """
+    n_rows, n_features = X.shape
+    n_bins = split_proposals.shape[0]
+    has_missing = X.dtype.kind == "f" and bool(cn.isnan(X).any())
+    n_codes = n_bins + int(has_missing)
+    if n_codes > 2**16:
+        raise ValueError("At most 65536 bins are supported, got {}.".format(n_codes))
+    bin_type = types.uint8 if n_codes <= 2**8 else types.uint16
+    if plan is None:
+        plan = get_launch_planner().plan("build_tree", n_rows, n_features, 1, 1, n_bins)
+    num_procs, rows_per_tile = plan.num_procs, plan.rows_per_tile
+
+    task = get_legate_runtime().create_manual_task(
+        user_context, _QuantileOpCode.QUANTISE, [num_procs, 1]
+    )
+    task.add_input(
+        get_store(X).partition_by_tiling((rows_per_tile, n_features)),
+        projection=(dimension(0), constant(0)),
+    )
+    task.add_input(get_store(split_proposals.astype(cn.float64)))
+    X_binned = get_legate_runtime().create_store(bin_type, (n_rows, n_features))
+    task.add_output(
+        X_binned.partition_by_tiling((rows_per_tile, n_features)),
+        projection=(dimension(0), constant(0)),
+    )
+    task.execute()
+    return cn.array(X_binned, copy=False)
+
+
+def categorical_proposals(
+    X: cn.ndarray,
+    split_proposals: cn.ndarray,
+    n_bins: int,
+    categorical_features: Sequence[int],
+) -> cn.ndarray:
+    """Replaces the split proposals of categorical features so that each
+    category is its own bin.
+
+    Proposal ``b`` of a categorical feature is ``b``, so quantising maps
+    category ``c`` to bin ``c``.
+
+    Parameters
+    ----------
+    X :
+        The training data.
+    split_proposals :
+        Split proposals of shape (n, n_features) from :func:`quantile_sketch`,
+        with at most ``n_bins`` rows.
+    n_bins :
+        The number of bins. Categories must be integers in ``[0, n_bins)``.
+    categorical_features :
+        Columns of X holding categories.
+
+    Returns
+    -------
+    cn.ndarray of shape (n_bins, n_features)
+        The split proposals, padded to ``n_bins`` rows by repeating the last
+        proposal of numerical features.
+    """
+    for j in categorical_features:
+        x = X[:, j]
+        invalid = ~cn.isnan(x) & ((x < 0) | (x >= n_bins) | (x != cn.floor(x)))
+        if invalid.any():
+            raise ValueError(
+                "Categorical feature {} must hold integers in [0, {}) or NaN, "
+                "increase n_bins for more categories.".format(j, n_bins)
+            )
+    n_proposals = split_proposals.shape[0]
+    if n_proposals < n_bins:
+        padding = cn.repeat(split_proposals[-1:], n_bins - n_proposals, axis=0)
+        split_proposals = cn.concatenate([split_proposals, padding])
+    categories = cn.arange(n_bins, dtype=split_proposals.dtype)
+    for j in categorical_features:
+        split_proposals[:, j] = categories
+    return split_proposals
+
+
+class QuantileDMatrix:
+    """Training data together with its quantised representation.
+
+    Tree models do not need the raw feature values, only the bin of each value
+    with respect to the split proposals. Quantising the data once and reusing
+    it for every boosting round reduces the memory traffic of building each
+    tree by a factor of 4-8. The raw data is kept for models that need it.
+
+    Quantisation is lazy and cached for each number of bins and set of
+    categorical features, so the data is only sketched if a tree model is
+    trained.
+
+    Parameters
+    ----------
+    X :
+        The training data.
+    sample_weight :
+        Weight of each row used to sketch the split proposals. If None, rows
+        are equally weighted.
+    """
+
+    def __init__(self, X: cn.ndarray, sample_weight: Optional[cn.ndarray] = None):
+        self._data = X
+        self.sample_weight = sample_weight
+        self._proposals: Dict[Tuple[int, Tuple[int, ...]], cn.ndarray] = {}
+        self._quantised: Dict[
+            Tuple[int, Tuple[int, ...]], Tuple[cn.ndarray, cn.ndarray]
+        ] = {}
+
+    @property
+    def data(self) -> cn.ndarray:
+        return self._data
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.data.shape
+
+    def quantise(
+        self,
+        n_bins: int,
+        categorical_features: Tuple[int, ...] = (),
+        plan: Optional[LaunchPlan] = None,
+    ) -> Tuple[cn.ndarray, cn.ndarray]:
+        """Returns the split proposals and the quantised data for ``n_bins``
+        bins.
+
+        Parameters
+        ----------
+        n_bins :
+            The number of split candidates per feature.
+        categorical_features :
+            Columns holding categories, which are binned by category. See
+            :func:`categorical_proposals`.
+        plan :
+            The launch of the tree task reading the quantised data, see
+            :func:`quantise`. Only used the first time the data is quantised.
+
+        Returns
+        -------
+        Tuple[cn.ndarray, cn.ndarray]
+            Split proposals of shape (n_bins, n_features) as float64 and the
+            bin index of each element of the data.
+        """
+        key = (n_bins, categorical_features)
+        if key not in self._quantised:
+            split_proposals = self._split_proposals(n_bins, categorical_features)
+            self._quantised[key] = (
+                split_proposals,
+                quantise(self.data, split_proposals, plan),
+            )
+        return self._quantised[key]
+
+    def _split_proposals(
+        self, n_bins: int, categorical_features: Tuple[int, ...]
+    ) -> cn.ndarray:
+        key = (n_bins, categorical_features)
+        if key not in self._proposals:
+            split_proposals = quantile_sketch(
+                self.data, self.sample_weight, n_bins
+            ).astype(cn.float64)
+            if categorical_features:
+                split_proposals = categorical_proposals(
+                    self.data, split_proposals, n_bins, categorical_features
+                )
+            self._proposals[key] = split_proposals
+        return self._proposals[key]
+
+    def take(self, rows: cn.ndarray) -> "QuantileDMatrix":
+        """Returns a subset of the rows of this matrix.
+
+        The subset shares the split proposals of this matrix. Its rows are
+        gathered and quantised when first used, tiled by the plan of the tree
+        reading them.
+
+        Parameters
+        ----------
+        rows :
+            Indices of the rows to keep.
+
+        Returns
+        -------
+        QuantileDMatrix
+            The selected rows.
+        """
+        return _QuantileDMatrixRows(self, rows)
+
+
+class _QuantileDMatrixRows(QuantileDMatrix):
+    def __init__(self, parent: QuantileDMatrix, rows: cn.ndarray):
+        self._parent = parent
+        self._rows = rows
+        self._subset: Optional[cn.ndarray] = None
+        self.sample_weight = (
+            None if parent.sample_weight is None else parent.sample_weight[rows]
+        )
+        self._quantised = {}
+
+    @property
+    def data(self) -> cn.ndarray:
+        if self._subset is None:
+            self._subset = self._parent.data[self._rows]
+        return self._subset
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return (self._rows.shape[0], self._parent.shape[1])
+
+    def quantise(
+        self,
+        n_bins: int,
+        categorical_features: Tuple[int, ...] = (),
+        plan: Optional[LaunchPlan] = None,
+    ) -> Tuple[cn.ndarray, cn.ndarray]:
+        key = (n_bins, categorical_features)
+        if key not in self._quantised:
+            split_proposals = self._parent._split_proposals(
+                n_bins, categorical_features
+            )
+            self._quantised[key] = (
+                split_proposals,
+                quantise(self.data, split_proposals, plan),
+            )
+        return self._quantised[key]
@@ -1,8 +1,12 @@
+import pickle
+
 import numpy as np
 import pytest
 
 import cunumeric as cn
 import legateboost as lb
+from legateboost.models.tree import Forest
+from legateboost.quantile import QuantileDMatrix
 
 from ..utils import non_increasing
 from .utils import check_determinism
@@ -35,3 +39,436 @@ def test_improving_with_depth(num_outputs):
 
     assert non_increasing(metrics)
     assert metrics[-1] < metrics[0]
+
+
+@pytest.mark.parametrize("n_bins", [1, 2, 8])
+def test_n_bins(n_bins):
+    # a step function of a single feature is recovered exactly by a stump
+    # once the step value is among the split candidates
+    X = cn.array(np.arange(64, dtype=np.float64).reshape(-1, 1))
+    y = cn.where(X[:, 0] < 32, 0.0, 1.0).reshape(-1, 1)
+    g = -y
+    h = cn.ones(g.shape)
+    model = (
+        lb.models.Tree(max_depth=1, n_bins=n_bins)
+        .set_random_state(np.random.RandomState(2))
+        .fit(X, g, h)
+    )
+    loss = float(((model.predict(X) - y) ** 2).mean())
+    if n_bins == 1:
+        assert model.feature[0] == -1
+    else:
+        assert model.split_value[0] == 31.0
+        assert loss == 0.0
+
+
+@pytest.mark.parametrize("num_outputs", [1, 3])
+def test_node_statistics(num_outputs):
+    # histograms of one child in each pair are found by subtraction from the parent
+    # check the statistics of every node against the rows it contains
+    rs = np.random.RandomState(0)
+    X = rs.random((500, 4))
+    g = rs.normal(size=(X.shape[0], num_outputs))
+    h = rs.random(g.shape) + 0.1
+    model = lb.models.Tree(max_depth=5).fit(cn.array(X), cn.array(g), cn.array(h))
+    feature = np.array(model.feature)
+    split_value = np.array(model.split_value)
+    leaf_value = np.array(model.leaf_value)
+    hessian = np.array(model.hessian)
+    children = np.array(model.children)
+    positions = np.zeros(X.shape[0], dtype=np.int64)
+    visited = set()
+    while True:
+        for node in np.unique(positions):
+            rows = positions == node
+            visited.add(node)
+            assert np.allclose(hessian[node], h[rows].sum(axis=0))
+            assert np.allclose(
+                leaf_value[node], -g[rows].sum(axis=0) / h[rows].sum(axis=0)
+            )
+        internal = feature[positions] != -1
+        if not internal.any():
+            break
+        left = X[np.arange(X.shape[0]), feature[positions]] <= split_value[positions]
+        positions = np.where(
+            internal, children[positions, np.where(left, 0, 1)], positions
+        )
+    assert len(visited) > 3
+
+
+def _num_leaves(model):
+    feature = np.array(model.feature)
+    children = np.array(model.children)
+    reachable = [0]
+    leaves = 0
+    while reachable:
+        node = reachable.pop()
+        if feature[node] == -1:
+            leaves += 1
+        else:
+            reachable += list(children[node])
+    return leaves
+
+
+def test_lossguide():
+    rs = np.random.RandomState(0)
+    X = rs.random((500, 10))
+    g = rs.normal(size=(X.shape[0], 2))
+    h = rs.random(g.shape) + 0.1
+    X, g, h = cn.array(X), cn.array(g), cn.array(h)
+    y = -g / h
+    metrics = []
+    for max_leaves in [2, 4, 8, 16, 32]:
+        model = lb.models.Tree(
+            max_depth=8, grow_policy="lossguide", max_leaves=max_leaves
+        ).fit(X, g, h)
+        assert _num_leaves(model) <= max_leaves
+        loss = ((model.predict(X) - y) ** 2 * h).sum(axis=0) / h.sum(axis=0)
+        metrics.append(loss.mean())
+    assert non_increasing(metrics)
+
+    # without a leaf budget both policies expand every node with positive gain
+    depthwise = lb.models.Tree(max_depth=4).fit(X, g, h)
+    lossguide = lb.models.Tree(max_depth=4, grow_policy="lossguide").fit(X, g, h)
+    # nodes are numbered in a different order
+    assert _num_leaves(depthwise) == _num_leaves(lossguide)
+    assert cn.allclose(depthwise.predict(X), lossguide.predict(X))
+
+    with pytest.raises(ValueError, match="grow_policy"):
+        lb.models.Tree(max_depth=4, grow_policy="breadthfirst").fit(X, g, h)
+
+
+def test_compact_nodes():
+    # deep trees only store the nodes they create
+    rs = np.random.RandomState(0)
+    X = rs.random((1000, 4))
+    g = rs.normal(size=(X.shape[0], 1))
+    h = np.ones(g.shape)
+    X, g, h = cn.array(X), cn.array(g), cn.array(h)
+    model = lb.models.Tree(max_depth=30, grow_policy="lossguide", max_leaves=20).fit(
+        X, g, h
+    )
+    # the unused capacity is dropped when the tree is pickled
+    fitted_pred = model.predict(X)
+    model = pickle.loads(pickle.dumps(model))
+    assert cn.allclose(model.predict(X), fitted_pred)
+    assert model.feature.shape == (2 * _num_leaves(model) - 1,)
+    assert model.children.shape == (model.feature.shape[0], 2)
+    internal = np.array(model.feature) != -1
+    children = np.array(model.children)
+    assert np.all(children[~internal] == -1)
+    # every node except the root is the child of exactly one node
+    assert sorted(children[internal].ravel()) == list(range(1, len(internal)))
+    assert cn.allclose(model.update(X, g, h).predict(X), model.predict(X))
+
+
+@pytest.mark.parametrize("num_outputs", [1, 3])
+def test_predict_forest(num_outputs):
+    rs = np.random.RandomState(0)
+    X = cn.array(rs.random((200, 5)))
+    g = cn.array(rs.normal(size=(X.shape[0], num_outputs)))
+    h = cn.ones(g.shape)
+    trees = [lb.models.Tree(max_depth=d).fit(X, g, h) for d in [0, 3, 1, 6]]
+    expected = sum(t.predict(X) for t in trees)
+    forest = Forest(trees)
+    assert forest.n_trees == len(trees)
+    assert cn.allclose(forest.predict(X), expected)
+
+
+def test_predict_deep_tree():
+    # lossguide trees with max_leaves may be deeper than 100 levels
+    depth = 150
+    n_nodes = 2 * depth + 1
+    # node 2 * i is the split at depth i, its left child is a leaf
+    internal = np.arange(0, 2 * depth, 2)
+    feature = np.full(n_nodes, -1, dtype=np.int32)
+    feature[internal] = 0
+    split_value = np.zeros(n_nodes)
+    split_value[internal] = np.arange(depth)
+    children = np.full((n_nodes, 2), -1, dtype=np.int32)
+    children[internal, 0] = internal + 1
+    children[internal, 1] = internal + 2
+    leaf_value = np.zeros((n_nodes, 1))
+    leaf_value[internal + 1, 0] = np.arange(depth)
+    leaf_value[-1, 0] = depth
+
+    tree = lb.models.Tree(max_depth=depth)
+    tree.feature = cn.array(feature)
+    tree.split_value = cn.array(split_value)
+    tree.children = cn.array(children)
+    tree.leaf_value = cn.array(leaf_value)
+    tree.default_left = cn.zeros(n_nodes, dtype=bool)
+    tree.categorical = cn.zeros(n_nodes, dtype=bool)
+    tree.categories = cn.zeros((n_nodes, 1), dtype=cn.uint32)
+    X = np.arange(depth + 10, dtype=np.float64).reshape((-1, 1))
+    expected = np.minimum(X, depth)
+    assert np.allclose(tree.predict(cn.array(X)), expected)
+    assert np.allclose(Forest([tree]).predict(cn.array(X)), expected)
+
+
+@pytest.mark.parametrize("grow_policy", ["depthwise", "lossguide"])
+def test_fit_predict(grow_policy):
+    # the leaf values of the training rows are found while building the tree
+    rs = np.random.RandomState(0)
+    X = cn.array(rs.random((300, 5)))
+    g = cn.array(rs.normal(size=(X.shape[0], 2)))
+    h = cn.array(rs.random(g.shape) + 0.1)
+    model = lb.models.Tree(max_depth=6, grow_policy=grow_policy, max_leaves=12)
+    pred = model.fit_predict_dmatrix(QuantileDMatrix(X, h.sum(axis=1)), g, h)
+    assert cn.array_equal(pred, model.predict(X))
+
+
+def _split_features(model, max_depth):
+    # the features split on at each depth
+    feature = np.array(model.feature)
+    children = np.array(model.children)
+    levels = [set() for _ in range(max_depth)]
+    nodes = [0]
+    for depth in range(max_depth):
+        internal = [n for n in nodes if feature[n] != -1]
+        levels[depth].update(feature[internal])
+        nodes = list(children[internal].ravel())
+    return levels
+
+
+@pytest.mark.parametrize("grow_policy", ["depthwise", "lossguide"])
+def test_colsample(grow_policy):
+    rs = np.random.RandomState(0)
+    X = cn.array(rs.random((500, 20)))
+    g = cn.array(rs.normal(size=(X.shape[0], 1)))
+    h = cn.ones(g.shape)
+    model = lb.models.Tree(
+        max_depth=4, grow_policy=grow_policy, colsample_bytree=0.25
+    ).set_random_state(np.random.RandomState(0))
+    levels = _split_features(model.fit(X, g, h), 4)
+    assert 1 <= len(set.union(*levels)) <= 5
+
+    model = lb.models.Tree(
+        max_depth=4,
+        grow_policy=grow_policy,
+        colsample_bytree=0.5,
+        colsample_bylevel=0.2,
+    ).set_random_state(np.random.RandomState(0))
+    levels = _split_features(model.fit(X, g, h), 4)
+    assert len(set.union(*levels)) <= 10
+    assert all(len(level) <= 2 for level in levels)
+    # children are built without histogram subtraction but reach the same leaves
+    pred = model.fit_predict_dmatrix(QuantileDMatrix(X, h.sum(axis=1)), g, h)
+    assert cn.array_equal(pred, model.predict(X))
+
+    with pytest.raises(ValueError, match="colsample_bylevel"):
+        lb.models.Tree(max_depth=2, colsample_bylevel=0.0).fit(X, g, h)
+
+
+def test_quantised_gradients():
+    check_determinism(lb.models.Tree(max_depth=6, quantised_gradient_bits=8))
+
+    # learns nearly as well as full precision gradients
+    rs = np.random.RandomState(0)
+    X = cn.array(rs.random((1000, 5)))
+    y = X[:, 0] + 2 * X[:, 1]
+    g = -y[:, cn.newaxis]
+    h = cn.ones(g.shape)
+    losses = []
+    for bits in [None, 8]:
+        model = lb.models.Tree(
+            max_depth=4, quantised_gradient_bits=bits
+        ).set_random_state(np.random.RandomState(0))
+        pred = model.fit(X, g, h).predict(X)
+        losses.append(float(((pred[:, 0] - y) ** 2).mean()))
+    assert losses[1] < losses[0] * 1.1
+
+    with pytest.raises(ValueError, match="quantised_gradient_bits"):
+        lb.models.Tree(max_depth=2, quantised_gradient_bits=32).fit(X, g, h)
+    # the sums over every row must fit in 32 bits
+    X = cn.array(rs.random((70000, 1)))
+    g, h = cn.ones((X.shape[0], 1)), cn.ones((X.shape[0], 1))
+    lb.models.Tree(max_depth=2, quantised_gradient_bits=15).fit(X, g, h)
+    with pytest.raises(ValueError, match="rows in 32 bits"):
+        lb.models.Tree(max_depth=2, quantised_gradient_bits=16).fit(X, g, h)
+
+
+@pytest.mark.parametrize("grow_policy", ["depthwise", "lossguide"])
+def test_tree_method(grow_policy):
+    # workers searching their own features find the same splits as every worker
+    # searching all features
+    rs = np.random.RandomState(0)
+    X = cn.array(rs.random((1000, 13)))
+    g = cn.array(rs.normal(size=(X.shape[0], 2)))
+    h = cn.array(rs.random(g.shape) + 0.1)
+    models = [
+        lb.models.Tree(max_depth=5, grow_policy=grow_policy, tree_method=method)
+        .set_random_state(np.random.RandomState(0))
+        .fit(X, g, h)
+        for method in ["allreduce", "reduce_scatter"]
+    ]
+    assert models[0] == models[1]
+
+    with pytest.raises(ValueError, match="tree_method"):
+        lb.models.Tree(max_depth=2, tree_method="foo").fit(X, g, h)
+
+
+def test_voting():
+    rs = np.random.RandomState(0)
+    X = cn.array(rs.random((1000, 13)))
+    g = cn.array(rs.normal(size=(X.shape[0], 2)))
+    h = cn.array(rs.random(g.shape) + 0.1)
+
+    def fit(**kwargs):
+        return (
+            lb.models.Tree(max_depth=5, **kwargs)
+            .set_random_state(np.random.RandomState(0))
+            .fit(X, g, h)
+        )
+
+    # voting for enough features to select every feature finds the best splits
+    assert fit(tree_method="voting", voting_top_k=7) == fit(tree_method="allreduce")
+    model = fit(tree_method="voting", voting_top_k=1)
+    assert cn.any(model.feature >= 0)
+    assert cn.all(model.gain[model.feature >= 0] > 0.0)
+
+    with pytest.raises(ValueError, match="voting_top_k"):
+        fit(tree_method="voting", voting_top_k=0)
+
+
+def test_voting_categorical():
+    # workers vote with the gain of categorical partitions, which is far higher than
+    # that of any threshold on the category order here
+    rs = np.random.RandomState(0)
+    X = rs.random((1000, 5))
+    X[:, 4] = rs.randint(0, 16, size=X.shape[0])
+    g = np.where(X[:, 4] % 2 == 0, -1.0, 1.0) + np.where(X[:, 0] > 0.5, -0.5, 0.5)
+    X, g = cn.array(X), cn.array(g[:, np.newaxis])
+    h = cn.ones(g.shape)
+    model = lb.models.Tree(
+        max_depth=1, tree_method="voting", voting_top_k=1, categorical_features=[4]
+    ).fit(X, g, h)
+    assert model.feature[0] == 4
+    assert model.categorical[0]
+
+
+@pytest.mark.parametrize("num_outputs", [1, 3])
+def test_missing_values(num_outputs):
+    rs = np.random.RandomState(0)
+    X = rs.random((500, 4))
+    g = rs.normal(size=(X.shape[0], num_outputs))
+    h = rs.random(g.shape) + 0.1
+    # rows missing the first feature have a large negative gradient
+    missing = rs.random(X.shape[0]) < 0.2
+    X[missing, 0] = np.nan
+    g[missing] = -5.0
+    model = lb.models.Tree(max_depth=5).fit(cn.array(X), cn.array(g), cn.array(h))
+    feature = np.array(model.feature)
+    split_value = np.array(model.split_value)
+    default_left = np.array(model.default_left)
+    hessian = np.array(model.hessian)
+    children = np.array(model.children)
+    assert feature[0] == 0
+
+    # every row follows the default direction when its feature is missing
+    positions = np.zeros(X.shape[0], dtype=np.int64)
+    while True:
+        for node in np.unique(positions):
+            rows = positions == node
+            assert np.allclose(hessian[node], h[rows].sum(axis=0))
+        internal = feature[positions] != -1
+        if not internal.any():
+            break
+        x = X[np.arange(X.shape[0]), feature[positions]]
+        left = np.where(
+            np.isnan(x), default_left[positions], x <= split_value[positions]
+        )
+        positions = np.where(
+            internal, children[positions, np.where(left, 0, 1)], positions
+        )
+    leaf_value = np.array(model.leaf_value)
+    assert np.allclose(model.predict(cn.array(X)), leaf_value[positions])
+    assert np.allclose(Forest([model]).predict(cn.array(X)), leaf_value[positions])
+
+    # updating with the training data recovers the leaf values
+    updated = model.update(cn.array(X), cn.array(g), cn.array(h))
+    assert np.allclose(np.array(updated.leaf_value), leaf_value)
+
+
+def test_missing_values_estimator():
+    rs = np.random.RandomState(0)
+    X = rs.random((500, 4))
+    y = X[:, 0] + X[:, 1]
+    X[rs.random(X.shape) < 0.1] = np.nan
+    model = lb.LBRegressor(n_estimators=5).fit(X, y)
+    pred = np.array(model.predict(X))
+    assert np.isfinite(pred).all()
+    assert np.allclose(model.to_numpy_predictor().predict(X), pred)
+    with pytest.raises(ValueError, match="inf"):
+        X[0, 0] = np.inf
+        model.predict(X)
+    with pytest.raises(ValueError, match="NaN"):
+        lb.LBRegressor(base_models=(lb.models.Linear(),)).fit(X * 0.0, y)
+
+
+@pytest.mark.parametrize("num_outputs", [1, 3])
+def test_categorical(num_outputs):
+    rs = np.random.RandomState(0)
+    n_categories = 20
+    X = rs.random((500, 2))
+    X[:, 0] = rs.randint(0, n_categories, X.shape[0])
+    # even categories have a large negative gradient, so no threshold on the
+    # category codes separates them
+    even = X[:, 0] % 2 == 0
+    g = np.where(even, -1.0, 1.0)[:, np.newaxis].repeat(num_outputs, axis=1)
+    h = np.ones(g.shape)
+    model = lb.models.Tree(max_depth=1, categorical_features=[0]).fit(
+        cn.array(X), cn.array(g), cn.array(h)
+    )
+    assert model.feature[0] == 0
+    assert model.categorical[0]
+    left = set(model.left_categories(0))
+    evens = set(range(0, n_categories, 2))
+    assert left in (evens, set(range(n_categories)) - evens)
+    assert "f0 in {" in str(model)
+
+    # the split separates the two groups exactly
+    pred = np.array(model.predict(cn.array(X)))
+    assert np.allclose(pred[even], pred[even][0])
+    assert np.allclose(pred[~even], pred[~even][0])
+    assert (pred[even] > pred[~even][0]).all()
+    assert np.allclose(Forest([model]).predict(cn.array(X)), pred)
+    updated = model.update(cn.array(X), cn.array(g), cn.array(h))
+    assert np.allclose(np.array(updated.leaf_value), np.array(model.leaf_value))
+
+    # unseen categories and values that are not categories go right
+    X_test = np.array([[n_categories + 5, 0.5], [1.5, 0.5], [-1.0, 0.5]])
+    right = np.array(model.leaf_value)[model.right_child(0)]
+    assert np.allclose(model.predict(cn.array(X_test)), right)
+
+
+def test_categorical_estimator():
+    rs = np.random.RandomState(0)
+    X = rs.random((500, 3))
+    X[:, 0] = rs.randint(0, 40, X.shape[0])
+    effect = rs.normal(size=40)
+    y = effect[X[:, 0].astype(int)] + X[:, 1]
+    X[rs.random(X.shape[0]) < 0.1, 0] = np.nan
+    categorical = lb.LBRegressor(
+        n_estimators=10,
+        base_models=(lb.models.Tree(max_depth=3, categorical_features=[0]),),
+    ).fit(X, y)
+    numerical = lb.LBRegressor(
+        n_estimators=10, base_models=(lb.models.Tree(max_depth=3),)
+    ).fit(X, y)
+    pred = np.array(categorical.predict(X))
+    mse = ((pred - y) ** 2).mean()
+    assert mse < ((np.array(numerical.predict(X)) - y) ** 2).mean()
+    assert np.allclose(categorical.to_numpy_predictor().predict(X), pred)
+
+    with pytest.raises(ValueError, match="categorical_features"):
+        lb.LBRegressor(
+            n_estimators=1,
+            base_models=(lb.models.Tree(max_depth=3, categorical_features=[3]),),
+        ).fit(X, y)
+    X[0, 0] = 0.5
+    with pytest.raises(ValueError, match="Categorical feature 0"):
+        lb.LBRegressor(
+            n_estimators=1,
+            base_models=(lb.models.Tree(max_depth=3, categorical_features=[0]),),
+        ).fit(X, y)
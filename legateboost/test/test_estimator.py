@@ -1,3 +1,5 @@
+import pickle
+
 import numpy as np
 import pytest
 from sklearn.utils.estimator_checks import parametrize_with_checks
@@ -161,3 +163,157 @@ def test_normal_distribution():
     pred = model.predict(X)[0]
     assert cn.allclose(pred[0], y.mean(), atol=1e-2)
     assert cn.all(pred[1] == -5)
+
+
+def test_forest():
+    np.random.seed(2)
+    X = np.random.random((200, 5))
+    y = np.random.random((X.shape[0], 2))
+    model = lb.LBRegressor(
+        n_estimators=10,
+        random_state=2,
+        base_models=(lb.models.Tree(max_depth=3), lb.models.Linear()),
+    ).fit(X, y)
+    assert model.forest_.n_trees == 5
+    expected = model.model_init_ + sum(m.predict(X) for m in model.models_)
+    assert cn.allclose(model.predict(X), expected)
+
+    # the forest is rebuilt from the trees after pickling
+    state = model.__getstate__()
+    assert "forest_" not in state
+    loaded = pickle.loads(pickle.dumps(model))
+    assert loaded.forest_.n_trees == 5
+    assert cn.allclose(loaded.predict(X), model.predict(X))
+
+    # updating changes the leaves of the packed trees
+    model.update(X, 1.0 - y)
+    expected = model.model_init_ + sum(m.predict(X) for m in model.models_)
+    assert cn.allclose(model.predict(X), expected)
+
+
+@pytest.mark.parametrize(
+    "base_models",
+    [
+        (lb.models.Tree(max_depth=3),),
+        (lb.models.Tree(max_depth=2), lb.models.Linear(), lb.models.KRR()),
+    ],
+)
+@pytest.mark.parametrize("objective", ["squared_error", "normal", "log_loss"])
+def test_numpy_predictor(base_models, objective):
+    np.random.seed(2)
+    X = np.random.random((100, 4))
+    if objective == "log_loss":
+        y = np.random.randint(0, 3, X.shape[0])
+        model = lb.LBClassifier(
+            n_estimators=5, random_state=2, base_models=base_models
+        ).fit(X, y)
+    else:
+        y = np.random.random((X.shape[0], 2))
+        model = lb.LBRegressor(
+            n_estimators=5, objective=objective, random_state=2, base_models=base_models
+        ).fit(X, y)
+    predictor = model.to_numpy_predictor()
+    assert np.allclose(predictor.predict(X), model.predict(X))
+    # a single row may be passed as a 1-d array
+    assert np.allclose(predictor.predict(X[0]), model.predict(X[:1]))
+    if objective == "log_loss":
+        assert np.allclose(predictor.predict_proba(X), model.predict_proba(X))
+    else:
+        with pytest.raises(ValueError, match="classifiers"):
+            predictor.predict_proba(X)
+
+
+class NegativeMSEMetric(lb.MSEMetric):
+    def metric(self, y, pred, w):
+        return -super().metric(y, pred, w)
+
+    def name(self):
+        return "neg_mse"
+
+    def minimize(self):
+        return False
+
+
+@pytest.mark.parametrize("metric", ["mse", NegativeMSEMetric()])
+def test_early_stopping(metric):
+    np.random.seed(2)
+    X = np.random.random((200, 5))
+    y = X[:, 0] + np.random.normal(scale=0.5, size=X.shape[0])
+    X_eval = np.random.random((200, 5))
+    y_eval = X_eval[:, 0] + np.random.normal(scale=0.5, size=X_eval.shape[0])
+    eval_result = {}
+    model = lb.LBRegressor(
+        n_estimators=500,
+        learning_rate=0.5,
+        metric=metric,
+        random_state=2,
+        base_models=(lb.models.Tree(max_depth=6),),
+        early_stopping_rounds=5,
+    ).fit(X, y, eval_set=[(X_eval, y_eval)], eval_result=eval_result)
+    eval_metric = np.array(next(iter(eval_result["eval-0"].values())))
+    if isinstance(metric, NegativeMSEMetric):
+        eval_metric = -eval_metric
+    assert len(eval_metric) < 500
+    assert len(eval_metric) == model.best_iteration_ + 6
+    assert len(model.models_) == model.best_iteration_ + 1
+    assert model.best_iteration_ == np.argmin(eval_metric)
+    # predictions use the truncated models
+    mse = lb.MSEMetric().metric(
+        cn.array(y_eval), model.predict(X_eval), cn.ones(X_eval.shape[0])
+    )
+    assert np.isclose(mse, eval_metric.min())
+
+    with pytest.raises(ValueError, match="eval_set"):
+        model.fit(X, y)
+
+    # refitting without early stopping forgets the best iteration
+    model.set_params(early_stopping_rounds=None, n_estimators=3).fit(X, y)
+    assert not hasattr(model, "best_iteration_")
+    assert len(model.models_) == 3
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"subsample": 0.5},
+        {"goss_top_rate": 0.2, "goss_other_rate": 0.1},
+        {"goss_top_rate": 0.2, "goss_other_rate": 0.0},
+    ],
+)
+@pytest.mark.parametrize(
+    "base_models",
+    [(lb.models.Tree(max_depth=3),), (lb.models.Linear(),), (lb.models.KRR(),)],
+)
+def test_row_sampling(params, base_models):
+    np.random.seed(2)
+    X = np.random.random((500, 5))
+    y = X[:, 0] + X[:, 1]
+    eval_result = {}
+    model = lb.LBRegressor(
+        n_estimators=10, random_state=2, base_models=base_models, **params
+    ).fit(X, y, eval_result=eval_result)
+    assert non_increasing(eval_result["train"]["mse"])
+    sanity_check_models(model)
+    # the same random state samples the same rows
+    other = lb.LBRegressor(
+        n_estimators=10, random_state=2, base_models=base_models, **params
+    ).fit(X, y)
+    assert cn.allclose(model.predict(X), other.predict(X))
+
+    with pytest.raises(ValueError, match="GOSS"):
+        lb.LBRegressor(subsample=0.5, goss_top_rate=0.2).fit(X, y)
+
+
+def test_goss_weights():
+    rs = np.random.RandomState(0)
+    g = rs.normal(size=(1000, 2))
+    model = lb.LBRegressor(goss_top_rate=0.1, goss_other_rate=0.2)
+    model.random_state_ = np.random.RandomState(0)
+    weights = np.array(model._sample_weights(cn.array(g)))
+    assert weights.shape == (g.shape[0], 1)
+    # the rows with the largest gradients are kept with weight one
+    top = np.argsort(-np.abs(g).sum(axis=1))[:100]
+    assert (weights[top] == 1.0).all()
+    # the other rows are dropped or scaled up by 1 / p_other
+    other = np.delete(weights, top)
+    assert set(np.unique(other)) <= {0.0, 1.0 / (0.2 / 0.9)}
@@ -0,0 +1,98 @@
+import json
+
+import numpy as np
+import pytest
+
+import cunumeric as cn
+import legateboost as lb
+from legateboost.launch import (
+    CostModel,
+    CostModelPlanner,
+    LaunchPlan,
+    LaunchPlanner,
+    MinRowsPlanner,
+    _machine_key,
+    get_launch_planner,
+    use_launch_planner,
+)
+from legateboost.models.tree import Forest
+
+
+def test_launch_plan_covers_rows():
+    for n_rows in [0, 1, 7, 100, 101]:
+        for num_procs in [1, 3, 8]:
+            plan = LaunchPlan.from_procs(num_procs, n_rows)
+            assert 1 <= plan.num_procs <= max(n_rows, 1)
+            assert plan.num_procs * plan.rows_per_tile >= n_rows
+
+
+def test_cost_model():
+    model = CostModel(cell_time=1e-9, launch_time=1e-4, byte_time=1e-9)
+
+    def best_procs(task, n_rows, n_features):
+        times = [model.time(task, p, n_rows, n_features, 1, 6) for p in range(1, 33)]
+        return int(np.argmin(times)) + 1
+
+    # small batches are not worth the launch and collective overhead
+    assert best_procs("build_tree", 100, 10) == 1
+    assert best_procs("build_tree", 10**8, 10) == 32
+    # for the same work, wide histograms are more expensive to reduce
+    assert best_procs("build_tree", 10**4, 10**4) < best_procs("build_tree", 10**7, 10)
+    with pytest.raises(ValueError, match="Unknown task"):
+        model.time("foo", 1, 10, 10, 1, 6)
+
+
+def test_cost_model_cache(tmp_path):
+    path = tmp_path / "cache.json"
+    cost_model = CostModel(cell_time=1e-9, launch_time=1e-4, byte_time=1e-9)
+    path.write_text(json.dumps({_machine_key(): cost_model.__dict__}))
+    planner = CostModelPlanner(cache_path=str(path))
+    assert planner._load() == cost_model
+    # a missing cost model is never calibrated implicitly
+    with pytest.raises(ValueError, match="calibrate"):
+        CostModelPlanner(cache_path=str(tmp_path / "missing.json"))._load()
+
+
+def test_default_planner():
+    # fitting never times trees unless calibrate is called
+    assert isinstance(get_launch_planner(), MinRowsPlanner)
+
+
+def test_planner_does_not_change_tree():
+    # fixed point gradient sums and the quantile sketch do not depend on the
+    # number of processors. The sketch summarises tiles of more rows than its
+    # 8 * n_bins points, so its summaries are lossy.
+    rs = np.random.RandomState(0)
+    X = cn.array(rs.random((5000, 10)))
+    y = cn.array(rs.random(X.shape[0]))
+
+    def fit():
+        return lb.LBRegressor(
+            n_estimators=5,
+            base_models=(lb.models.Tree(max_depth=3, n_bins=16),),
+            random_state=np.random.RandomState(0),
+        ).fit(X, y)
+
+    with use_launch_planner(MinRowsPlanner(max_procs=1)):
+        single = fit()
+    with use_launch_planner(CostModelPlanner(CostModel(0.0, 0.0, 0.0))):
+        every = fit()
+    for a, b in zip(single.models_, every.models_):
+        assert a == b
+
+
+def test_forest_follows_planner():
+    with pytest.raises(TypeError):
+        LaunchPlanner()
+    rs = np.random.RandomState(0)
+    X = cn.array(rs.random((500, 4)))
+    g = cn.array(rs.normal(size=(X.shape[0], 2)))
+    h = cn.ones(g.shape)
+    trees = [lb.models.Tree(max_depth=d).fit(X, g, h) for d in [1, 3]]
+    forest = Forest(trees)
+    with use_launch_planner(MinRowsPlanner(max_procs=1)):
+        single = forest.predict(X)
+    with use_launch_planner(CostModelPlanner(CostModel(0.0, 0.0, 0.0))):
+        every = forest.predict(X)
+    assert cn.allclose(single, every)
+    assert cn.allclose(single, sum(t.predict(X) for t in trees))
@@ -1,4 +1,5 @@
 import numpy as np
+import pytest
 from sklearn.metrics import (
     log_loss,
     mean_gamma_deviance as skl_gamma_deviance,
@@ -38,6 +39,66 @@ def test_multiple_metrics() -> None:
     assert "exp" in eval_result["train"]
 
 
+def test_deferred_metrics() -> None:
+    np.random.seed(0)
+    X = np.random.random((10, 1))
+    y = np.random.random(X.shape[0])
+    # metrics are computed without waiting for the result
+    value = lb.MSEMetric().metric(cn.array(y), cn.zeros(y.shape), cn.ones(y.shape))
+    assert value.ndim == 0
+
+    # and converted to floats when training ends
+    eval_result = {}
+    model = lb.LBRegressor(n_estimators=3).fit(
+        X, y, eval_set=[(X, y)], eval_result=eval_result
+    )
+    for v in eval_result.values():
+        assert all(isinstance(x, float) for x in v["mse"])
+        assert len(v["mse"]) == 3
+    assert eval_result["train"] == eval_result["eval-0"]
+    model.update(X, y, eval_result=eval_result)
+    assert len(eval_result["train"]["mse"]) == 3
+
+
+def test_eval_period() -> None:
+    np.random.seed(0)
+    X = np.random.random((100, 2))
+    y = np.random.random(X.shape[0])
+    full = {}
+    lb.LBRegressor(n_estimators=10).fit(X, y, eval_set=[(X, y)], eval_result=full)
+    eval_result = {}
+    lb.LBRegressor(n_estimators=10, eval_period=4).fit(
+        X, y, eval_set=[(X, y)], eval_result=eval_result
+    )
+    # rounds 0, 4, 8 and the last round
+    assert eval_result.keys() == full.keys()
+    for k in full:
+        assert np.allclose(
+            eval_result[k]["mse"], [full[k]["mse"][i] for i in [0, 4, 8, 9]]
+        )
+
+    with pytest.raises(ValueError, match="eval_period"):
+        lb.LBRegressor(n_estimators=2, eval_period=0).fit(X, y)
+
+
+def test_train_metric_sample() -> None:
+    np.random.seed(0)
+    X = np.random.random((100, 2))
+    y = np.random.random(X.shape[0])
+    full = {}
+    lb.LBRegressor(n_estimators=5, random_state=0).fit(X, y, eval_result=full)
+    eval_result = {}
+    model = lb.LBRegressor(n_estimators=5, random_state=0, train_metric_sample=20)
+    model.fit(X, y, eval_set=[(X, y)], eval_result=eval_result)
+    assert len(eval_result["train"]["mse"]) == 5
+    # eval sets use all rows
+    assert not np.allclose(eval_result["train"]["mse"], eval_result["eval-0"]["mse"])
+    # more rows than the training set uses all rows
+    model.set_params(train_metric_sample=1000)
+    model.fit(X, y, eval_result=eval_result)
+    assert np.allclose(eval_result["train"]["mse"], full["train"]["mse"])
+
+
 def test_eval_tuple():
     # check weights get registered
     np.random.seed(0)
@@ -127,3 +127,90 @@ def test_exp():
             ),
             False,
         )
+
+
+@pytest.mark.parametrize(
+    "objective,n_outputs",
+    [
+        (lb.SquaredErrorObjective(), 2),
+        (lb.LogLossObjective(), 1),
+        (lb.LogLossObjective(), 3),
+        (lb.ExponentialObjective(), 1),
+        (lb.ExponentialObjective(), 3),
+        (lb.GammaDevianceObjective(), 1),
+        (lb.GammaObjective(), 2),
+        (lb.QuantileObjective(), 3),
+    ],
+)
+def test_native_gradient(objective, n_outputs) -> None:
+    from legateboost.objectives import native_weighted_gradient
+    from legateboost.utils import preround
+
+    rng = cn.random.default_rng(0)
+    n_samples = 100
+    pred = rng.normal(size=(n_samples, n_outputs))
+    if isinstance(objective, (lb.LogLossObjective, lb.ExponentialObjective)):
+        y = rng.integers(0, max(n_outputs, 2), size=(n_samples, 1)).astype(float)
+    elif isinstance(objective, lb.GammaObjective):
+        y = rng.gamma(2.0, size=(n_samples, n_outputs // 2)) + 0.1
+    elif isinstance(objective, lb.QuantileObjective):
+        y = rng.normal(size=(n_samples, 1))
+    else:
+        y = rng.gamma(2.0, size=(n_samples, n_outputs)) + 0.1
+    w = rng.random(n_samples)
+    g, h = native_weighted_gradient(objective, y, pred, w, 0.1)
+    expected_g, expected_h = objective.gradient(y, objective.transform(pred))
+    expected_g = preround(expected_g * w[:, None] * 0.1)
+    if objective.constant_hessian:
+        expected_h = cn.ones((n_samples, 1))
+    expected_h = preround(cn.maximum(expected_h * w[:, None], 1e-8))
+    assert cn.allclose(g, expected_g)
+    assert cn.allclose(h, expected_h)
+
+
+@pytest.mark.parametrize(
+    "objective", [lb.SquaredErrorObjective(), lb.QuantileObjective()]
+)
+def test_native_gradient_no_preround(objective) -> None:
+    from legateboost.objectives import native_weighted_gradient
+
+    rng = cn.random.default_rng(0)
+    n_samples = 100
+    n_outputs = 3 if isinstance(objective, lb.QuantileObjective) else 2
+    pred = rng.normal(size=(n_samples, n_outputs))
+    y = rng.normal(size=(n_samples, 1 if n_outputs == 3 else n_outputs))
+    w = rng.random(n_samples)
+    g, h = native_weighted_gradient(objective, y, pred, w, 0.1, False)
+    expected_g, _ = objective.gradient(y, objective.transform(pred))
+    assert cn.allclose(g, expected_g * w[:, None] * 0.1)
+    assert cn.allclose(h[:, 0], cn.maximum(w, 1e-8))
+
+
+def test_native_gradient_custom_objective() -> None:
+    from legateboost.objectives import native_weighted_gradient
+
+    class MyObjective(lb.SquaredErrorObjective):
+        pass
+
+    y = cn.ones((10, 1))
+    assert native_weighted_gradient(MyObjective(), y, y, cn.ones(10), 0.1) is None
+
+
+def test_constant_hessian() -> None:
+    rng = cn.random.default_rng(0)
+    X = rng.normal(size=(100, 3))
+    y = rng.normal(size=(100, 2))
+    w = rng.random(100)
+    for base_models in [
+        (lb.models.Tree(max_depth=3),),
+        (lb.models.Linear(),),
+        (lb.models.KRR(),),
+    ]:
+        model = lb.LBRegressor(n_estimators=3, base_models=base_models)
+        g, h = model.fit(X, y, sample_weight=w)._get_weighted_gradient(
+            y, cn.zeros((100, 2)), w, 0.1
+        )
+        assert g.shape == (100, 2)
+        assert h.shape == (100, 1)
+        assert cn.allclose(h[:, 0], w)
+        assert cn.all(cn.isfinite(model.predict(X)))
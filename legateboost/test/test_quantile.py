@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+import cunumeric as cn
+from legateboost.quantile import QuantileDMatrix, quantile_sketch, quantise
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+@pytest.mark.parametrize("n_bins", [1, 16, 256])
+def test_quantile_sketch(dtype, n_bins):
+    rs = np.random.RandomState(0)
+    X = rs.normal(size=(10000, 3)).astype(dtype)
+    split_proposals = quantile_sketch(cn.array(X), None, n_bins)
+    assert split_proposals.shape == (n_bins, X.shape[1])
+    assert split_proposals.dtype == X.dtype
+    proposals = np.array(split_proposals)
+    assert (np.diff(proposals, axis=0) >= 0).all()
+    # every row is left of the last proposal
+    assert (proposals[-1] == X.max(axis=0)).all()
+    # cut points are close to the exact quantiles
+    for j in range(X.shape[1]):
+        rank = np.searchsorted(np.sort(X[:, j]), proposals[:, j], side="right")
+        expected = (np.arange(n_bins) + 1) * X.shape[0] / n_bins
+        assert np.abs(rank - expected).max() <= X.shape[0] / n_bins + 1
+
+
+def test_quantile_sketch_weighted():
+    X = cn.array([[0.0], [1.0], [2.0], [3.0]])
+    w = cn.array([0.0, 1.0, 1.0, 0.0])
+    proposals = np.array(quantile_sketch(X, w, 2)).ravel()
+    assert (proposals == [1.0, 2.0]).all()
+
+    X = cn.array(np.arange(100, dtype=np.float64).reshape(-1, 1))
+    w = cn.ones(100)
+    w[50:] = 100.0
+    proposals = np.array(quantile_sketch(X, w, 2)).ravel()
+    # nearly all weight is in the upper half
+    assert proposals[0] >= 50.0
+
+
+def test_quantile_sketch_few_unique():
+    X = cn.array(np.tile([[1.0, 5.0]], (100, 1)))
+    X[50:, 0] = 2.0
+    proposals = np.array(quantile_sketch(X, None, 8))
+    assert set(proposals[:, 0]) == {1.0, 2.0}
+    assert set(proposals[:, 1]) == {5.0}
+    assert proposals.shape == (8, 2)
+
+
+@pytest.mark.parametrize("n_bins", [2, 256, 1000])
+def test_quantise(n_bins):
+    rs = np.random.RandomState(0)
+    X = rs.normal(size=(5000, 3))
+    split_proposals = np.array(quantile_sketch(cn.array(X), None, n_bins))
+    X_binned = np.array(quantise(cn.array(X), cn.array(split_proposals)))
+    assert X_binned.dtype == (np.uint8 if n_bins <= 256 else np.uint16)
+    assert X_binned.max() < n_bins
+    # partitioning on bins is the same as partitioning on values
+    for b in range(n_bins):
+        assert ((X_binned <= b) == (X <= split_proposals[b])).all()
+
+
+def test_quantise_unseen_values():
+    X = cn.array([[0.0], [1.0], [2.0], [3.0]])
+    w = cn.array([1.0, 1.0, 0.0, 0.0])
+    dmatrix = QuantileDMatrix(X, w)
+    split_proposals, X_binned = dmatrix.quantise(2)
+    assert (np.array(split_proposals).ravel() == [0.0, 1.0]).all()
+    # values above the largest proposal are placed in the last bin
+    assert (np.array(X_binned).ravel() == [0, 1, 1, 1]).all()
+    # quantisation is cached
+    assert dmatrix.quantise(2)[1] is X_binned
+
+
+def test_take_rows():
+    rs = np.random.RandomState(0)
+    X = cn.array(rs.normal(size=(100, 3)))
+    dmatrix = QuantileDMatrix(X)
+    rows = cn.array([1, 5, 50, 99])
+    subset = dmatrix.take(rows)
+    assert subset.shape == (4, 3)
+    split_proposals, X_binned = subset.quantise(8)
+    # the subset shares the split proposals of the full matrix
+    full_proposals, full_binned = dmatrix.quantise(8)
+    assert split_proposals is full_proposals
+    assert (np.array(X_binned) == np.array(full_binned)[[1, 5, 50, 99]]).all()
+    assert (np.array(subset.data) == np.array(X)[[1, 5, 50, 99]]).all()
@@ -177,8 +177,9 @@ def sample_average(
     sum_w = sample_weight.sum()
     if y.ndim == 2:
         sample_weight = sample_weight[:, cn.newaxis]
-    if cn.isclose(sum_w, cn.zeros(shape=(1,))):
-        return 0.0
+    # checked on the device rather than branching on the sum, which would wait
+    # for it to be computed
+    sum_w = cn.where(cn.isclose(sum_w, 0.0), 1.0, sum_w)
     return (y * sample_weight).sum(axis=0) / sum_w
 
 
@@ -13,6 +13,10 @@
  * limitations under the License.
  *
  */
+#include <algorithm>
+#include <map>
+#include <memory>
+#include <numeric>
 #include "legate.h"
 #include "legate_library.h"
 #include "legateboost.h"
@@ -23,11 +27,16 @@ namespace legateboost {
 
 namespace {
 struct Tree {
-  Tree(int max_depth, int num_outputs) : num_outputs(num_outputs)
+  Tree(int max_nodes, int num_outputs, int num_words)
+    : num_outputs(num_outputs), max_nodes(max_nodes), num_words(num_words)
   {
-    int max_nodes = 1 << (max_depth + 1);
     feature.resize(max_nodes, -1);
+    children.resize(max_nodes * 2, -1);
     split_value.resize(max_nodes);
+    split_bin.resize(max_nodes);
+    default_left.resize(max_nodes, false);
+    categorical.resize(max_nodes, false);
+    categories.resize(max_nodes * num_words, 0);
     gain.resize(max_nodes);
     leaf_value = legate::create_buffer<double, 2>({max_nodes, num_outputs});
     hessian    = legate::create_buffer<double, 2>({max_nodes, num_outputs});
@@ -40,44 +49,62 @@ struct Tree {
       }
     }
   }
+  // Nodes are numbered in the order they are created, children are allocated by the split
   void AddSplit(int node_id,
                 int feature_id,
                 double split_value,
-                const std::vector<double>& left_leaf_value,
-                const std::vector<double>& right_leaf_value,
+                int split_bin,
+                bool default_left,
+                const std::vector<uint32_t>& left_categories,
                 double gain,
-                const std::vector<double>& gradient_left,
-                const std::vector<double>& gradient_right,
-                const std::vector<double>& hessian_left,
-                const std::vector<double>& hessian_right)
+                const std::vector<GPair>& left_sum,
+                const std::vector<GPair>& right_sum)
   {
-    auto num_outputs           = left_leaf_value.size();
+    EXPECT(num_nodes + 2 <= max_nodes, "Tree has more nodes than allocated.");
+    children[node_id * 2]     = num_nodes;
+    children[node_id * 2 + 1] = num_nodes + 1;
+    num_nodes += 2;
     feature[node_id]           = feature_id;
     this->split_value[node_id] = split_value;
-    this->gain[node_id]        = gain;
+    this->split_bin[node_id]    = split_bin;
+    this->default_left[node_id] = default_left;
+    this->categorical[node_id]  = !left_categories.empty();
+    this->gain[node_id]         = gain;
+    std::copy(
+      left_categories.begin(), left_categories.end(), categories.begin() + node_id * num_words);
     for (int output = 0; output < num_outputs; output++) {
-      this->gradient[{LeftChild(node_id), output}]    = gradient_left[output];
-      this->gradient[{RightChild(node_id), output}]   = gradient_right[output];
-      this->hessian[{LeftChild(node_id), output}]     = hessian_left[output];
-      this->hessian[{RightChild(node_id), output}]    = hessian_right[output];
-      this->leaf_value[{LeftChild(node_id), output}]  = left_leaf_value[output];
-      this->leaf_value[{RightChild(node_id), output}] = right_leaf_value[output];
+      auto [G_L, H_L]                                 = left_sum[output];
+      auto [G_R, H_R]                                 = right_sum[output];
+      this->gradient[{LeftChild(node_id), output}]    = G_L;
+      this->gradient[{RightChild(node_id), output}]   = G_R;
+      this->hessian[{LeftChild(node_id), output}]     = H_L;
+      this->hessian[{RightChild(node_id), output}]    = H_R;
+      this->leaf_value[{LeftChild(node_id), output}]  = -G_L / H_L;
+      this->leaf_value[{RightChild(node_id), output}] = -G_R / H_R;
     }
   }
-  static int LeftChild(int id) { return id * 2 + 1; }
-  static int RightChild(int id) { return id * 2 + 2; }
-  static int Parent(int id) { return (id - 1) / 2; }
+  int LeftChild(int id) const { return children[id * 2]; }
+  int RightChild(int id) const { return children[id * 2 + 1]; }
 
   bool IsLeaf(int node_id) const { return feature[node_id] == -1; }
 
   legate::Buffer<double, 2> leaf_value;
   std::vector<int32_t> feature;
+  std::vector<int32_t> children;  // Left and right child of each node, -1 for leaves
   std::vector<double> split_value;
+  std::vector<int32_t> split_bin;  // Used to partition the quantised training data
+  std::vector<bool> default_left;  // Direction of rows missing the feature
+  std::vector<bool> categorical;   // Split on a categorical feature
+  // Bitset of the categories going left, num_words per node
+  std::vector<uint32_t> categories;
   std::vector<double> gain;
   legate::Buffer<double, 2> hessian;
   legate::Buffer<double, 2>
     gradient;  // This is not used in the output tree but we use it during training
   const int num_outputs;
+  const int max_nodes;
+  const int num_words;
+  int num_nodes = 1;
 };
 
 template <typename T>
@@ -100,173 +127,775 @@ void WriteTreeOutput(legate::TaskContext context, const Tree& tree)
   WriteOutput(context.output(2).data(), tree.split_value);
   WriteOutput(context.output(3).data(), tree.gain);
   WriteOutput(context.output(4).data(), tree.hessian);
+  WriteOutput(context.output(5).data(), tree.children);
+  WriteOutput(context.output(7).data(), tree.default_left);
+  WriteOutput(context.output(8).data(), tree.categorical);
+  WriteOutput(context.output(9).data(), tree.categories);
 }
 
+// Histograms are built for a batch of nodes at a time, with one slot per node
+// Gradient pairs are summed as fixed point integers of type T
+template <typename T>
 struct GradientHistogram {
-  // Dimensions
-  // 0. Depth
-  // 1. Feature
-  // 2. Output
-  legate::Buffer<GPair, 3> gradient_sums;
-  int size;
-  int num_features;
-  int depth;
-  int num_outputs;
-
-  GradientHistogram(int num_features, int depth, int num_outputs)
-    : num_features(num_features),
-      depth(depth),
-      num_outputs(num_outputs),
-      size((1 << depth) * num_features * num_outputs),
-      gradient_sums(legate::create_buffer<GPair, 3>({1 << depth, num_features, num_outputs}))
+  HistogramIndexer indexer;
+  int64_t size;
+  legate::Buffer<IntegerGPair<T>, 1> gradient_sums;
+
+  GradientHistogram(int num_nodes, int num_features, int num_bins, int num_outputs)
+    : indexer{num_features, num_bins, num_outputs},
+      size(num_nodes * indexer.NodeSize()),
+      gradient_sums(legate::create_buffer<IntegerGPair<T>, 1>(std::max<int64_t>(size, 1)))
+  {
+    auto ptr = gradient_sums.ptr(0);
+    std::fill(ptr, ptr + size, IntegerGPair<T>{});
+  }
+  ~GradientHistogram() { gradient_sums.destroy(); }
+  GradientHistogram(const GradientHistogram&)            = delete;
+  GradientHistogram& operator=(const GradientHistogram&) = delete;
+
+  IntegerGPair<T> Get(int slot, int feature, int bin, int output) const
+  {
+    return gradient_sums[indexer(slot, feature, bin, output)];
+  }
+  // Turn per bin sums into the sum of gradients to the left of each split proposal
+  void CumulativeSum(int num_nodes, int num_threads)
   {
-    auto ptr = gradient_sums.ptr({0, 0, 0});
-    std::fill(ptr, ptr + size, GPair{0.0, 0.0});
+#pragma omp parallel for num_threads(num_threads) collapse(2)
+    for (int slot = 0; slot < num_nodes; slot++) {
+      for (int feature = 0; feature < indexer.num_features; feature++) {
+        for (int bin = 1; bin < indexer.num_bins; bin++) {
+          for (int output = 0; output < indexer.num_outputs; output++) {
+            gradient_sums[indexer(slot, feature, bin, output)] +=
+              gradient_sums[indexer(slot, feature, bin - 1, output)];
+          }
+        }
+      }
+    }
+  }
+};
+
+// A node keeps the histogram batch it belongs to alive until it is expanded or finished
+template <typename T>
+struct NodeHistogram {
+  std::shared_ptr<GradientHistogram<T>> batch;
+  int slot;
+
+  const IntegerGPair<T>* ptr() const
+  {
+    return batch->gradient_sums.ptr(slot * batch->indexer.NodeSize());
+  }
+};
+
+// The best split of one feature of a node, with bin -1 for a categorical split
+template <typename T>
+struct FeatureSplit {
+  double gain       = 0.0;
+  int32_t bin       = -1;
+  bool default_left = false;
+  // Bitset of the categories going left, empty for splits of numerical features
+  std::vector<uint32_t> categories;
+  // Per output sums of the rows going left
+  std::vector<IntegerGPair<T>> left_sum;
+};
+
+// feature is a position in the histogram and node_sums are the gradient sums of the rows the
+// histogram was built from
+template <typename T>
+FeatureSplit<T> BestFeatureSplit(const GradientHistogram<T>& histogram,
+                                 int slot,
+                                 int feature,
+                                 bool categorical,
+                                 int32_t num_words,
+                                 const std::vector<GPair>& node_sums,
+                                 const GradientQuantiser<T>& quantiser,
+                                 double eps)
+{
+  const auto& indexer = histogram.indexer;
+  int missing_bin     = indexer.num_bins - 1;
+  FeatureSplit<T> best;
+  if (categorical) {
+    auto split = BestCategoricalSplit(
+      [&](int bin, int output) { return histogram.Get(slot, feature, bin, output); },
+      indexer.num_bins,
+      indexer.num_outputs,
+      num_words,
+      node_sums,
+      quantiser,
+      eps);
+    best.gain         = split.gain;
+    best.default_left = split.default_left;
+    best.categories   = std::move(split.categories);
+    best.left_sum     = std::move(split.left_sum);
+    return best;
+  }
+  // Rows missing the feature go right unless sending them left is better
+  auto left_gpair = [&](int bin, int output, bool missing_left) {
+    auto left = histogram.Get(slot, feature, bin, output);
+    if (missing_left) {
+      left += histogram.Get(slot, feature, missing_bin, output) -
+              histogram.Get(slot, feature, missing_bin - 1, output);
+    }
+    return left;
+  };
+  bool has_missing = false;
+  for (int output = 0; output < indexer.num_outputs; ++output) {
+    auto missing = histogram.Get(slot, feature, missing_bin, output) -
+                   histogram.Get(slot, feature, missing_bin - 1, output);
+    has_missing = has_missing || missing.grad != 0 || missing.hess != 0;
+  }
+  for (int bin = 0; bin < missing_bin; bin++) {
+    for (int missing_left = 0; missing_left <= static_cast<int>(has_missing); missing_left++) {
+      double gain = 0;
+      for (int output = 0; output < indexer.num_outputs; ++output) {
+        auto [G_L, H_L] = quantiser.Dequantise(left_gpair(bin, output, missing_left));
+        auto [G, H]     = node_sums[output];
+        auto G_R        = G - G_L;
+        auto H_R        = H - H_L;
+        if (H_L <= 0.0 || H_R <= 0.0) {
+          gain = 0;
+          break;
+        }
+        gain +=
+          0.5 * ((G_L * G_L) / (H_L + eps) + (G_R * G_R) / (H_R + eps) - (G * G) / (H + eps));
+      }
+      if (gain > best.gain) {
+        best.gain         = gain;
+        best.bin          = bin;
+        best.default_left = missing_left;
+      }
+    }
+  }
+  if (best.gain > 0.0) {
+    for (int output = 0; output < indexer.num_outputs; ++output) {
+      best.left_sum.push_back(left_gpair(best.bin, output, best.default_left));
+    }
+  }
+  return best;
+}
+
+// The feature of the returned candidate is a column of X
+template <typename T>
+SplitCandidate BestSplit(const GradientHistogram<T>& histogram,
+                         int slot,
+                         int node_id,
+                         int depth,
+                         const int32_t* features,
+                         int32_t num_features,
+                         const std::vector<char>& is_categorical,
+                         const Tree& tree,
+                         const GradientQuantiser<T>& quantiser,
+                         double eps)
+{
+  const auto& indexer = histogram.indexer;
+  std::vector<GPair> node_sums;
+  for (int output = 0; output < indexer.num_outputs; ++output) {
+    node_sums.push_back({tree.gradient[{node_id, output}], tree.hessian[{node_id, output}]});
+  }
+  SplitCandidate best{node_id, depth, 0.0, -1, -1};
+  std::vector<IntegerGPair<T>> best_left;
+  for (int feature = 0; feature < num_features; feature++) {
+    auto split = BestFeatureSplit(histogram,
+                                  slot,
+                                  feature,
+                                  is_categorical[features[feature]],
+                                  tree.num_words,
+                                  node_sums,
+                                  quantiser,
+                                  eps);
+    if (split.gain > best.gain) {
+      best.gain         = split.gain;
+      best.feature      = feature;
+      best.bin          = split.bin;
+      best.default_left = split.default_left;
+      best.categories   = std::move(split.categories);
+      best_left         = std::move(split.left_sum);
+    }
+  }
+  if (best.feature == -1) return best;
+  for (int output = 0; output < indexer.num_outputs; ++output) {
+    auto left = quantiser.Dequantise(best_left[output]);
+    best.left_sum.push_back(left);
+    best.right_sum.push_back(node_sums[output] - left);
+  }
+  best.feature = features[best.feature];
+  return best;
+}
+
+enum class TreeMethod : int32_t { kAllReduce = 0, kReduceScatter = 1, kVoting = 2 };
+
+// The features of a level are split into equal blocks, one per worker
+// The last blocks are padded if the features do not divide evenly
+struct FeatureBlock {
+  int32_t block_size;
+  int32_t begin;
+  int32_t size;  // Number of features in the block that are not padding
+
+  FeatureBlock(int32_t num_features, int32_t num_ranks, int32_t rank)
+    : block_size((num_features + num_ranks - 1) / num_ranks),
+      begin(std::min(rank * block_size, num_features)),
+      size(std::min(block_size, num_features - begin))
+  {
+  }
+};
+
+// Sums the histograms of the built nodes over every worker, keeping only the sums of the
+// features in the block of this worker
+// The returned histogram has a slot for every node of the batch, built nodes first
+template <typename T>
+std::shared_ptr<GradientHistogram<T>> ReduceScatterHistogram(legate::TaskContext context,
+                                                             const GradientHistogram<T>& local,
+                                                             int num_built,
+                                                             int num_nodes,
+                                                             int32_t num_ranks,
+                                                             int32_t block_size)
+{
+  const auto& indexer = local.indexer;
+  auto block          = std::make_shared<GradientHistogram<T>>(
+    num_nodes, block_size, indexer.num_bins, indexer.num_outputs);
+  const auto& block_indexer = block->indexer;
+  int64_t block_count       = num_built * block_indexer.NodeSize();
+  int64_t feature_size      = static_cast<int64_t>(indexer.num_bins) * indexer.num_outputs;
+  std::vector<IntegerGPair<T>> send(num_ranks * block_count);
+  for (int32_t rank = 0; rank < num_ranks; rank++) {
+    for (int slot = 0; slot < num_built; slot++) {
+      for (int32_t f = 0; f < block_size; f++) {
+        int32_t feature = rank * block_size + f;
+        if (feature >= indexer.num_features) break;
+        const auto* begin = local.gradient_sums.ptr(indexer(slot, feature, 0, 0));
+        auto* out         = send.data() + rank * block_count + block_indexer(slot, f, 0, 0);
+        std::copy(begin, begin + feature_size, out);
+      }
+    }
+  }
+  auto sums = SumReduceScatter(context, reinterpret_cast<T*>(send.data()), block_count * 2);
+  std::copy(sums.begin(), sums.end(), reinterpret_cast<T*>(block->gradient_sums.ptr(0)));
+  return block;
+}
+
+// The positions of the top_k features of a node with the highest gain on the local rows
+// The gain of a feature is that of its best split, found as by BestSplit, including categorical
+// partitions and the default direction of missing values
+// Features without a positive gain are not proposed and leave -1
+template <typename T>
+std::vector<int32_t> LocalTopFeatures(const GradientHistogram<T>& histogram,
+                                      int slot,
+                                      const int32_t* features,
+                                      const std::vector<char>& is_categorical,
+                                      int32_t num_words,
+                                      const GradientQuantiser<T>& quantiser,
+                                      int32_t top_k,
+                                      double eps)
+{
+  const auto& indexer = histogram.indexer;
+  // The missing bin of the cumulative histogram holds every local row of the node
+  std::vector<GPair> node_sums;
+  for (int output = 0; output < indexer.num_outputs; ++output) {
+    node_sums.push_back(
+      quantiser.Dequantise(histogram.Get(slot, 0, indexer.num_bins - 1, output)));
+  }
+  std::vector<double> feature_gain(indexer.num_features, 0.0);
+  for (int feature = 0; feature < indexer.num_features; feature++) {
+    auto split            = BestFeatureSplit(histogram,
+                                             slot,
+                                             feature,
+                                             is_categorical[features[feature]],
+                                             num_words,
+                                             node_sums,
+                                             quantiser,
+                                             eps);
+    feature_gain[feature] = split.gain;
   }
-  void Add(int feature, int position_in_level, int output, GPair g)
+  std::vector<int32_t> order(indexer.num_features);
+  std::iota(order.begin(), order.end(), 0);
+  std::stable_sort(order.begin(), order.end(), [&](int32_t a, int32_t b) {
+    return feature_gain[a] > feature_gain[b];
+  });
+  std::vector<int32_t> top(top_k, -1);
+  for (int i = 0; i < std::min<int32_t>(top_k, indexer.num_features); i++) {
+    if (feature_gain[order[i]] > eps) top[i] = order[i];
+  }
+  return top;
+}
+
+// Voting parallel split finding
+// Every worker votes for the top_k features of each node on its local rows and the num_selected
+// features with the most votes are chosen on every worker, ties going to the first feature. Only
+// the histograms of the chosen features are summed over the workers.
+// Slot i of the returned histogram holds the chosen features of node i in increasing order, with
+// columns of X given by columns[i * num_selected, (i + 1) * num_selected)
+template <typename T>
+std::shared_ptr<GradientHistogram<T>> VotedHistogram(legate::TaskContext context,
+                                                     const GradientHistogram<T>& local,
+                                                     int num_nodes,
+                                                     const int32_t* features,
+                                                     const std::vector<char>& is_categorical,
+                                                     int32_t num_words,
+                                                     const GradientQuantiser<T>& quantiser,
+                                                     int32_t top_k,
+                                                     int32_t num_selected,
+                                                     double eps,
+                                                     int num_threads,
+                                                     std::vector<int32_t>& columns)
+{
+  const auto& indexer = local.indexer;
+  std::vector<int32_t> local_top(num_nodes * top_k);
+#pragma omp parallel for num_threads(num_threads) schedule(dynamic)
+  for (int slot = 0; slot < num_nodes; slot++) {
+    auto top =
+      LocalTopFeatures(local, slot, features, is_categorical, num_words, quantiser, top_k, eps);
+    std::copy(top.begin(), top.end(), local_top.begin() + slot * top_k);
+  }
+  auto votes_gathered = AllGather(context, local_top.data(), local_top.size());
+  int num_ranks       = local_top.empty() ? 1 : votes_gathered.size() / local_top.size();
+
+  auto voted = std::make_shared<GradientHistogram<T>>(
+    num_nodes, num_selected, indexer.num_bins, indexer.num_outputs);
+  int64_t feature_size = static_cast<int64_t>(indexer.num_bins) * indexer.num_outputs;
+  columns.resize(num_nodes * num_selected);
+  for (int slot = 0; slot < num_nodes; slot++) {
+    std::vector<int32_t> votes(indexer.num_features, 0);
+    for (int rank = 0; rank < num_ranks; rank++) {
+      for (int i = 0; i < top_k; i++) {
+        int32_t feature = votes_gathered[rank * local_top.size() + slot * top_k + i];
+        if (feature >= 0) votes[feature]++;
+      }
+    }
+    std::vector<int32_t> selected(indexer.num_features);
+    std::iota(selected.begin(), selected.end(), 0);
+    std::stable_sort(selected.begin(), selected.end(), [&](int32_t a, int32_t b) {
+      return votes[a] > votes[b];
+    });
+    selected.resize(num_selected);
+    std::sort(selected.begin(), selected.end());
+    for (int i = 0; i < num_selected; i++) {
+      const auto* begin = local.gradient_sums.ptr(indexer(slot, selected[i], 0, 0));
+      std::copy(
+        begin, begin + feature_size, voted->gradient_sums.ptr(voted->indexer(slot, i, 0, 0)));
+      columns[slot * num_selected + i] = features[selected[i]];
+    }
+  }
+  // Cumulative histograms are summed directly as the sums are linear
+  SumAllReduce(context, reinterpret_cast<T*>(voted->gradient_sums.ptr(0)), voted->size * 2);
+  return voted;
+}
+
+// Each worker proposes the best split of each node over its own block of features and every
+// worker chooses the same proposal. Ties go to the lowest worker, so to the first feature.
+void BestOverWorkers(legate::TaskContext context,
+                     std::vector<SplitCandidate>& candidates,
+                     int num_outputs,
+                     int num_words)
+{
+  // gain, feature, bin, default direction, the left and right sums of each output, then the
+  // bitset of categories going left
+  int stride = 4 + 4 * num_outputs + num_words;
+  std::vector<double> packed(candidates.size() * stride, 0.0);
+  for (int i = 0; i < candidates.size(); i++) {
+    double* x = packed.data() + i * stride;
+    x[0]      = candidates[i].gain;
+    x[1]      = candidates[i].feature;
+    x[2]      = candidates[i].bin;
+    x[3]      = candidates[i].default_left;
+    if (candidates[i].feature == -1) continue;
+    std::copy(candidates[i].left_sum.begin(),
+              candidates[i].left_sum.end(),
+              reinterpret_cast<GPair*>(x + 4));
+    std::copy(candidates[i].right_sum.begin(),
+              candidates[i].right_sum.end(),
+              reinterpret_cast<GPair*>(x + 4) + num_outputs);
+    std::copy(
+      candidates[i].categories.begin(), candidates[i].categories.end(), x + 4 + 4 * num_outputs);
+  }
+  auto gathered = AllGather(context, packed.data(), packed.size());
+  int num_ranks = packed.empty() ? 1 : gathered.size() / packed.size();
+  for (int i = 0; i < candidates.size(); i++) {
+    const double* best = gathered.data() + i * stride;
+    for (int rank = 1; rank < num_ranks; rank++) {
+      const double* x = gathered.data() + rank * packed.size() + i * stride;
+      if (x[0] > best[0]) best = x;
+    }
+    auto& candidate        = candidates[i];
+    candidate.gain         = best[0];
+    candidate.feature      = static_cast<int32_t>(best[1]);
+    candidate.bin          = static_cast<int32_t>(best[2]);
+    candidate.default_left = best[3] != 0.0;
+    candidate.left_sum.clear();
+    candidate.right_sum.clear();
+    candidate.categories.clear();
+    if (candidate.feature == -1) continue;
+    const GPair* sums = reinterpret_cast<const GPair*>(best + 4);
+    candidate.left_sum.assign(sums, sums + num_outputs);
+    candidate.right_sum.assign(sums + num_outputs, sums + 2 * num_outputs);
+    // A categorical split sends at least one category left, so has a nonzero bitset
+    const double* words = best + 4 + 4 * num_outputs;
+    if (std::any_of(words, words + num_words, [](double w) { return w != 0.0; })) {
+      for (int w = 0; w < num_words; w++) {
+        candidate.categories.push_back(static_cast<uint32_t>(words[w]));
+      }
+    }
+  }
+}
+
+// Keeps the local rows grouped by the node they belong to
+// Each leaf owns a contiguous segment of the row index
+// Rows of a split node are moved into its children, so only rows of nodes being built are touched
+class RowPartitioner {
+ public:
+  RowPartitioner(int64_t num_rows, int max_nodes) : row_index(num_rows), segments(max_nodes)
   {
-    gradient_sums[{position_in_level, feature, output}] += g;
+    std::iota(row_index.begin(), row_index.end(), 0);
+    segments[0] = {0, num_rows};
   }
-  GPair Get(int feature, int position, int output)
+  const int64_t* begin(int node_id) const { return row_index.data() + segments[node_id].first; }
+  const int64_t* end(int node_id) const { return row_index.data() + segments[node_id].second; }
+
+  // Stable partition of the rows of a node into its children, left child first
+  template <typename GoLeftFn>
+  void Split(int node_id, int left_child, int right_child, GoLeftFn go_left)
   {
-    int position_in_level = position - ((1 << depth) - 1);
-    return gradient_sums[{position_in_level, feature, output}];
+    auto [segment_begin, segment_end] = segments[node_id];
+    auto middle                       = std::stable_partition(
+      row_index.begin() + segment_begin, row_index.begin() + segment_end, go_left);
+    segments[left_child]  = {segment_begin, middle - row_index.begin()};
+    segments[right_child] = {middle - row_index.begin(), segment_end};
   }
+
+ private:
+  std::vector<int64_t> row_index;
+  std::vector<std::pair<int64_t, int64_t>> segments;
 };
 
 struct build_tree_fn {
   template <legate::Type::Code CODE>
-  void operator()(legate::TaskContext context)
+  void operator()(legate::TaskContext context, int num_threads)
+  {
+    // Gradients quantised to a few bits are summed in 32 bits, otherwise in 64 bits
+    auto quantised_bits = context.scalars().at(5).value<int32_t>();
+    if (quantised_bits > 0) {
+      Build<legate::type_of<CODE>, int32_t>(context, num_threads);
+    } else {
+      Build<legate::type_of<CODE>, int64_t>(context, num_threads);
+    }
+  }
+
+  template <typename BinT, typename SumT>
+  void Build(legate::TaskContext context, int num_threads)
   {
-    using T           = legate::type_of<CODE>;
     const auto& X     = context.input(0).data();
     auto X_shape      = X.shape<2>();
-    auto X_accessor   = X.read_accessor<T, 2>();
+    auto X_accessor   = X.read_accessor<BinT, 2>();
     auto num_features = X_shape.hi[1] - X_shape.lo[1] + 1;
     auto num_rows     = X_shape.hi[0] - X_shape.lo[0] + 1;
     const auto& g     = context.input(1).data();
     const auto& h     = context.input(2).data();
     EXPECT_AXIS_ALIGNED(0, X.shape<2>(), g.shape<2>());
     EXPECT_AXIS_ALIGNED(0, g.shape<2>(), h.shape<2>());
-    EXPECT_AXIS_ALIGNED(1, g.shape<2>(), h.shape<2>());
     auto g_shape                = context.input(1).data().shape<2>();
     auto num_outputs            = g.shape<2>().hi[1] - g.shape<2>().lo[1] + 1;
     auto g_accessor             = g.read_accessor<double, 2>();
-    auto h_accessor             = h.read_accessor<double, 2>();
+    auto h_accessor             = HessianAccessor(h, num_outputs);
     const auto& split_proposals = context.input(3).data();
     EXPECT_AXIS_ALIGNED(1, split_proposals.shape<2>(), X.shape<2>());
-    auto split_proposal_accessor = split_proposals.read_accessor<T, 2>();
+    EXPECT_IS_BROADCAST(split_proposals.shape<2>());
+    auto split_proposal_accessor = split_proposals.read_accessor<double, 2>();
+    auto num_bins = split_proposals.shape<2>().hi[0] - split_proposals.shape<2>().lo[0] + 1;
+    const auto& feature_sets_store = context.input(4).data();
+    EXPECT_IS_BROADCAST(feature_sets_store.shape<2>());
+    auto feature_sets_shape    = feature_sets_store.shape<2>();
+    auto feature_sets_accessor = feature_sets_store.read_accessor<int32_t, 2>();
+    int32_t num_levels         = feature_sets_shape.hi[0] - feature_sets_shape.lo[0] + 1;
+    int32_t level_size         = feature_sets_shape.hi[1] - feature_sets_shape.lo[1] + 1;
+    FeatureSets feature_sets(std::vector<int32_t>(feature_sets_accessor.ptr(feature_sets_shape.lo),
+                                                  feature_sets_accessor.ptr(feature_sets_shape.lo) +
+                                                    num_levels * level_size),
+                             num_levels,
+                             level_size);
+    EXPECT(level_size <= num_features, "More features sampled than X has.");
+    const auto& categorical_store = context.input(5).data();
+    EXPECT_IS_BROADCAST(categorical_store.shape<1>());
+    auto categorical_accessor = categorical_store.read_accessor<bool, 1>();
+    std::vector<char> is_categorical(num_features);
+    for (int64_t j = 0; j < num_features; j++) { is_categorical[j] = categorical_accessor[j]; }
 
     // Scalars
-    auto max_depth = context.scalars().at(0).value<int>();
+    auto max_depth   = context.scalars().at(0).value<int>();
+    auto max_leaves  = context.scalars().at(1).value<int>();
+    auto grow_policy = static_cast<GrowPolicy>(context.scalars().at(2).value<int>());
+    auto max_nodes   = context.scalars().at(3).value<int>();
+    auto total_rows  = context.scalars().at(4).value<int64_t>();
+    auto bits        = context.scalars().at(5).value<int32_t>();
+    auto seed        = context.scalars().at(6).value<int64_t>();
+    auto tree_method = static_cast<TreeMethod>(context.scalars().at(7).value<int32_t>());
+    auto top_k       = context.scalars().at(8).value<int32_t>();
+    auto num_words   = context.scalars().at(9).value<int32_t>();
+    double eps       = 1e-5;
 
-    Tree tree(max_depth, num_outputs);
+    // With reduce scatter, each worker only sums and searches the histograms of its own block
+    // of features and the best splits of the workers are exchanged
+    int32_t num_ranks   = context.get_launch_domain().get_volume();
+    bool reduce_scatter = tree_method == TreeMethod::kReduceScatter && num_ranks > 1;
+    FeatureBlock feature_block(level_size, num_ranks, context.get_task_index()[0]);
+    // With voting, histograms are kept local and only those of voted features are summed
+    bool voting          = tree_method == TreeMethod::kVoting && num_ranks > 1;
+    int32_t num_selected = std::min(2 * top_k, level_size);
 
-    // Initialize the root node
-    std::vector<GPair> base_sums(num_outputs);
-    for (auto i = g_shape.lo[0]; i <= g_shape.hi[0]; ++i) {
-      for (auto j = 0; j < num_outputs; ++j) {
-        base_sums[j] += {g_accessor[{i, j}], h_accessor[{i, j}]};
+    Tree tree(max_nodes, num_outputs, num_words);
+
+    // Gradients are summed in fixed point so the tree does not depend on the number of workers
+    GPair max_abs = MaxAbsGradient(g_accessor, h_accessor, g_shape);
+    MaxAllReduce(context, reinterpret_cast<double*>(&max_abs), 2);
+    GradientQuantiser<SumT> quantiser(max_abs, total_rows, bits, seed);
+    // Each gradient pair is converted to fixed point once and reused for every feature and level
+    std::vector<IntegerGPair<SumT>> quantised(std::max<int64_t>(num_rows, 0) * num_outputs);
+#pragma omp parallel for num_threads(num_threads) schedule(static)
+    for (int64_t r = 0; r < num_rows; r++) {
+      auto i = g_shape.lo[0] + r;
+      for (int64_t k = 0; k < num_outputs; ++k) {
+        quantised[r * num_outputs + k] =
+          quantiser.Quantise(g_accessor[{i, k}], h_accessor[{i, k}], i, k);
       }
     }
-    SumAllReduce(context, reinterpret_cast<double*>(base_sums.data()), num_outputs * 2);
+
+    // Initialize the root node
+    std::vector<IntegerGPair<SumT>> base_sums(num_outputs);
+    for (int64_t r = 0; r < num_rows; ++r) {
+      for (auto j = 0; j < num_outputs; ++j) { base_sums[j] += quantised[r * num_outputs + j]; }
+    }
+    SumAllReduce(context, reinterpret_cast<SumT*>(base_sums.data()), num_outputs * 2);
     for (auto i = 0; i < num_outputs; ++i) {
-      auto [G, H]             = base_sums[i];
+      auto [G, H]             = quantiser.Dequantise(base_sums[i]);
       tree.leaf_value[{0, i}] = -G / H;
       tree.gradient[{0, i}]   = G;
       tree.hessian[{0, i}]    = H;
     }
 
     // Begin building the tree
-    std::vector<int32_t> positions(num_rows);
-    for (int64_t depth = 0; depth < max_depth; ++depth) {
-      GradientHistogram histogram(num_features, depth, num_outputs);
-      for (int64_t i = X_shape.lo[0]; i <= X_shape.hi[0]; i++) {
-        auto index_local = i - X_shape.lo[0];
-        auto position    = positions[index_local];
-        if (position < 0) continue;
-        auto position_in_level = position - ((1 << depth) - 1);
-        for (int64_t j = 0; j < num_features; j++) {
-          if (X_accessor[{i, j}] <= split_proposal_accessor[{depth, j}]) {
-            for (int64_t k = 0; k < num_outputs; ++k) {
-              histogram.Add(j, position_in_level, k, GPair{g_accessor[{i, k}], h_accessor[{i, k}]});
+    RowPartitioner partitioner(std::max<int64_t>(num_rows, 0), max_nodes);
+    ExpandQueue queue(grow_policy, max_leaves);
+    // Histograms of the leaves that may still be expanded
+    std::map<int32_t, NodeHistogram<SumT>> histograms;
+
+    // Build the histograms of a batch of new leaves, find their best splits and queue them
+    // The histograms of build are summed from their rows, those of subtract are the
+    // histogram of their parent minus the histogram of their built sibling
+    // Built nodes take the first slots, followed by their siblings in the same order
+    auto evaluate_leaves = [&](const std::vector<int32_t>& build,
+                               const std::vector<int32_t>& subtract,
+                               const std::vector<NodeHistogram<SumT>>& parents,
+                               int depth) {
+      std::vector<int32_t> nodes(build);
+      nodes.insert(nodes.end(), subtract.begin(), subtract.end());
+      int num_built = build.size();
+      // Features not sampled for this depth are not histogrammed
+      // Rows missing a feature have bin num_bins and are summed in an extra last bin
+      const int32_t* features = feature_sets.Features(depth);
+      auto histogram          = std::make_shared<GradientHistogram<SumT>>(
+        reduce_scatter ? num_built : nodes.size(),
+        feature_sets.LevelSize(),
+        num_bins + 1,
+        num_outputs);
+      // Copied as the histogram is replaced by its reduced block with reduce scatter
+      const auto indexer = histogram->indexer;
+
+      // Threads write disjoint slices of the built histograms: the features are split into
+      // blocks and, only when there are fewer features than threads, the rows are split too
+      // with one extra copy of the histograms per row block
+      // The copies are bounded by the number of threads times the size of a single feature
+      int64_t num_features   = indexer.num_features;
+      int num_feature_blocks = std::max<int64_t>(std::min<int64_t>(num_features, num_threads), 1);
+      int num_row_blocks     = std::max(num_threads / num_feature_blocks, 1);
+      int64_t built_size     = num_built * indexer.NodeSize();
+
+      auto row_block_histograms = legate::create_buffer<IntegerGPair<SumT>, 1>(
+        std::max<int64_t>((num_row_blocks - 1) * built_size, 1));
+      if (num_row_blocks > 1) {
+        std::fill(row_block_histograms.ptr(0),
+                  row_block_histograms.ptr(0) + (num_row_blocks - 1) * built_size,
+                  IntegerGPair<SumT>{});
+      }
+#pragma omp parallel for num_threads(num_threads) collapse(2) schedule(static)
+      for (int row_block = 0; row_block < num_row_blocks; row_block++) {
+        for (int feature_block = 0; feature_block < num_feature_blocks; feature_block++) {
+          IntegerGPair<SumT>* sums =
+            row_block == 0 ? histogram->gradient_sums.ptr(0)
+                           : row_block_histograms.ptr((row_block - 1) * built_size);
+
+          int64_t feature_begin = num_features * feature_block / num_feature_blocks;
+          int64_t feature_end   = num_features * (feature_block + 1) / num_feature_blocks;
+          for (int slot = 0; slot < num_built; slot++) {
+            const int64_t* rows   = partitioner.begin(nodes[slot]);
+            int64_t num_node_rows = partitioner.end(nodes[slot]) - rows;
+            int64_t row_begin     = num_node_rows * row_block / num_row_blocks;
+            int64_t row_end       = num_node_rows * (row_block + 1) / num_row_blocks;
+            for (int64_t r = row_begin; r < row_end; r++) {
+              auto i            = X_shape.lo[0] + rows[r];
+              const auto* gpair = quantised.data() + rows[r] * num_outputs;
+              for (int64_t j = feature_begin; j < feature_end; j++) {
+                int32_t bin = X_accessor[{i, features[j]}];
+                for (int64_t k = 0; k < num_outputs; ++k) {
+                  sums[indexer(slot, j, bin, k)] += gpair[k];
+                }
+              }
             }
           }
         }
       }
-      SumAllReduce(context,
-                   reinterpret_cast<double*>(histogram.gradient_sums.ptr({0, 0, 0})),
-                   histogram.size * 2);
-      // Find the best split
-      double eps = 1e-5;
-      for (int node_id = (1 << depth) - 1; node_id < (1 << (depth + 1)) - 1; node_id++) {
-        double best_gain = 0;
-        int best_feature = -1;
-        for (int feature = 0; feature < num_features; feature++) {
-          double gain = 0;
-          for (int output = 0; output < num_outputs; ++output) {
-            auto [G_L, H_L] = histogram.Get(feature, node_id, output);
-            auto G          = tree.gradient[{node_id, output}];
-            auto H          = tree.hessian[{node_id, output}];
-            auto G_R        = G - G_L;
-            auto H_R        = H - H_L;
-            gain +=
-              0.5 * ((G_L * G_L) / (H_L + eps) + (G_R * G_R) / (H_R + eps) - (G * G) / (H + eps));
-          }
-          if (gain > best_gain) {
-            best_gain    = gain;
-            best_feature = feature;
+      if (num_row_blocks > 1) {
+#pragma omp parallel for num_threads(num_threads) schedule(static)
+        for (int64_t i = 0; i < built_size; i++) {
+          for (int b = 0; b < num_row_blocks - 1; b++) {
+            histogram->gradient_sums[i] += row_block_histograms[b * built_size + i];
           }
         }
-        if (best_gain > eps) {
-          std::vector<double> left_leaf(num_outputs);
-          std::vector<double> right_leaf(num_outputs);
-          std::vector<double> gradient_left(num_outputs);
-          std::vector<double> gradient_right(num_outputs);
-          std::vector<double> hessian_left(num_outputs);
-          std::vector<double> hessian_right(num_outputs);
-          for (int output = 0; output < num_outputs; ++output) {
-            auto [G_L, H_L]        = histogram.Get(best_feature, node_id, output);
-            auto G                 = tree.gradient[{node_id, output}];
-            auto H                 = tree.hessian[{node_id, output}];
-            auto G_R               = G - G_L;
-            auto H_R               = H - H_L;
-            left_leaf[output]      = -G_L / H_L;
-            right_leaf[output]     = -G_R / H_R;
-            gradient_left[output]  = G_L;
-            gradient_right[output] = G_R;
-            hessian_left[output]   = H_L;
-            hessian_right[output]  = H_R;
-          }
-          if (hessian_left[0] <= 0.0 || hessian_right[0] <= 0.0) continue;
-          tree.AddSplit(node_id,
-                        best_feature,
-                        split_proposal_accessor[{depth, best_feature}],
-                        left_leaf,
-                        right_leaf,
-                        best_gain,
-                        gradient_left,
-                        gradient_right,
-                        hessian_left,
-                        hessian_right);
-        }
+      }
+      row_block_histograms.destroy();
+      if (reduce_scatter) {
+        histogram = ReduceScatterHistogram(
+          context, *histogram, num_built, nodes.size(), num_ranks, feature_block.block_size);
+        features += feature_block.begin;
+      } else if (!voting) {
+        SumAllReduce(
+          context, reinterpret_cast<SumT*>(histogram->gradient_sums.ptr(0)), built_size * 2);
+      }
+      histogram->CumulativeSum(num_built, num_threads);
+
+      // Subtraction acts directly on the cumulative histograms
+      auto node_size = histogram->indexer.NodeSize();
+#pragma omp parallel for num_threads(num_threads)
+      for (int slot = 0; slot < static_cast<int>(subtract.size()); slot++) {
+        const IntegerGPair<SumT>* parent_ptr = parents[slot].ptr();
+        const IntegerGPair<SumT>* built_ptr  = histogram->gradient_sums.ptr(slot * node_size);
+        IntegerGPair<SumT>* sibling_ptr =
+          histogram->gradient_sums.ptr((num_built + slot) * node_size);
+        for (int64_t i = 0; i < node_size; i++) { sibling_ptr[i] = parent_ptr[i] - built_ptr[i]; }
+      }
+
+      // Padding features of the block are not searched
+      int32_t num_search_features = reduce_scatter ? feature_block.size : level_size;
+      // With voting, each node is searched over its voted features only
+      auto search_histogram = histogram;
+      std::vector<int32_t> voted_columns;
+      if (voting) {
+        search_histogram    = VotedHistogram(context,
+                                          *histogram,
+                                          nodes.size(),
+                                          features,
+                                          is_categorical,
+                                          tree.num_words,
+                                          quantiser,
+                                          top_k,
+                                          num_selected,
+                                          eps,
+                                          num_threads,
+                                          voted_columns);
+        num_search_features = num_selected;
+      }
+      std::vector<SplitCandidate> candidates(nodes.size());
+#pragma omp parallel for num_threads(num_threads) schedule(dynamic)
+      for (int slot = 0; slot < static_cast<int>(nodes.size()); slot++) {
+        candidates[slot] =
+          BestSplit(*search_histogram,
+                    slot,
+                    nodes[slot],
+                    depth,
+                    voting ? voted_columns.data() + slot * num_selected : features,
+                    num_search_features,
+                    is_categorical,
+                    tree,
+                    quantiser,
+                    eps);
+      }
+      if (reduce_scatter) { BestOverWorkers(context, candidates, num_outputs, num_words); }
+      for (int slot = 0; slot < static_cast<int>(nodes.size()); slot++) {
+        if (candidates[slot].gain <= eps) continue;
+        histograms[nodes[slot]] = NodeHistogram<SumT>{histogram, slot};
+        queue.Push(std::move(candidates[slot]));
+      }
+    };
+
+    if (max_depth > 0) { evaluate_leaves({0}, {}, {}, 0); }
+    while (true) {
+      std::vector<SplitCandidate> finished;
+      auto expand = queue.Pop(finished);
+      for (const auto& candidate : finished) { histograms.erase(candidate.node_id); }
+      if (expand.empty()) break;
+
+      for (const auto& candidate : expand) {
+        // Categorical splits have no split value
+        double split_value = candidate.categories.empty()
+                               ? split_proposal_accessor[{candidate.bin, candidate.feature}]
+                               : 0.0;
+        tree.AddSplit(candidate.node_id,
+                      candidate.feature,
+                      split_value,
+                      candidate.bin,
+                      candidate.default_left,
+                      candidate.categories,
+                      candidate.gain,
+                      candidate.left_sum,
+                      candidate.right_sum);
       }
 
-      // Update the positions
-      for (int64_t i = X_shape.lo[0]; i <= X_shape.hi[0]; i++) {
-        auto index_local = i - X_shape.lo[0];
-        int& pos         = positions[index_local];
-        if (pos < 0 || tree.IsLeaf(pos)) {
-          pos = -1;
-          continue;
+      // Partition the rows of each split node into its children
+#pragma omp parallel for num_threads(num_threads) schedule(dynamic)
+      for (int i = 0; i < static_cast<int>(expand.size()); i++) {
+        int node_id                 = expand[i].node_id;
+        int feature                 = expand[i].feature;
+        int split_bin               = expand[i].bin;
+        bool default_left           = expand[i].default_left;
+        const auto& left_categories = expand[i].categories;
+        partitioner.Split(
+          node_id, tree.LeftChild(node_id), tree.RightChild(node_id), [&](int64_t row) {
+            int32_t bin = X_accessor[{X_shape.lo[0] + row, feature}];
+            if (bin == num_bins) return default_left;
+            // The bin of a categorical feature is its category
+            if (!left_categories.empty()) return BitsetContains(left_categories.data(), bin);
+            return bin <= split_bin;
+          });
+      }
+
+      // Children at the maximum depth or beyond the leaf budget are never expanded
+      // Nodes expanded together are at the same depth
+      int child_depth = expand.front().depth + 1;
+      if (child_depth < max_depth && queue.CanExpand()) {
+        // Both children are built if their features differ from those of the parent
+        bool can_subtract = feature_sets.SameFeatures(child_depth - 1, child_depth);
+        std::vector<int32_t> build;
+        std::vector<int32_t> subtract;
+        std::vector<NodeHistogram<SumT>> parents;
+        for (const auto& candidate : expand) {
+          int left  = tree.LeftChild(candidate.node_id);
+          int right = tree.RightChild(candidate.node_id);
+          if (!can_subtract) {
+            build.push_back(left);
+            build.push_back(right);
+            continue;
+          }
+          build.push_back(candidate.BuildLeft() ? left : right);
+          subtract.push_back(candidate.BuildLeft() ? right : left);
+          parents.push_back(histograms.at(candidate.node_id));
         }
-        auto x    = X_accessor[{i, tree.feature[pos]}];
-        bool left = x <= tree.split_value[pos];
-        pos       = left ? Tree::LeftChild(pos) : Tree::RightChild(pos);
+        evaluate_leaves(build, subtract, parents, child_depth);
       }
+      for (const auto& candidate : expand) { histograms.erase(candidate.node_id); }
     }
 
     if (context.get_task_index()[0] == 0) { WriteTreeOutput(context, tree); }
+
+    // Each row gets the leaf value of the leaf it ends up in
+    const auto& row_leaf_value = context.output(6).data();
+    EXPECT_AXIS_ALIGNED(0, X_shape, row_leaf_value.shape<2>());
+    auto row_leaf_value_accessor = row_leaf_value.write_accessor<double, 2>();
+#pragma omp parallel for num_threads(num_threads) schedule(dynamic)
+    for (int node_id = 0; node_id < tree.num_nodes; node_id++) {
+      if (!tree.IsLeaf(node_id)) continue;
+      for (const int64_t* row = partitioner.begin(node_id); row != partitioner.end(node_id);
+           row++) {
+        for (int64_t k = 0; k < num_outputs; ++k) {
+          row_leaf_value_accessor[{X_shape.lo[0] + *row, k}] = tree.leaf_value[{node_id, k}];
+        }
+      }
+    }
   }
 };
 
@@ -275,8 +904,16 @@ struct build_tree_fn {
 /*static*/ void BuildTreeTask::cpu_variant(legate::TaskContext context)
 {
   const auto& X = context.input(0).data();
-  type_dispatch_float(X.code(), build_tree_fn(), context);
+  type_dispatch_bin(X.code(), build_tree_fn(), context, 1);
+}
+
+#ifdef LEGATEBOOST_USE_OPENMP
+/*static*/ void BuildTreeTask::omp_variant(legate::TaskContext context)
+{
+  const auto& X = context.input(0).data();
+  type_dispatch_bin(X.code(), build_tree_fn(), context, OmpMaxThreads());
 }
+#endif
 
 }  // namespace legateboost
 
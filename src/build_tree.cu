@@ -20,6 +20,8 @@
 #include "build_tree.h"
 #include "cuda_help.h"
 #include "kernel_helper.cuh"
+#include <map>
+#include <memory>
 #include <numeric>
 
 #include <cub/device/device_radix_sort.cuh>
@@ -29,19 +31,45 @@
 #include <thrust/sort.h>
 #include <thrust/device_ptr.h>
 #include <thrust/count.h>
+#include <thrust/iterator/counting_iterator.h>
+#include <thrust/transform_reduce.h>
 #include <thrust/version.h>
 
 namespace legateboost {
 
+// Two's complement addition is the same for signed and unsigned integers
+__device__ inline void AtomicAdd(int64_t* address, int64_t value)
+{
+  atomicAdd(reinterpret_cast<unsigned long long*>(address), static_cast<unsigned long long>(value));
+}
+__device__ inline void AtomicAdd(int32_t* address, int32_t value) { atomicAdd(address, value); }
+
+// Converts each gradient pair to fixed point once, it is then read for every feature and level
+template <typename T>
+__global__ static void __launch_bounds__(THREADS_PER_BLOCK, MIN_CTAS_PER_SM)
+  quantise_gradients(legate::AccessorRO<double, 2> g,
+                     HessianAccessor h,
+                     size_t n_local_samples,
+                     int64_t sample_offset,
+                     size_t n_outputs,
+                     GradientQuantiser<T> quantiser,
+                     legate::Buffer<IntegerGPair<T>, 1> gpairs)
+{
+  int64_t idx = threadIdx.x + static_cast<int64_t>(blockDim.x) * blockIdx.x;
+  if (idx >= n_local_samples * n_outputs) return;
+  int64_t sample = idx / n_outputs + sample_offset;
+  int32_t output = idx % n_outputs;
+  gpairs[idx]    = quantiser.Quantise(g[{sample, output}], h[{sample, output}], sample, output);
+}
+
+template <typename T>
 __global__ static void __launch_bounds__(THREADS_PER_BLOCK, MIN_CTAS_PER_SM)
-  reduce_base_sums(legate::AccessorRO<double, 2> g,
-                   legate::AccessorRO<double, 2> h,
+  reduce_base_sums(legate::Buffer<IntegerGPair<T>, 1> gpairs,
                    size_t n_local_samples,
-                   int64_t sample_offset,
-                   legate::Buffer<double, 1> base_sums,
+                   legate::Buffer<T, 1> base_sums,
                    size_t n_outputs)
 {
-  typedef cub::BlockReduce<double, THREADS_PER_BLOCK> BlockReduce;
+  typedef cub::BlockReduce<T, THREADS_PER_BLOCK> BlockReduce;
   __shared__ typename BlockReduce::TempStorage temp_storage_g;
   __shared__ typename BlockReduce::TempStorage temp_storage_h;
 
@@ -49,123 +77,51 @@ __global__ static void __launch_bounds__(THREADS_PER_BLOCK, MIN_CTAS_PER_SM)
 
   int64_t sample_id = threadIdx.x + blockDim.x * blockIdx.x;
 
-  double G = sample_id < n_local_samples ? g[{sample_id + sample_offset, output}] : 0.0;
-  double H = sample_id < n_local_samples ? h[{sample_id + sample_offset, output}] : 0.0;
+  IntegerGPair<T> gpair =
+    sample_id < n_local_samples ? gpairs[sample_id * n_outputs + output] : IntegerGPair<T>{};
 
-  double blocksumG = BlockReduce(temp_storage_g).Sum(G);
-  double blocksumH = BlockReduce(temp_storage_h).Sum(H);
+  T blocksumG = BlockReduce(temp_storage_g).Sum(gpair.grad);
+  T blocksumH = BlockReduce(temp_storage_h).Sum(gpair.hess);
 
   if (threadIdx.x == 0) {
-    atomicAdd(&base_sums[output], blocksumG);
-    atomicAdd(&base_sums[output + n_outputs], blocksumH);
+    AtomicAdd(&base_sums[output], blocksumG);
+    AtomicAdd(&base_sums[output + n_outputs], blocksumH);
   }
 }
 
-template <typename TYPE, int ELEMENTS_PER_THREAD, int FEATURES_PER_BLOCK>
+template <typename BinT, typename T>
 __global__ static void __launch_bounds__(THREADS_PER_BLOCK, MIN_CTAS_PER_SM)
-  fill_histogram_blockreduce(legate::AccessorRO<TYPE, 2> X,
-                             size_t n_local_samples,
-                             size_t n_features,
-                             int64_t sample_offset,
-                             legate::AccessorRO<double, 2> g,
-                             legate::AccessorRO<double, 2> h,
-                             size_t n_outputs,
-                             legate::AccessorRO<TYPE, 2> split_proposal,
-                             int32_t* positions_local,
-                             int32_t* sample_index_local,
-                             legate::Buffer<GPair, 3> histogram,
-                             int32_t max_nodes_in_level,
-                             int32_t depth)
+  fill_histogram(legate::AccessorRO<BinT, 2> X,
+                 size_t n_local_samples,
+                 size_t n_features,
+                 legate::AccessorRO<int32_t, 2> feature_sets,
+                 int32_t level,
+                 int64_t sample_offset,
+                 legate::Buffer<IntegerGPair<T>, 1> gpairs,
+                 int32_t* positions_local,
+                 int32_t* sample_index_local,
+                 const int32_t* node_slot,
+                 legate::Buffer<IntegerGPair<T>, 1> histogram,
+                 HistogramIndexer indexer)
 {
-  // block dimensions are (THREADS_PER_BLOCK, 1, 1)
-  // each thread processes ELEMENTS_PER_THREAD samples and FEATURES_PER_BLOCK features
-  // the features to process are defined via blockIdx.y
-
-  // further improvements:
-  // * quantize values to work with int instead of double
-
-  typedef cub::BlockReduce<double, THREADS_PER_BLOCK> BlockReduce;
-
-  // alternate storages to spare syncthreads
-  __shared__ typename BlockReduce::TempStorage temp_storage1;
-  __shared__ typename BlockReduce::TempStorage temp_storage2;
-
-  __shared__ bool left_shared[FEATURES_PER_BLOCK][THREADS_PER_BLOCK + 1];
-
-  // mapping from local sampleId to global sample id (also accounting for reordering)
-  __shared__ int32_t index_mapping[THREADS_PER_BLOCK];
-
-#pragma unroll
-  for (int32_t elementIdx = 0; elementIdx < ELEMENTS_PER_THREAD; ++elementIdx) {
-    // within each iteration a (THREADS_PER_BLOCK, FEATURES_PER_BLOCK)-block of
-    // data from X is processed.
-
-    // check if any thread of this block has work to do
-    if ((blockIdx.x + elementIdx * gridDim.x) * THREADS_PER_BLOCK >= n_local_samples) break;
-
-    // check if thread has actual work todo (besides taking part in reductions)
-    int32_t sampleId = (blockIdx.x + elementIdx * gridDim.x) * THREADS_PER_BLOCK + threadIdx.x;
-    bool validThread = sampleId < n_local_samples;
-
-    index_mapping[threadIdx.x] = validThread ? sample_index_local[sampleId] + sample_offset : -1;
-
-    __syncthreads();
-
-    // read input X and store split decision in shared memory
-    for (int32_t featureIdx = 0; featureIdx < FEATURES_PER_BLOCK; featureIdx++) {
-      // load is done with transpose access to the (THREADS_PER_BLOCK, FEATURES_PER_BLOCK)-block
-      int32_t localFeatureId = (threadIdx.x + featureIdx * THREADS_PER_BLOCK) % FEATURES_PER_BLOCK;
-      int32_t localSampleId  = (threadIdx.x + featureIdx * THREADS_PER_BLOCK) / FEATURES_PER_BLOCK;
-      int32_t feature        = blockIdx.y * FEATURES_PER_BLOCK + localFeatureId;
-      int32_t globalSampleId =
-        (blockIdx.x + elementIdx * gridDim.x) * THREADS_PER_BLOCK + localSampleId;
-      left_shared[localFeatureId][localSampleId] =
-        (globalSampleId < n_local_samples && feature < n_features)
-          ? X[{index_mapping[localSampleId], feature}] <= split_proposal[{depth, feature}]
-          : false;
-    }
-
-    // loading left_shared was done in different order
-    __syncthreads();
-
-    bool useAtomicAdd = false;
-    {
-      int32_t firstNode =
-        positions_local[(blockIdx.x + elementIdx * gridDim.x) * THREADS_PER_BLOCK];
-      int32_t lastActiveThread = (blockIdx.x + elementIdx * gridDim.x + 1) * THREADS_PER_BLOCK - 1;
-      if (lastActiveThread >= n_local_samples) lastActiveThread = n_local_samples - 1;
-      int32_t lastNode = positions_local[lastActiveThread];
-      useAtomicAdd     = (firstNode < lastNode);
-    }
-    int32_t sampleNode = validThread ? positions_local[sampleId] - max_nodes_in_level + 1 : -1;
-
-    for (int32_t output = 0; output < n_outputs; output++) {
-      double G = validThread ? g[{index_mapping[threadIdx.x], output}] : 0.0;
-      double H = validThread ? h[{index_mapping[threadIdx.x], output}] : 0.0;
-      for (int32_t featureIdx = 0; featureIdx < FEATURES_PER_BLOCK; featureIdx++) {
-        int32_t feature = featureIdx + blockIdx.y * FEATURES_PER_BLOCK;
-        if (feature < n_features) {
-          if (useAtomicAdd) {
-            if (left_shared[featureIdx][threadIdx.x] && sampleNode >= 0) {
-              double* addPosition =
-                reinterpret_cast<double*>(&histogram[{sampleNode, feature, output}]);
-              atomicAdd(addPosition, G);
-              atomicAdd(addPosition + 1, H);
-            }
-          } else {
-            // reduce within block first
-            double* addPosition =
-              reinterpret_cast<double*>(&histogram[{sampleNode, feature, output}]);
-            double input = left_shared[featureIdx][threadIdx.x] ? G : 0.0;
-            double sum   = BlockReduce(temp_storage1).Sum(input);
-            if (threadIdx.x == 0 && sum != 0) { atomicAdd(addPosition, sum); }
-            input = left_shared[featureIdx][threadIdx.x] ? H : 0.0;
-            sum   = BlockReduce(temp_storage2).Sum(input);
-            if (threadIdx.x == 0 && sum != 0) { atomicAdd(addPosition + 1, sum); }
-          }
-        }
-      }
-    }
+  // each thread processes one (sample, feature) element
+  // consecutive threads process consecutive features of the same sample
+  // features are positions in the feature set of the level
+  int64_t idx = threadIdx.x + static_cast<int64_t>(blockDim.x) * blockIdx.x;
+  if (idx >= n_local_samples * n_features) return;
+  int64_t sample_local = idx / n_features;
+  int32_t feature      = idx % n_features;
+  int32_t position     = positions_local[sample_local];
+  if (position < 0) return;
+  int32_t slot = node_slot[position];
+  if (slot < 0) return;
+  int64_t sample_row = sample_index_local[sample_local];
+  int32_t bin        = X[{sample_row + sample_offset, feature_sets[{level, feature}]}];
+  for (int32_t output = 0; output < indexer.num_outputs; output++) {
+    IntegerGPair<T> gpair        = gpairs[sample_row * indexer.num_outputs + output];
+    IntegerGPair<T>& addPosition = histogram[indexer(slot, feature, bin, output)];
+    AtomicAdd(&addPosition.grad, gpair.grad);
+    AtomicAdd(&addPosition.hess, gpair.hess);
   }
 }
 
@@ -173,16 +129,21 @@ __global__ static void __launch_bounds__(THREADS_PER_BLOCK, MIN_CTAS_PER_SM)
 struct GainFeaturePair {
   double gain;
   int feature;
+  int bin;
+  bool default_left;
 
   __device__ void operator=(const GainFeaturePair& other)
   {
-    gain    = other.gain;
-    feature = other.feature;
+    gain         = other.gain;
+    feature      = other.feature;
+    bin          = other.bin;
+    default_left = other.default_left;
   }
 
   __device__ bool operator==(const GainFeaturePair& other) const
   {
-    return gain == other.gain && feature == other.feature;
+    return gain == other.gain && feature == other.feature && bin == other.bin &&
+           default_left == other.default_left;
   }
 
   __device__ bool operator>(const GainFeaturePair& other) const { return gain > other.gain; }
@@ -190,40 +151,75 @@ struct GainFeaturePair {
   __device__ bool operator<(const GainFeaturePair& other) const { return gain < other.gain; }
 };
 
-template <typename TYPE>
+template <typename T>
 __global__ static void __launch_bounds__(THREADS_PER_BLOCK, MIN_CTAS_PER_SM)
-  perform_best_split(legate::Buffer<GPair, 3> histogram,
-                     size_t n_features,
-                     size_t n_outputs,
-                     legate::AccessorRO<TYPE, 2> split_proposal,
-                     double eps,
-                     legate::Buffer<double, 2> tree_leaf_value,
-                     legate::Buffer<double, 2> tree_gradient,
-                     legate::Buffer<double, 2> tree_hessian,
-                     legate::Buffer<int32_t, 1> tree_feature,
-                     legate::Buffer<double, 1> tree_split_value,
-                     legate::Buffer<double, 1> tree_gain,
-                     int64_t depth)
+  best_split(legate::Buffer<IntegerGPair<T>, 1> histogram,
+             HistogramIndexer indexer,
+             GradientQuantiser<T> quantiser,
+             double eps,
+             legate::Buffer<double, 2> tree_gradient,
+             legate::Buffer<double, 2> tree_hessian,
+             const int32_t* nodes,
+             const char* categorical,
+             double* best_gain,
+             int32_t* best_feature,
+             int32_t* best_bin,
+             char* best_default_left,
+             GPair* left_sum,
+             GPair* right_sum)
 {
-  // using one block per (level) node to have blockwise reductions
-  int node_id        = blockIdx.x;
-  int global_node_id = node_id + ((1 << depth) - 1);
+  // using one block per node to have blockwise reductions
+  // the histogram contains the cumulative sums over bins
+  int node_slot      = blockIdx.x;
+  int global_node_id = nodes[node_slot];
+  int missing_bin    = indexer.num_bins - 1;
+
+  // Rows missing the feature go right unless sending them left is better
+  auto left_gpair = [&](int feature, int bin, int output, bool missing_left) {
+    auto left = histogram[indexer(node_slot, feature, bin, output)];
+    if (missing_left) {
+      left += histogram[indexer(node_slot, feature, missing_bin, output)] -
+              histogram[indexer(node_slot, feature, missing_bin - 1, output)];
+    }
+    return left;
+  };
 
   typedef cub::BlockReduce<GainFeaturePair, THREADS_PER_BLOCK> BlockReduce;
   __shared__ typename BlockReduce::TempStorage temp_storage;
 
   __shared__ double node_best_gain;
   __shared__ int node_best_feature;
-
-  double thread_best_gain = 0;
-  int thread_best_feature = -1;
-
-  for (int feature_id = threadIdx.x; feature_id < n_features; feature_id += blockDim.x) {
+  __shared__ int node_best_bin;
+  __shared__ bool node_best_default_left;
+
+  double thread_best_gain       = 0;
+  int thread_best_feature       = -1;
+  int thread_best_bin           = -1;
+  bool thread_best_default_left = false;
+
+  // Each candidate is a bin and a direction for the rows missing the feature
+  int64_t num_candidates = static_cast<int64_t>(indexer.num_features) * missing_bin * 2;
+  for (int64_t candidate = threadIdx.x; candidate < num_candidates; candidate += blockDim.x) {
+    int feature       = candidate / (missing_bin * 2);
+    int bin           = (candidate / 2) % missing_bin;
+    bool missing_left = candidate % 2;
+    // Categorical features are searched separately
+    if (categorical[feature]) continue;
+    if (missing_left) {
+      // Without missing rows both directions are the same split
+      bool has_missing = false;
+      for (int output = 0; output < indexer.num_outputs; ++output) {
+        auto missing = histogram[indexer(node_slot, feature, missing_bin, output)] -
+                       histogram[indexer(node_slot, feature, missing_bin - 1, output)];
+        has_missing  = has_missing || missing.grad != 0 || missing.hess != 0;
+      }
+      if (!has_missing) continue;
+    }
     double gain = 0;
-    for (int output = 0; output < n_outputs; ++output) {
+    for (int output = 0; output < indexer.num_outputs; ++output) {
       auto G          = tree_gradient[{global_node_id, output}];
       auto H          = tree_hessian[{global_node_id, output}];
-      auto [G_L, H_L] = histogram[{node_id, feature_id, output}];
+      auto [G_L, H_L] = quantiser.Dequantise(left_gpair(feature, bin, output, missing_left));
       auto G_R        = G - G_L;
       auto H_R        = H - H_L;
 
@@ -234,56 +230,56 @@ __global__ static void __launch_bounds__(THREADS_PER_BLOCK, MIN_CTAS_PER_SM)
       gain += 0.5 * ((G_L * G_L) / (H_L + eps) + (G_R * G_R) / (H_R + eps) - (G * G) / (H + eps));
     }
     if (gain > thread_best_gain) {
-      thread_best_gain    = gain;
-      thread_best_feature = feature_id;
+      thread_best_gain         = gain;
+      thread_best_feature      = feature;
+      thread_best_bin          = bin;
+      thread_best_default_left = missing_left;
     }
   }
 
   // SYNC BEST GAIN TO FULL BLOCK/NODE
-  GainFeaturePair thread_best_pair{thread_best_gain, thread_best_feature};
+  GainFeaturePair thread_best_pair{
+    thread_best_gain, thread_best_feature, thread_best_bin, thread_best_default_left};
   GainFeaturePair node_best_pair =
     BlockReduce(temp_storage).Reduce(thread_best_pair, cub::Max(), THREADS_PER_BLOCK);
   if (threadIdx.x == 0) {
-    node_best_gain    = node_best_pair.gain;
-    node_best_feature = node_best_pair.feature;
+    node_best_gain               = node_best_pair.gain;
+    node_best_feature            = node_best_pair.feature;
+    node_best_bin                = node_best_pair.bin;
+    node_best_default_left       = node_best_pair.default_left;
+    best_gain[node_slot]         = node_best_pair.gain;
+    best_feature[node_slot]      = node_best_pair.feature;
+    best_bin[node_slot]          = node_best_pair.bin;
+    best_default_left[node_slot] = node_best_pair.default_left;
   }
   __syncthreads();
 
-  // from here on we need the global node id
-  if (node_best_gain > eps) {
-    for (int output = threadIdx.x; output < n_outputs; output += blockDim.x) {
-      auto [G_L, H_L] = histogram[{node_id, node_best_feature, output}];
-      auto G_R        = tree_gradient[{global_node_id, output}] - G_L;
-      auto H_R        = tree_hessian[{global_node_id, output}] - H_L;
-
-      int left_child                         = global_node_id * 2 + 1;
-      int right_child                        = left_child + 1;
-      tree_leaf_value[{left_child, output}]  = -G_L / H_L;
-      tree_leaf_value[{right_child, output}] = -G_R / H_R;
-      tree_hessian[{left_child, output}]     = H_L;
-      tree_hessian[{right_child, output}]    = H_R;
-      tree_gradient[{left_child, output}]    = G_L;
-      tree_gradient[{right_child, output}]   = G_R;
-
-      if (output == 0) {
-        tree_feature[global_node_id]     = node_best_feature;
-        tree_split_value[global_node_id] = split_proposal[{depth, node_best_feature}];
-        tree_gain[global_node_id]        = node_best_gain;
-      }
-    }
+  if (node_best_feature == -1) return;
+  for (int output = threadIdx.x; output < indexer.num_outputs; output += blockDim.x) {
+    GPair left = quantiser.Dequantise(
+      left_gpair(node_best_feature, node_best_bin, output, node_best_default_left));
+    GPair node{tree_gradient[{global_node_id, output}], tree_hessian[{global_node_id, output}]};
+    left_sum[node_slot * indexer.num_outputs + output]  = left;
+    right_sum[node_slot * indexer.num_outputs + output] = node - left;
   }
 }
 
 namespace {
 
 struct Tree {
-  Tree(int max_depth, int num_outputs, cudaStream_t stream)
-    : num_outputs(num_outputs), max_nodes(1 << (max_depth + 1)), stream(stream)
+  Tree(int max_nodes, int num_outputs, int num_words, cudaStream_t stream)
+    : num_outputs(num_outputs), max_nodes(max_nodes), num_words(num_words), stream(stream)
   {
-    leaf_value  = legate::create_buffer<double, 2>({max_nodes, num_outputs});
-    feature     = legate::create_buffer<int32_t, 1>({max_nodes});
+    leaf_value = legate::create_buffer<double, 2>({max_nodes, num_outputs});
+    feature    = legate::create_buffer<int32_t, 1>({max_nodes});
+    children   = legate::create_buffer<int32_t, 2>({max_nodes, 2});
+    left_child_host.resize(max_nodes, -1);
     split_value = legate::create_buffer<double, 1>({max_nodes});
-    gain        = legate::create_buffer<double, 1>({max_nodes});
+    split_bin    = legate::create_buffer<int32_t, 1>({max_nodes});
+    default_left = legate::create_buffer<bool, 1>({max_nodes});
+    categorical  = legate::create_buffer<bool, 1>({max_nodes});
+    categories   = legate::create_buffer<uint32_t, 2>({max_nodes, num_words});
+    gain         = legate::create_buffer<double, 1>({max_nodes});
     hessian     = legate::create_buffer<double, 2>({max_nodes, num_outputs});
     gradient    = legate::create_buffer<double, 2>({max_nodes, num_outputs});
   }
@@ -292,19 +288,26 @@ struct Tree {
   {
     leaf_value.destroy();
     feature.destroy();
+    children.destroy();
     split_value.destroy();
+    split_bin.destroy();
+    default_left.destroy();
+    categorical.destroy();
+    categories.destroy();
     gain.destroy();
     hessian.destroy();
     gradient.destroy();
   }
 
-  template <typename THRUST_POLICY>
-  void InitializeBase(double* base_sums, const THRUST_POLICY& thrust_exec_policy)
+  template <typename T, typename THRUST_POLICY>
+  void InitializeBase(const T* base_sums,
+                      const GradientQuantiser<T>& quantiser,
+                      const THRUST_POLICY& thrust_exec_policy)
   {
-    std::vector<double> base_sums_host(2 * num_outputs);
+    std::vector<T> base_sums_host(2 * num_outputs);
     CHECK_CUDA(cudaMemcpyAsync(base_sums_host.data(),
                                base_sums,
-                               sizeof(double) * num_outputs * 2,
+                               sizeof(T) * num_outputs * 2,
                                cudaMemcpyDeviceToHost,
                                stream));
 
@@ -313,9 +316,19 @@ struct Tree {
                  leaf_value.ptr({0, 0}) + max_nodes * num_outputs,
                  0.0);
     thrust::fill(thrust_exec_policy, feature.ptr({0}), feature.ptr({0}) + max_nodes, -1);
+    thrust::fill(
+      thrust_exec_policy, children.ptr({0, 0}), children.ptr({0, 0}) + max_nodes * 2, -1);
     thrust::fill(
       thrust_exec_policy, hessian.ptr({0, 0}), hessian.ptr({0, 0}) + max_nodes * num_outputs, 0.0);
     thrust::fill(thrust_exec_policy, split_value.ptr({0}), split_value.ptr({0}) + max_nodes, 0.0);
+    thrust::fill(
+      thrust_exec_policy, default_left.ptr({0}), default_left.ptr({0}) + max_nodes, false);
+    thrust::fill(
+      thrust_exec_policy, categorical.ptr({0}), categorical.ptr({0}) + max_nodes, false);
+    thrust::fill(thrust_exec_policy,
+                 categories.ptr({0, 0}),
+                 categories.ptr({0, 0}) + max_nodes * num_words,
+                 0U);
     thrust::fill(thrust_exec_policy, gain.ptr({0}), gain.ptr({0}) + max_nodes, 0.0);
     thrust::fill(thrust_exec_policy,
                  gradient.ptr({0, 0}),
@@ -325,8 +338,14 @@ struct Tree {
     CHECK_CUDA(cudaStreamSynchronize(stream));
 
     std::vector<double> leaf_value_init(num_outputs);
+    std::vector<double> gradient_init(num_outputs);
+    std::vector<double> hessian_init(num_outputs);
     for (auto i = 0; i < num_outputs; ++i) {
-      leaf_value_init[i] = (-base_sums_host[i] / base_sums_host[i + num_outputs]);
+      auto [G, H] =
+        quantiser.Dequantise(IntegerGPair<T>{base_sums_host[i], base_sums_host[i + num_outputs]});
+      leaf_value_init[i] = -G / H;
+      gradient_init[i]   = G;
+      hessian_init[i]    = H;
     }
     CHECK_CUDA(cudaMemcpyAsync(leaf_value.ptr({0, 0}),
                                leaf_value_init.data(),
@@ -334,15 +353,16 @@ struct Tree {
                                cudaMemcpyHostToDevice,
                                stream));
     CHECK_CUDA(cudaMemcpyAsync(gradient.ptr({0, 0}),
-                               base_sums,
+                               gradient_init.data(),
                                sizeof(double) * num_outputs,
-                               cudaMemcpyDeviceToDevice,
+                               cudaMemcpyHostToDevice,
                                stream));
     CHECK_CUDA(cudaMemcpyAsync(hessian.ptr({0, 0}),
-                               base_sums + num_outputs,
+                               hessian_init.data(),
                                sizeof(double) * num_outputs,
-                               cudaMemcpyDeviceToDevice,
+                               cudaMemcpyHostToDevice,
                                stream));
+    CHECK_CUDA(cudaStreamSynchronize(stream));
   }
 
   template <typename T, int DIM>
@@ -371,94 +391,281 @@ struct Tree {
     WriteOutput(context.output(2).data(), split_value);
     WriteOutput(context.output(3).data(), gain);
     WriteOutput(context.output(4).data(), hessian);
+    WriteOutput(context.output(5).data(), children);
+    WriteOutput(context.output(7).data(), default_left);
+    WriteOutput(context.output(8).data(), categorical);
+    WriteOutput(context.output(9).data(), categories);
     CHECK_CUDA_STREAM(stream);
   }
 
+  int LeftChild(int id) const { return left_child_host[id]; }
+
   legate::Buffer<double, 2> leaf_value;
   legate::Buffer<int32_t, 1> feature;
+  legate::Buffer<int32_t, 2> children;  // Left and right child of each node, -1 for leaves
   legate::Buffer<double, 1> split_value;
+  legate::Buffer<int32_t, 1> split_bin;  // Used to partition the quantised training data
+  legate::Buffer<bool, 1> default_left;  // Direction of rows missing the feature
+  legate::Buffer<bool, 1> categorical;   // Split on a categorical feature
+  legate::Buffer<uint32_t, 2> categories;  // Bitset of the categories going left
   legate::Buffer<double, 1> gain;
   legate::Buffer<double, 2> hessian;
   legate::Buffer<double, 2> gradient;
   const int num_outputs;
   const int max_nodes;
+  const int num_words;
+  int num_nodes = 1;  // Nodes are numbered in the order they are created
+  // The right child is always allocated directly after the left child
+  std::vector<int32_t> left_child_host;
   cudaStream_t stream;
 };
 
-struct TreeLevelInfo {
-  TreeLevelInfo(int32_t num_rows,
-                int32_t num_features,
-                int32_t num_outputs,
-                cudaStream_t stream,
-                int32_t max_nodes)
+// Histograms are built for a batch of nodes at a time, with one slot per node
+// Gradient pairs are summed as fixed point integers of type T
+template <typename T>
+struct GradientHistogram {
+  GradientHistogram(int num_nodes, HistogramIndexer indexer, cudaStream_t stream)
+    : indexer(indexer), size(num_nodes * indexer.NodeSize())
+  {
+    gradient_sums = legate::create_buffer<IntegerGPair<T>, 1>(std::max<int64_t>(size, 1));
+    CHECK_CUDA(cudaMemsetAsync(gradient_sums.ptr(0), 0, size * sizeof(IntegerGPair<T>), stream));
+  }
+  ~GradientHistogram() { gradient_sums.destroy(); }
+  GradientHistogram(const GradientHistogram&)            = delete;
+  GradientHistogram& operator=(const GradientHistogram&) = delete;
+
+  HistogramIndexer indexer;
+  int64_t size;
+  legate::Buffer<IntegerGPair<T>, 1> gradient_sums;
+};
+
+// A node keeps the histogram batch it belongs to alive until it is expanded or finished
+template <typename T>
+struct NodeHistogram {
+  std::shared_ptr<GradientHistogram<T>> batch;
+  int slot;
+
+  IntegerGPair<T>* ptr() const
+  {
+    return batch->gradient_sums.ptr(slot * batch->indexer.NodeSize());
+  }
+};
+
+template <typename T>
+legate::Buffer<T> CopyToDevice(const std::vector<T>& x, cudaStream_t stream)
+{
+  auto buffer = legate::create_buffer<T>(std::max<size_t>(x.size(), 1));
+  CHECK_CUDA(
+    cudaMemcpyAsync(buffer.ptr(0), x.data(), x.size() * sizeof(T), cudaMemcpyHostToDevice, stream));
+  return buffer;
+}
+
+template <typename T>
+std::vector<T> CopyToHost(const T* x, size_t n, cudaStream_t stream)
+{
+  std::vector<T> result(n);
+  CHECK_CUDA(cudaMemcpyAsync(result.data(), x, n * sizeof(T), cudaMemcpyDeviceToHost, stream));
+  return result;
+}
+
+struct TreeBuilder {
+  TreeBuilder(int32_t num_rows,
+              int32_t num_features,
+              int32_t num_bins,
+              int32_t num_outputs,
+              cudaStream_t stream,
+              int32_t max_nodes)
     : num_rows(num_rows),
       num_features(num_features),
       num_outputs(num_outputs),
-      stream(stream),
-      max_nodes(max_nodes)
+      max_nodes(max_nodes),
+      indexer{num_features, num_bins + 1, num_outputs},
+      stream(stream)
   {
     positions           = legate::create_buffer<int32_t>(num_rows);
     sequence            = legate::create_buffer<int32_t>(num_rows);
     indices_reordered   = legate::create_buffer<int32_t>(num_rows);
     positions_reordered = legate::create_buffer<int32_t>(num_rows);
+    node_slot           = legate::create_buffer<int32_t>(max_nodes);
+    node_slot_host.resize(max_nodes, -1);
   }
 
-  ~TreeLevelInfo()
+  ~TreeBuilder()
   {
     positions.destroy();
     sequence.destroy();
     indices_reordered.destroy();
     positions_reordered.destroy();
+    node_slot.destroy();
     if (cub_buffer_size > 0) cub_buffer.destroy();
-    if (current_depth >= 0) histogram_buffer.destroy();
   }
 
   template <typename THRUST_POLICY>
-  void InitializeHistogramForDepth(int32_t depth, const THRUST_POLICY& thrust_exec_policy)
+  void InitializePositions(const THRUST_POLICY& thrust_exec_policy)
   {
-    if (current_depth < 0) {
-      // some initialization on first pass
-      CHECK_CUDA(cudaMemsetAsync(positions.ptr(0), 0, (size_t)num_rows * sizeof(int32_t), stream));
-      thrust::sequence(thrust_exec_policy, sequence.ptr(0), sequence.ptr(0) + num_rows);
-    } else {
-      histogram_buffer.destroy();
+    CHECK_CUDA(cudaMemsetAsync(positions.ptr(0), 0, (size_t)num_rows * sizeof(int32_t), stream));
+    thrust::sequence(thrust_exec_policy, sequence.ptr(0), sequence.ptr(0) + num_rows);
+  }
+
+  // Apply the splits of the expanded nodes to the tree
+  void ApplySplits(Tree& tree,
+                   const std::vector<SplitCandidate>& expand,
+                   legate::AccessorRO<double, 2> split_proposal)
+  {
+    std::vector<int32_t> nodes_host;
+    std::vector<int32_t> left_child_host;
+    std::vector<int32_t> feature_host;
+    std::vector<int32_t> bin_host;
+    std::vector<char> default_left_host;
+    std::vector<char> categorical_host;
+    std::vector<uint32_t> categories_host(expand.size() * tree.num_words, 0);
+    std::vector<double> gain_host;
+    std::vector<GPair> left_host;
+    std::vector<GPair> right_host;
+    for (const auto& candidate : expand) {
+      EXPECT(tree.num_nodes + 2 <= tree.max_nodes, "Tree has more nodes than allocated.");
+      nodes_host.push_back(candidate.node_id);
+      left_child_host.push_back(tree.num_nodes);
+      tree.left_child_host[candidate.node_id] = tree.num_nodes;
+      tree.num_nodes += 2;
+      feature_host.push_back(candidate.feature);
+      bin_host.push_back(candidate.bin);
+      default_left_host.push_back(candidate.default_left);
+      categorical_host.push_back(!candidate.categories.empty());
+      std::copy(candidate.categories.begin(),
+                candidate.categories.end(),
+                categories_host.begin() + (feature_host.size() - 1) * tree.num_words);
+      gain_host.push_back(candidate.gain);
+      left_host.insert(left_host.end(), candidate.left_sum.begin(), candidate.left_sum.end());
+      right_host.insert(right_host.end(), candidate.right_sum.begin(), candidate.right_sum.end());
     }
-    current_depth    = depth;
-    int max_nodes    = 1 << depth;
-    histogram_buffer = legate::create_buffer<GPair, 3>({max_nodes, num_features, num_outputs});
-    CHECK_CUDA(cudaMemsetAsync(histogram_buffer.ptr(legate::Point<3>::ZEROES()),
-                               0,
-                               max_nodes * num_features * num_outputs * sizeof(GPair),
-                               stream));
+    auto nodes_ptr         = CopyToDevice(nodes_host, stream);
+    auto left_child_ptr    = CopyToDevice(left_child_host, stream);
+    auto feature_ptr       = CopyToDevice(feature_host, stream);
+    auto bin_ptr           = CopyToDevice(bin_host, stream);
+    auto default_left_ptr  = CopyToDevice(default_left_host, stream);
+    auto categorical_ptr   = CopyToDevice(categorical_host, stream);
+    auto categories_ptr    = CopyToDevice(categories_host, stream);
+    auto gain_ptr          = CopyToDevice(gain_host, stream);
+    auto left_ptr          = CopyToDevice(left_host, stream);
+    auto right_ptr         = CopyToDevice(right_host, stream);
+    auto num_outputs       = this->num_outputs;
+    auto num_words         = tree.num_words;
+    auto tree_leaf_value   = tree.leaf_value;
+    auto tree_gradient     = tree.gradient;
+    auto tree_hessian      = tree.hessian;
+    auto tree_feature      = tree.feature;
+    auto tree_children     = tree.children;
+    auto tree_split        = tree.split_value;
+    auto tree_split_bin    = tree.split_bin;
+    auto tree_default_left = tree.default_left;
+    auto tree_categorical  = tree.categorical;
+    auto tree_categories   = tree.categories;
+    auto tree_gain         = tree.gain;
+    LaunchN(expand.size() * num_outputs, stream, [=] __device__(size_t idx) {
+      int i                                  = idx / num_outputs;
+      int output                             = idx % num_outputs;
+      int node_id                            = nodes_ptr[i];
+      int left_child                         = left_child_ptr[i];
+      int right_child                        = left_child + 1;
+      auto [G_L, H_L]                        = left_ptr[idx];
+      auto [G_R, H_R]                        = right_ptr[idx];
+      tree_leaf_value[{left_child, output}]  = -G_L / H_L;
+      tree_leaf_value[{right_child, output}] = -G_R / H_R;
+      tree_hessian[{left_child, output}]     = H_L;
+      tree_hessian[{right_child, output}]    = H_R;
+      tree_gradient[{left_child, output}]    = G_L;
+      tree_gradient[{right_child, output}]   = G_R;
+      if (output == 0) {
+        bool categorical            = categorical_ptr[i];
+        tree_feature[node_id]       = feature_ptr[i];
+        tree_children[{node_id, 0}] = left_child;
+        tree_children[{node_id, 1}] = right_child;
+        // Categorical splits have no split value
+        tree_split[node_id] = categorical ? 0.0 : split_proposal[{bin_ptr[i], feature_ptr[i]}];
+        tree_split_bin[node_id]    = bin_ptr[i];
+        tree_default_left[node_id] = default_left_ptr[i];
+        tree_categorical[node_id]  = categorical;
+        tree_gain[node_id]         = gain_ptr[i];
+        for (int w = 0; w < num_words; w++) {
+          tree_categories[{node_id, w}] = categories_ptr[i * num_words + w];
+        }
+      }
+    });
+    CHECK_CUDA(cudaStreamSynchronize(stream));
+    nodes_ptr.destroy();
+    left_child_ptr.destroy();
+    feature_ptr.destroy();
+    bin_ptr.destroy();
+    default_left_ptr.destroy();
+    categorical_ptr.destroy();
+    categories_ptr.destroy();
+    gain_ptr.destroy();
+    left_ptr.destroy();
+    right_ptr.destroy();
   }
 
-  template <typename TYPE>
-  void UpdatePositions(Tree& tree, legate::AccessorRO<TYPE, 2> X, legate::Rect<2> X_shape)
+  // Move the rows of split nodes into their children
+  // If unsplit nodes are final (depthwise growth), their rows are dropped by storing the
+  // complement of their leaf, which keeps the leaf of every row
+  template <typename BinT>
+  void UpdatePositions(Tree& tree,
+                       legate::AccessorRO<BinT, 2> X,
+                       legate::Rect<2> X_shape,
+                       bool drop_unsplit)
   {
-    if (current_depth > 0 && skip_rows < num_rows) {
-      auto tree_split_value_ptr    = tree.split_value.ptr(0);
+    if (skip_rows < num_rows) {
+      auto tree_split_bin_ptr      = tree.split_bin.ptr(0);
+      auto tree_default_left_ptr   = tree.default_left.ptr(0);
+      auto tree_categorical_ptr    = tree.categorical.ptr(0);
+      auto tree_categories_ptr     = tree.categories.ptr({0, 0});
+      auto num_words               = tree.num_words;
       auto tree_feature_ptr        = tree.feature.ptr(0);
+      int32_t missing_bin          = indexer.num_bins - 1;
+      auto tree_children           = tree.children;
       auto positions_ptr           = positions.ptr(0);
-      auto max_nodes_              = this->max_nodes;
       auto update_positions_lambda = [=] __device__(size_t idx) {
         int32_t& pos = positions_ptr[idx];
-        if (pos < 0 || pos >= max_nodes_ || tree_feature_ptr[pos] == -1) {
-          pos = -1;
+        if (pos < 0) return;
+        if (tree_feature_ptr[pos] == -1) {
+          if (drop_unsplit) pos = ~pos;
           return;
         }
-        double x_value = X[{X_shape.lo[0] + (int64_t)idx, tree_feature_ptr[pos]}];
-        bool left      = x_value <= tree_split_value_ptr[pos];
-        pos            = left ? 2 * pos + 1 : 2 * pos + 2;
+        int32_t bin = X[{X_shape.lo[0] + (int64_t)idx, tree_feature_ptr[pos]}];
+        // Rows missing the feature follow the default direction
+        // The bin of a categorical feature is its category
+        bool left = bin == missing_bin ? tree_default_left_ptr[pos]
+                    : tree_categorical_ptr[pos]
+                      ? BitsetContains(tree_categories_ptr + pos * num_words, bin)
+                      : bin <= tree_split_bin_ptr[pos];
+        pos       = tree_children[{pos, left ? 0 : 1}];
       };
       LaunchN(num_rows, stream, update_positions_lambda);
       CHECK_CUDA_STREAM(stream);
     }
   }
 
+  // Each row gets the leaf value of the leaf it ends up in
+  void WriteRowLeafValues(Tree& tree, legate::PhysicalStore out, legate::Rect<2> X_shape)
+  {
+    auto out_acc         = out.write_accessor<double, 2>();
+    auto positions_ptr   = positions.ptr(0);
+    auto tree_leaf_value = tree.leaf_value;
+    auto num_outputs     = this->num_outputs;
+    LaunchN(static_cast<size_t>(num_rows) * num_outputs, stream, [=] __device__(size_t idx) {
+      int64_t row                            = idx / num_outputs;
+      int32_t output                         = idx % num_outputs;
+      int32_t pos                            = positions_ptr[row];
+      int32_t leaf                           = pos >= 0 ? pos : ~pos;
+      out_acc[{X_shape.lo[0] + row, output}] = tree_leaf_value[{leaf, output}];
+    });
+    CHECK_CUDA_STREAM(stream);
+  }
+
   template <typename THRUST_POLICY>
   void ReorderPositions(const THRUST_POLICY& thrust_exec_policy)
   {
-    if (current_depth > 0 && skip_rows < num_rows) {
+    if (skip_rows < num_rows) {
       size_t temp_storage_bytes = 0;
       cub::DeviceRadixSort::SortPairs(nullptr,
                                       temp_storage_bytes,
@@ -495,6 +702,7 @@ struct TreeLevelInfo {
                                  [=] __device__(int32_t & x) { return x >= 0; });
 
       skip_rows = res - positions_reordered.ptr(0);
+      sorted    = true;
 
       CHECK_CUDA_STREAM(stream);
     }
@@ -502,7 +710,7 @@ struct TreeLevelInfo {
 
   int32_t* PositionsPtr()
   {
-    if (current_depth > 0)
+    if (sorted)
       return positions_reordered.ptr(skip_rows);
     else
       return positions.ptr(0);
@@ -510,107 +718,322 @@ struct TreeLevelInfo {
 
   int32_t* IndicesPtr()
   {
-    if (current_depth > 0)
+    if (sorted)
       return indices_reordered.ptr(skip_rows);
     else
       return sequence.ptr(0);
   }
 
-  template <typename TYPE>
-  void FillHistogram(Tree& tree,
-                     legate::AccessorRO<TYPE, 2> X,
-                     legate::Rect<2> X_shape,
-                     legate::AccessorRO<TYPE, 2> split_proposal,
-                     legate::AccessorRO<double, 2> g,
-                     legate::AccessorRO<double, 2> h)
+  // Build the histograms of a batch of new leaves and find their best splits
+  // The histograms of build are summed from their rows, those of subtract are the
+  // histogram of their parent minus the histogram of their built sibling
+  // Built nodes take the first slots, followed by their siblings in the same order
+  template <typename BinT, typename T>
+  std::vector<SplitCandidate> EvaluateLeaves(legate::TaskContext context,
+                                             Tree& tree,
+                                             const std::vector<int32_t>& build,
+                                             const std::vector<int32_t>& subtract,
+                                             const std::vector<NodeHistogram<T>>& parents,
+                                             int depth,
+                                             legate::AccessorRO<BinT, 2> X,
+                                             legate::Rect<2> X_shape,
+                                             legate::Buffer<IntegerGPair<T>, 1> gpairs,
+                                             const GradientQuantiser<T>& quantiser,
+                                             const FeatureSets& feature_sets,
+                                             legate::AccessorRO<int32_t, 2> feature_sets_accessor,
+                                             const std::vector<char>& is_categorical,
+                                             double eps,
+                                             std::shared_ptr<GradientHistogram<T>>& histogram)
   {
+    std::vector<int32_t> nodes(build);
+    nodes.insert(nodes.end(), subtract.begin(), subtract.end());
+    int32_t num_built = build.size();
+    histogram         = std::make_shared<GradientHistogram<T>>(nodes.size(), indexer, stream);
+
+    // Only rows of built nodes are added to the histogram
+    for (int i = 0; i < num_built; i++) { node_slot_host[build[i]] = i; }
+    CHECK_CUDA(cudaMemcpyAsync(node_slot.ptr(0),
+                               node_slot_host.data(),
+                               max_nodes * sizeof(int32_t),
+                               cudaMemcpyHostToDevice,
+                               stream));
     if (skip_rows < num_rows) {
-      // TODO adjust kernel parameters dynamically
-      constexpr size_t elements_per_thread = 1;
-      constexpr size_t features_per_block  = 8;
-      const size_t blocks_x = (num_rows - skip_rows + THREADS_PER_BLOCK * elements_per_thread - 1) /
-                              (THREADS_PER_BLOCK * elements_per_thread);
-      const size_t blocks_y = (num_features + features_per_block - 1) / features_per_block;
-      dim3 grid_shape       = dim3(blocks_x, blocks_y, 1);
-      fill_histogram_blockreduce<TYPE, elements_per_thread, features_per_block>
-        <<<grid_shape, THREADS_PER_BLOCK, 0, stream>>>(X,
-                                                       num_rows - skip_rows,
-                                                       num_features,
-                                                       X_shape.lo[0],
-                                                       g,
-                                                       h,
-                                                       num_outputs,
-                                                       split_proposal,
-                                                       PositionsPtr(),
-                                                       IndicesPtr(),
-                                                       histogram_buffer,
-                                                       1 << current_depth,
-                                                       current_depth);
+      const size_t num_elements = static_cast<size_t>(num_rows - skip_rows) * num_features;
+      const size_t blocks       = (num_elements + THREADS_PER_BLOCK - 1) / THREADS_PER_BLOCK;
+      fill_histogram<BinT, T><<<blocks, THREADS_PER_BLOCK, 0, stream>>>(X,
+                                                                     num_rows - skip_rows,
+                                                                     num_features,
+                                                                     feature_sets_accessor,
+                                                                     feature_sets.Level(depth),
+                                                                     X_shape.lo[0],
+                                                                     gpairs,
+                                                                     PositionsPtr(),
+                                                                     IndicesPtr(),
+                                                                     node_slot.ptr(0),
+                                                                     histogram->gradient_sums,
+                                                                     indexer);
       CHECK_CUDA_STREAM(stream);
     }
-  }
 
-  template <typename TYPE>
-  void PerformBestSplit(Tree& tree, legate::AccessorRO<TYPE, 2> split_proposal, double eps)
-  {
-    perform_best_split<<<(1 << current_depth), THREADS_PER_BLOCK, 0, stream>>>(histogram_buffer,
-                                                                               num_features,
-                                                                               num_outputs,
-                                                                               split_proposal,
-                                                                               eps,
-                                                                               tree.leaf_value,
-                                                                               tree.gradient,
-                                                                               tree.hessian,
-                                                                               tree.feature,
-                                                                               tree.split_value,
-                                                                               tree.gain,
-                                                                               current_depth);
+    SumAllReduce(context,
+                 reinterpret_cast<T*>(histogram->gradient_sums.ptr(0)),
+                 num_built * indexer.NodeSize() * 2,
+                 stream);
+
+    // Turn per bin sums into the sum of gradients to the left of each split proposal
+    auto gradient_sums = histogram->gradient_sums;
+    auto indexer       = this->indexer;
+    LaunchN(num_built * num_features * num_outputs, stream, [=] __device__(size_t idx) {
+      int32_t output  = idx % indexer.num_outputs;
+      int32_t feature = (idx / indexer.num_outputs) % indexer.num_features;
+      int32_t slot    = idx / (indexer.num_outputs * indexer.num_features);
+      for (int32_t bin = 1; bin < indexer.num_bins; bin++) {
+        gradient_sums[indexer(slot, feature, bin, output)] +=
+          gradient_sums[indexer(slot, feature, bin - 1, output)];
+      }
+    });
+
+    // Subtraction acts directly on the cumulative histograms
+    if (!subtract.empty()) {
+      std::vector<IntegerGPair<T>*> parent_ptr_host;
+      for (const auto& parent : parents) { parent_ptr_host.push_back(parent.ptr()); }
+      auto parent_ptr = CopyToDevice(parent_ptr_host, stream);
+      auto node_size  = indexer.NodeSize();
+      LaunchN(subtract.size() * node_size, stream, [=] __device__(size_t idx) {
+        int64_t slot   = idx / node_size;
+        int64_t offset = idx % node_size;
+        gradient_sums[(num_built + slot) * node_size + offset] =
+          parent_ptr[slot][offset] - gradient_sums[slot * node_size + offset];
+      });
+      CHECK_CUDA(cudaStreamSynchronize(stream));
+      parent_ptr.destroy();
+    }
+
+    // Positions in the feature set of categorical features
+    const int32_t* features = feature_sets.Features(depth);
+    std::vector<char> categorical_host(num_features);
+    std::vector<int32_t> categorical_features;
+    for (int32_t f = 0; f < num_features; f++) {
+      categorical_host[f] = is_categorical[features[f]];
+      if (categorical_host[f]) categorical_features.push_back(f);
+    }
+
+    auto nodes_ptr    = CopyToDevice(nodes, stream);
+    auto categorical  = CopyToDevice(categorical_host, stream);
+    auto gain         = legate::create_buffer<double>(nodes.size());
+    auto feature      = legate::create_buffer<int32_t>(nodes.size());
+    auto bin          = legate::create_buffer<int32_t>(nodes.size());
+    auto default_left = legate::create_buffer<char>(nodes.size());
+    auto left_sum     = legate::create_buffer<GPair>(nodes.size() * num_outputs);
+    auto right_sum    = legate::create_buffer<GPair>(nodes.size() * num_outputs);
+    best_split<<<nodes.size(), THREADS_PER_BLOCK, 0, stream>>>(histogram->gradient_sums,
+                                                               indexer,
+                                                               quantiser,
+                                                               eps,
+                                                               tree.gradient,
+                                                               tree.hessian,
+                                                               nodes_ptr.ptr(0),
+                                                               categorical.ptr(0),
+                                                               gain.ptr(0),
+                                                               feature.ptr(0),
+                                                               bin.ptr(0),
+                                                               default_left.ptr(0),
+                                                               left_sum.ptr(0),
+                                                               right_sum.ptr(0));
     CHECK_CUDA_STREAM(stream);
+    auto gain_host         = CopyToHost(gain.ptr(0), nodes.size(), stream);
+    auto feature_host      = CopyToHost(feature.ptr(0), nodes.size(), stream);
+    auto bin_host          = CopyToHost(bin.ptr(0), nodes.size(), stream);
+    auto default_left_host = CopyToHost(default_left.ptr(0), nodes.size(), stream);
+    auto left_sum_host     = CopyToHost(left_sum.ptr(0), nodes.size() * num_outputs, stream);
+    auto right_sum_host    = CopyToHost(right_sum.ptr(0), nodes.size() * num_outputs, stream);
+    CHECK_CUDA(cudaStreamSynchronize(stream));
+    nodes_ptr.destroy();
+    categorical.destroy();
+    gain.destroy();
+    feature.destroy();
+    bin.destroy();
+    default_left.destroy();
+    left_sum.destroy();
+    right_sum.destroy();
+    for (int i = 0; i < num_built; i++) { node_slot_host[build[i]] = -1; }
+
+    // Partitions of the categories are searched on the host, their histograms are small
+    std::vector<std::vector<uint32_t>> categories_host(nodes.size());
+    if (!categorical_features.empty()) {
+      int64_t feature_size = static_cast<int64_t>(indexer.num_bins) * num_outputs;
+      std::vector<std::vector<IntegerGPair<T>>> feature_histograms;
+      std::vector<std::vector<double>> node_gradient;
+      std::vector<std::vector<double>> node_hessian;
+      for (int slot = 0; slot < static_cast<int>(nodes.size()); slot++) {
+        node_gradient.push_back(
+          CopyToHost(tree.gradient.ptr({nodes[slot], 0}), num_outputs, stream));
+        node_hessian.push_back(CopyToHost(tree.hessian.ptr({nodes[slot], 0}), num_outputs, stream));
+        for (int32_t f : categorical_features) {
+          feature_histograms.push_back(
+            CopyToHost(gradient_sums.ptr(indexer(slot, f, 0, 0)), feature_size, stream));
+        }
+      }
+      CHECK_CUDA(cudaStreamSynchronize(stream));
+      for (int slot = 0; slot < static_cast<int>(nodes.size()); slot++) {
+        std::vector<GPair> node_sums;
+        for (int output = 0; output < num_outputs; output++) {
+          node_sums.push_back({node_gradient[slot][output], node_hessian[slot][output]});
+        }
+        for (int i = 0; i < static_cast<int>(categorical_features.size()); i++) {
+          const auto& sums = feature_histograms[slot * categorical_features.size() + i];
+          auto split       = BestCategoricalSplit(
+            [&](int bin, int output) { return sums[bin * num_outputs + output]; },
+            indexer.num_bins,
+            num_outputs,
+            tree.num_words,
+            node_sums,
+            quantiser,
+            eps);
+          if (split.gain <= gain_host[slot]) continue;
+          gain_host[slot]         = split.gain;
+          feature_host[slot]      = categorical_features[i];
+          bin_host[slot]          = -1;
+          default_left_host[slot] = split.default_left;
+          categories_host[slot]   = std::move(split.categories);
+          for (int output = 0; output < num_outputs; output++) {
+            int64_t idx         = slot * num_outputs + output;
+            left_sum_host[idx]  = quantiser.Dequantise(split.left_sum[output]);
+            right_sum_host[idx] = node_sums[output] - left_sum_host[idx];
+          }
+        }
+      }
+    }
+
+    // Map positions in the feature set back to columns of X
+    std::vector<SplitCandidate> candidates;
+    for (int slot = 0; slot < static_cast<int>(nodes.size()); slot++) {
+      int32_t feature = feature_host[slot] == -1 ? -1 : features[feature_host[slot]];
+      SplitCandidate candidate{nodes[slot],
+                               depth,
+                               gain_host[slot],
+                               feature,
+                               bin_host[slot],
+                               default_left_host[slot] != 0,
+                               std::move(categories_host[slot])};
+      if (candidate.feature != -1) {
+        candidate.left_sum.assign(left_sum_host.begin() + slot * num_outputs,
+                                  left_sum_host.begin() + (slot + 1) * num_outputs);
+        candidate.right_sum.assign(right_sum_host.begin() + slot * num_outputs,
+                                   right_sum_host.begin() + (slot + 1) * num_outputs);
+      }
+      candidates.push_back(std::move(candidate));
+    }
+    return candidates;
   }
 
   legate::Buffer<int32_t> positions;
   legate::Buffer<int32_t> positions_reordered;
   legate::Buffer<int32_t> sequence;
   legate::Buffer<int32_t> indices_reordered;
+  legate::Buffer<int32_t> node_slot;
+  std::vector<int32_t> node_slot_host;
   const int32_t num_rows;
-  const int32_t num_features;
+  const int32_t num_features;  // Size of the feature set of each level
   const int32_t num_outputs;
   const int32_t max_nodes;
+  const HistogramIndexer indexer;
 
   legate::Buffer<unsigned char> cub_buffer;
   size_t cub_buffer_size = 0;
 
   int32_t skip_rows = 0;
-  legate::Buffer<GPair, 3> histogram_buffer;
-  int32_t current_depth = -1;
+  bool sorted       = false;
 
   cudaStream_t stream;
 };
 
-void ReduceBaseSums(legate::Buffer<double> base_sums,
+template <typename T>
+legate::Buffer<IntegerGPair<T>, 1> QuantiseGradients(int32_t num_rows,
+                                                     int32_t num_outputs,
+                                                     legate::AccessorRO<double, 2> g,
+                                                     HessianAccessor h,
+                                                     legate::Rect<2> shape,
+                                                     const GradientQuantiser<T>& quantiser,
+                                                     cudaStream_t stream)
+{
+  const size_t num_elements = static_cast<size_t>(num_rows) * num_outputs;
+  auto gpairs = legate::create_buffer<IntegerGPair<T>, 1>(std::max<size_t>(num_elements, 1));
+  if (num_elements == 0) return gpairs;
+  const size_t blocks = (num_elements + THREADS_PER_BLOCK - 1) / THREADS_PER_BLOCK;
+  quantise_gradients<<<blocks, THREADS_PER_BLOCK, 0, stream>>>(
+    g, h, num_rows, shape.lo[0], num_outputs, quantiser, gpairs);
+  CHECK_CUDA_STREAM(stream);
+  return gpairs;
+}
+
+template <typename T>
+void ReduceBaseSums(legate::Buffer<T> base_sums,
                     int32_t num_rows,
                     int32_t num_outputs,
-                    legate::AccessorRO<double, 2> g,
-                    legate::AccessorRO<double, 2> h,
-                    legate::Rect<2> shape,
+                    legate::Buffer<IntegerGPair<T>, 1> gpairs,
                     cudaStream_t stream)
 {
-  CHECK_CUDA(cudaMemsetAsync(base_sums.ptr(0), 0, num_outputs * 2 * sizeof(double), stream));
+  CHECK_CUDA(cudaMemsetAsync(base_sums.ptr(0), 0, num_outputs * 2 * sizeof(T), stream));
   const size_t blocks = (num_rows + THREADS_PER_BLOCK - 1) / THREADS_PER_BLOCK;
   dim3 grid_shape     = dim3(blocks, num_outputs);
   reduce_base_sums<<<grid_shape, THREADS_PER_BLOCK, 0, stream>>>(
-    g, h, num_rows, shape.lo[0], base_sums, num_outputs);
+    gpairs, num_rows, base_sums, num_outputs);
   CHECK_CUDA_STREAM(stream);
 }
 
+// Largest absolute gradient and hessian over the rows of every worker
+template <typename THRUST_POLICY>
+GPair MaxAbsGradient(legate::TaskContext context,
+                     legate::AccessorRO<double, 2> g,
+                     HessianAccessor h,
+                     legate::Rect<2> shape,
+                     const THRUST_POLICY& thrust_exec_policy,
+                     cudaStream_t stream)
+{
+  int64_t num_rows    = std::max<int64_t>(shape.hi[0] - shape.lo[0] + 1, 0);
+  int64_t num_outputs = shape.hi[1] - shape.lo[1] + 1;
+  auto elements       = thrust::make_counting_iterator<int64_t>(0);
+  GPair max_abs       = thrust::transform_reduce(
+    thrust_exec_policy,
+    elements,
+    elements + num_rows * num_outputs,
+    [=] __device__(int64_t idx) {
+      legate::Point<2> p{shape.lo[0] + idx / num_outputs, shape.lo[1] + idx % num_outputs};
+      return GPair{fabs(g[p]), fabs(h[p])};
+    },
+    GPair{},
+    [] __device__(const GPair& a, const GPair& b) {
+      return GPair{fmax(a.grad, b.grad), fmax(a.hess, b.hess)};
+    });
+  std::vector<GPair> max_abs_host{max_abs};
+  auto buffer = CopyToDevice(max_abs_host, stream);
+  MaxAllReduce(context, reinterpret_cast<double*>(buffer.ptr(0)), 2, stream);
+  max_abs = CopyToHost(buffer.ptr(0), 1, stream).front();
+  CHECK_CUDA(cudaStreamSynchronize(stream));
+  buffer.destroy();
+  return max_abs;
+}
+
 struct build_tree_fn {
   template <legate::Type::Code CODE>
   void operator()(legate::TaskContext context)
   {
-    using T           = legate::type_of<CODE>;
+    // Gradients quantised to a few bits are summed in 32 bits, otherwise in 64 bits
+    auto quantised_bits = context.scalars().at(5).value<int32_t>();
+    if (quantised_bits > 0) {
+      Build<legate::type_of<CODE>, int32_t>(context);
+    } else {
+      Build<legate::type_of<CODE>, int64_t>(context);
+    }
+  }
+
+  template <typename BinT, typename SumT>
+  void Build(legate::TaskContext context)
+  {
     const auto& X     = context.input(0).data();
     auto X_shape      = X.shape<2>();
-    auto X_accessor   = X.read_accessor<T, 2>();
+    auto X_accessor   = X.read_accessor<BinT, 2>();
     auto num_features = X_shape.hi[1] - X_shape.lo[1] + 1;
     auto num_rows     = X_shape.hi[0] - X_shape.lo[0] + 1;
     const auto& g     = context.input(1).data();
@@ -619,71 +1042,158 @@ struct build_tree_fn {
     auto h_shape      = h.shape<2>();
     EXPECT_AXIS_ALIGNED(0, X_shape, g_shape);
     EXPECT_AXIS_ALIGNED(0, g_shape, h_shape);
-    EXPECT_AXIS_ALIGNED(1, g_shape, h_shape);
     auto num_outputs            = g_shape.hi[1] - g_shape.lo[1] + 1;
     auto g_accessor             = g.read_accessor<double, 2>();
-    auto h_accessor             = h.read_accessor<double, 2>();
+    auto h_accessor             = HessianAccessor(h, num_outputs);
     const auto& split_proposals = context.input(3).data();
     EXPECT_AXIS_ALIGNED(1, split_proposals.shape<2>(), X_shape);
-    auto split_proposal_accessor = split_proposals.read_accessor<T, 2>();
+    EXPECT_IS_BROADCAST(split_proposals.shape<2>());
+    auto split_proposal_accessor = split_proposals.read_accessor<double, 2>();
+    auto num_bins = split_proposals.shape<2>().hi[0] - split_proposals.shape<2>().lo[0] + 1;
+    const auto& feature_sets_store = context.input(4).data();
+    EXPECT_IS_BROADCAST(feature_sets_store.shape<2>());
+    auto feature_sets_shape    = feature_sets_store.shape<2>();
+    auto feature_sets_accessor = feature_sets_store.read_accessor<int32_t, 2>();
+    int32_t num_levels         = feature_sets_shape.hi[0] - feature_sets_shape.lo[0] + 1;
+    int32_t level_size         = feature_sets_shape.hi[1] - feature_sets_shape.lo[1] + 1;
+    EXPECT(level_size <= num_features, "More features sampled than X has.");
+    const auto& categorical_store = context.input(5).data();
+    EXPECT_IS_BROADCAST(categorical_store.shape<1>());
+    auto categorical_accessor = categorical_store.read_accessor<bool, 1>();
 
     // Scalars
-    auto max_depth = context.scalars().at(0).value<int>();
+    auto max_depth   = context.scalars().at(0).value<int>();
+    auto max_leaves  = context.scalars().at(1).value<int>();
+    auto grow_policy = static_cast<GrowPolicy>(context.scalars().at(2).value<int>());
+    auto max_nodes   = context.scalars().at(3).value<int>();
+    auto total_rows  = context.scalars().at(4).value<int64_t>();
+    auto bits        = context.scalars().at(5).value<int32_t>();
+    auto seed        = context.scalars().at(6).value<int64_t>();
+    // The tree method (scalars 7 and 8) is ignored, histograms are always all-reduced with NCCL
+    auto num_words = context.scalars().at(9).value<int32_t>();
+    double eps     = 1e-5;
 
     auto stream             = legate::cuda::StreamPool::get_stream_pool().get_stream();
     auto thrust_alloc       = ThrustAllocator(legate::Memory::GPU_FB_MEM);
     auto thrust_exec_policy = DEFAULT_POLICY(thrust_alloc).on(stream);
 
-    Tree tree(max_depth, num_outputs, stream);
+    Tree tree(max_nodes, num_outputs, num_words, stream);
+    FeatureSets feature_sets(CopyToHost(feature_sets_accessor.ptr(feature_sets_shape.lo),
+                                        static_cast<size_t>(num_levels) * level_size,
+                                        stream),
+                             num_levels,
+                             level_size);
+    // bool is copied as char as std::vector<bool> has no data()
+    auto is_categorical = CopyToHost(
+      reinterpret_cast<const char*>(categorical_accessor.ptr(categorical_store.shape<1>().lo)),
+      num_features,
+      stream);
+    CHECK_CUDA(cudaStreamSynchronize(stream));
+
+    // Gradients are summed in fixed point so the tree does not depend on the number of workers
+    GradientQuantiser<SumT> quantiser(
+      MaxAbsGradient(context, g_accessor, h_accessor, g_shape, thrust_exec_policy, stream),
+      total_rows,
+      bits,
+      seed);
+    auto gpairs = QuantiseGradients(
+      num_rows, num_outputs, g_accessor, h_accessor, g_shape, quantiser, stream);
 
     // Initialize the root node
     {
-      auto base_sums = legate::create_buffer<double, 1>(num_outputs * 2);
+      auto base_sums = legate::create_buffer<SumT, 1>(num_outputs * 2);
 
-      ReduceBaseSums(base_sums, num_rows, num_outputs, g_accessor, h_accessor, g_shape, stream);
+      ReduceBaseSums(base_sums, num_rows, num_outputs, gpairs, stream);
 
-      SumAllReduce(context, reinterpret_cast<double*>(base_sums.ptr(0)), num_outputs * 2, stream);
+      SumAllReduce(context, base_sums.ptr(0), num_outputs * 2, stream);
 
       // base sums contain g-sums first, h sums second
-      tree.InitializeBase(base_sums.ptr(0), thrust_exec_policy);
+      tree.InitializeBase(base_sums.ptr(0), quantiser, thrust_exec_policy);
 
       base_sums.destroy();
       CHECK_CUDA_STREAM(stream);
     }
 
     // Begin building the tree
-    TreeLevelInfo tree_state(num_rows, num_features, num_outputs, stream, tree.max_nodes);
-
-    for (int depth = 0; depth < max_depth; ++depth) {
-      int max_nodes = 1 << depth;
-
-      tree_state.InitializeHistogramForDepth(depth, thrust_exec_policy);
-
-      // update positions from previous step
-      tree_state.UpdatePositions(tree, X_accessor, X_shape);
-
-      // reorder indices to sort by node id
-      tree_state.ReorderPositions(thrust_exec_policy);
-
-      // actual histogram creation
-      tree_state.FillHistogram(
-        tree, X_accessor, X_shape, split_proposal_accessor, g_accessor, h_accessor);
-
-      SumAllReduce(
-        context,
-        reinterpret_cast<double*>(tree_state.histogram_buffer.ptr(legate::Point<3>::ZEROES())),
-        max_nodes * num_features * num_outputs * sizeof(GPair),
-        stream);
-
-      // Select the best split
-      double eps = 1e-5;
-      tree_state.PerformBestSplit(tree, split_proposal_accessor, eps);
+    TreeBuilder builder(num_rows, level_size, num_bins, num_outputs, stream, tree.max_nodes);
+    builder.InitializePositions(thrust_exec_policy);
+    ExpandQueue queue(grow_policy, max_leaves);
+    // Histograms of the leaves that may still be expanded
+    std::map<int32_t, NodeHistogram<SumT>> histograms;
+
+    auto evaluate_leaves = [&](const std::vector<int32_t>& build,
+                               const std::vector<int32_t>& subtract,
+                               const std::vector<NodeHistogram<SumT>>& parents,
+                               int depth) {
+      std::shared_ptr<GradientHistogram<SumT>> histogram;
+      auto candidates = builder.EvaluateLeaves(context,
+                                               tree,
+                                               build,
+                                               subtract,
+                                               parents,
+                                               depth,
+                                               X_accessor,
+                                               X_shape,
+                                               gpairs,
+                                               quantiser,
+                                               feature_sets,
+                                               feature_sets_accessor,
+                                               is_categorical,
+                                               eps,
+                                               histogram);
+      for (int slot = 0; slot < static_cast<int>(candidates.size()); slot++) {
+        if (candidates[slot].gain <= eps) continue;
+        histograms[candidates[slot].node_id] = NodeHistogram<SumT>{histogram, slot};
+        queue.Push(std::move(candidates[slot]));
+      }
+    };
+
+    if (max_depth > 0) { evaluate_leaves({0}, {}, {}, 0); }
+    while (true) {
+      std::vector<SplitCandidate> finished;
+      auto expand = queue.Pop(finished);
+      for (const auto& candidate : finished) { histograms.erase(candidate.node_id); }
+      if (expand.empty()) break;
+
+      builder.ApplySplits(tree, expand, split_proposal_accessor);
+
+      // update positions and reorder indices to sort by node id
+      builder.UpdatePositions(tree, X_accessor, X_shape, grow_policy == GrowPolicy::kDepthwise);
+      builder.ReorderPositions(thrust_exec_policy);
+
+      // Children at the maximum depth or beyond the leaf budget are never expanded
+      // Nodes expanded together are at the same depth
+      int child_depth = expand.front().depth + 1;
+      if (child_depth < max_depth && queue.CanExpand()) {
+        // Both children are built if their features differ from those of the parent
+        bool can_subtract = feature_sets.SameFeatures(child_depth - 1, child_depth);
+        std::vector<int32_t> build;
+        std::vector<int32_t> subtract;
+        std::vector<NodeHistogram<SumT>> parents;
+        for (const auto& candidate : expand) {
+          int left  = tree.LeftChild(candidate.node_id);
+          int right = left + 1;
+          if (!can_subtract) {
+            build.push_back(left);
+            build.push_back(right);
+            continue;
+          }
+          build.push_back(candidate.BuildLeft() ? left : right);
+          subtract.push_back(candidate.BuildLeft() ? right : left);
+          parents.push_back(histograms.at(candidate.node_id));
+        }
+        evaluate_leaves(build, subtract, parents, child_depth);
+      }
+      for (const auto& candidate : expand) { histograms.erase(candidate.node_id); }
     }
 
     if (context.get_task_index()[0] == 0) { tree.WriteTreeOutput(context); }
+    EXPECT_AXIS_ALIGNED(0, X_shape, context.output(6).data().shape<2>());
+    builder.WriteRowLeafValues(tree, context.output(6).data(), X_shape);
 
     CHECK_CUDA(cudaStreamSynchronize(stream));
     CHECK_CUDA_STREAM(stream);
+    gpairs.destroy();
   }
 };
 
@@ -692,7 +1202,7 @@ struct build_tree_fn {
 /*static*/ void BuildTreeTask::gpu_variant(legate::TaskContext context)
 {
   const auto& X = context.input(0).data();
-  type_dispatch_float(X.code(), build_tree_fn(), context);
+  type_dispatch_bin(X.code(), build_tree_fn(), context);
 }
 
 }  // namespace legateboost
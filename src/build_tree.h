@@ -16,6 +16,15 @@
 #pragma once
 #include "legate_library.h"
 #include "legateboost.h"
+#include "utils.h"
+#include <thrust/detail/config.h>
+#include <algorithm>
+#include <cmath>
+#include <cstdint>
+#include <iterator>
+#include <limits>
+#include <type_traits>
+#include <vector>
 
 namespace legateboost {
 
@@ -23,17 +32,388 @@ struct GPair {
   double grad = 0.0;
   double hess = 0.0;
 
-  GPair& operator+=(const GPair& b)
+  __host__ __device__ GPair& operator+=(const GPair& b)
   {
     this->grad += b.grad;
     this->hess += b.hess;
     return *this;
   }
+  __host__ __device__ GPair operator-(const GPair& b) const
+  {
+    return GPair{this->grad - b.grad, this->hess - b.hess};
+  }
+};
+
+// Gradient pairs are summed as fixed point integers
+// Integer addition is associative, so the sums do not depend on the order in which rows are
+// added or on the number of workers and threads
+template <typename T>
+struct IntegerGPair {
+  T grad = 0;
+  T hess = 0;
+
+  __host__ __device__ IntegerGPair& operator+=(const IntegerGPair& b)
+  {
+    this->grad += b.grad;
+    this->hess += b.hess;
+    return *this;
+  }
+  __host__ __device__ IntegerGPair operator-(const IntegerGPair& b) const
+  {
+    return IntegerGPair{this->grad - b.grad, this->hess - b.hess};
+  }
+};
+
+// Uniform random number in [0, 1) from a hash of its arguments (splitmix64)
+__host__ __device__ inline double HashUniform(uint64_t seed, int64_t row, int32_t output, int which)
+{
+  uint64_t x = seed ^ (static_cast<uint64_t>(row) * 0x9E3779B97F4A7C15ULL) ^
+               (static_cast<uint64_t>(output) << 32) ^ static_cast<uint64_t>(which);
+  x += 0x9E3779B97F4A7C15ULL;
+  x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9ULL;
+  x = (x ^ (x >> 27)) * 0x94D049BB133111EBULL;
+  x = x ^ (x >> 31);
+  return (x >> 11) * (1.0 / (1ULL << 53));
+}
+
+// Converts gradient pairs to and from fixed point integers of type T
+// 64 bit gradients are rounded to nearest with power of two scales chosen so that the sum over
+// every row fits in 62 bits, leaving room for the rounding of each row and the differences of sums
+// 32 bit gradients are quantised to bits bits, which the caller chooses so that the sum over
+// every row fits in 31 bits. They are rounded stochastically so that the sums are unbiased. The
+// rounding depends only on the row, output and seed, so not on the number of workers.
+template <typename T>
+class GradientQuantiser {
+ public:
+  // max_abs holds the largest absolute gradient and hessian over every worker and output
+  GradientQuantiser(GPair max_abs, int64_t num_rows, int32_t bits = 64, uint64_t seed = 0)
+    : seed_(seed)
+  {
+    if constexpr (std::is_same_v<T, int64_t>) {
+      g_scale_ = ExactScale(max_abs.grad, num_rows);
+      h_scale_ = ExactScale(max_abs.hess, num_rows);
+    } else {
+      EXPECT(bits >= 2 && bits <= 16, "Expected between 2 and 16 bits per quantised gradient.");
+      // The precision does not depend on the number of rows, so too many rows are rejected
+      int64_t max_value = (int64_t{1} << (bits - 1)) - 1;
+      EXPECT(num_rows <= std::numeric_limits<T>::max() / max_value,
+             "Too many rows to sum quantised gradients of this many bits in 32 bits.");
+      g_scale_ = LowPrecisionScale(max_abs.grad, max_value);
+      h_scale_ = LowPrecisionScale(max_abs.hess, max_value);
+    }
+  }
+  __host__ __device__ IntegerGPair<T> Quantise(double grad,
+                                               double hess,
+                                               int64_t row,
+                                               int32_t output) const
+  {
+    if constexpr (std::is_same_v<T, int64_t>) {
+      return IntegerGPair<T>{llrint(grad * g_scale_), llrint(hess * h_scale_)};
+    } else {
+      return IntegerGPair<T>{
+        static_cast<T>(floor(grad * g_scale_ + HashUniform(seed_, row, output, 0))),
+        static_cast<T>(floor(hess * h_scale_ + HashUniform(seed_, row, output, 1)))};
+    }
+  }
+  __host__ __device__ GPair Dequantise(const IntegerGPair<T>& x) const
+  {
+    return GPair{x.grad / g_scale_, x.hess / h_scale_};
+  }
+
+ private:
+  static double ExactScale(double max_abs, int64_t num_rows)
+  {
+    double bound = max_abs * std::max<int64_t>(num_rows, 1);
+    if (!(bound > 0.0) || !std::isfinite(bound)) return 1.0;
+    int exponent;
+    std::frexp(bound, &exponent);  // bound < 2^exponent
+    return std::ldexp(1.0, 62 - exponent);
+  }
+  // Maps the largest absolute value to max_value
+  static double LowPrecisionScale(double max_abs, int64_t max_value)
+  {
+    if (!(max_abs > 0.0) || !std::isfinite(max_abs)) return 1.0;
+    return max_value / max_abs;
+  }
+
+  double g_scale_;
+  double h_scale_;
+  uint64_t seed_;
+};
+
+// Gradient histograms are stored flat with dimensions
+// 0. Node (slot within the nodes being built at this level)
+// 1. Feature
+// 2. Bin, the last bin holds the rows missing the feature
+// 3. Output
+struct HistogramIndexer {
+  int32_t num_features;
+  int32_t num_bins;
+  int32_t num_outputs;
+
+  __host__ __device__ int64_t NodeSize() const
+  {
+    return static_cast<int64_t>(num_features) * num_bins * num_outputs;
+  }
+  __host__ __device__ int64_t operator()(int32_t slot,
+                                         int32_t feature,
+                                         int32_t bin,
+                                         int32_t output) const
+  {
+    return ((static_cast<int64_t>(slot) * num_features + feature) * num_bins + bin) * num_outputs +
+           output;
+  }
+};
+
+// Reads the hessian of a row and output
+// The hessian has one column per output, or a single column shared by every output when
+// the objective has a constant hessian and only the sample weights are passed
+class HessianAccessor {
+ public:
+  HessianAccessor(const legate::PhysicalStore& h, int64_t num_outputs)
+    : accessor_(h.read_accessor<double, 2>())
+  {
+    auto shape          = h.shape<2>();
+    int64_t num_columns = shape.hi[1] - shape.lo[1] + 1;
+    EXPECT(shape.empty() || num_columns == 1 || num_columns == num_outputs,
+           "Expected one hessian column or one per output.");
+    shared_ = num_columns == 1;
+  }
+  __host__ __device__ double operator[](const legate::Point<2>& p) const
+  {
+    return accessor_[{p[0], shared_ ? 0 : p[1]}];
+  }
+
+ private:
+  legate::AccessorRO<double, 2> accessor_;
+  bool shared_;
+};
+
+// Largest absolute gradient and hessian of the local rows
+inline GPair MaxAbsGradient(const legate::AccessorRO<double, 2>& g,
+                            const HessianAccessor& h,
+                            const legate::Rect<2>& shape)
+{
+  GPair max_abs;
+  for (auto i = shape.lo[0]; i <= shape.hi[0]; ++i) {
+    for (auto k = shape.lo[1]; k <= shape.hi[1]; ++k) {
+      max_abs.grad = std::max(max_abs.grad, std::abs(g[{i, k}]));
+      max_abs.hess = std::max(max_abs.hess, std::abs(h[{i, k}]));
+    }
+  }
+  return max_abs;
+}
+
+enum class GrowPolicy : int32_t { kDepthwise = 0, kLossguide = 1 };
+
+// The features evaluated at each depth, one row of column indices per depth
+// Depths beyond the last row use the last row
+// Histograms only hold the features of their depth, indexed by position in the row
+class FeatureSets {
+ public:
+  FeatureSets(std::vector<int32_t> features, int32_t num_levels, int32_t level_size)
+    : features(std::move(features)), num_levels(num_levels), level_size(level_size)
+  {
+  }
+
+  int32_t Level(int depth) const { return std::min(depth, num_levels - 1); }
+  int32_t LevelSize() const { return level_size; }
+  const int32_t* Features(int depth) const { return features.data() + Level(depth) * level_size; }
+  // A histogram can be subtracted from its parent only if both hold the same features
+  bool SameFeatures(int depth_a, int depth_b) const
+  {
+    return std::equal(Features(depth_a),
+                      Features(depth_a) + level_size,
+                      Features(depth_b),
+                      Features(depth_b) + level_size);
+  }
+
+ private:
+  std::vector<int32_t> features;
+  int32_t num_levels;
+  int32_t level_size;
+};
+
+// The best split of a leaf, found from its histogram
+struct SplitCandidate {
+  int32_t node_id;
+  int32_t depth;
+  double gain;
+  int32_t feature;
+  int32_t bin;
+  // Rows missing the feature go left
+  bool default_left = false;
+  // Bitset of the categories going left, empty for splits of numerical features
+  std::vector<uint32_t> categories;
+  // Per output gradient sums of the rows going left and right
+  std::vector<GPair> left_sum;
+  std::vector<GPair> right_sum;
+
+  // Only the histogram of the child with the smaller hessian is built from its rows
+  bool BuildLeft() const
+  {
+    double left_hess  = 0.0;
+    double right_hess = 0.0;
+    for (int output = 0; output < left_sum.size(); output++) {
+      left_hess += left_sum[output].hess;
+      right_hess += right_sum[output].hess;
+    }
+    return left_hess <= right_hess;
+  }
+};
+
+// Whether bit i of a bitset stored in 32 bit words is set
+__host__ __device__ inline bool BitsetContains(const uint32_t* words, int32_t i)
+{
+  return (words[i / 32] >> (i % 32)) & 1U;
+}
+
+// The best partition of the categories of a categorical feature into two sets
+template <typename T>
+struct CategoricalSplit {
+  double gain       = 0.0;
+  bool default_left = false;
+  // Bitset of the categories going left
+  std::vector<uint32_t> categories;
+  // Per output sums of the rows going left
+  std::vector<IntegerGPair<T>> left_sum;
+};
+
+// Each category of a categorical feature is a bin of the quantised data
+// The categories present at the node are ordered by their mean leaf weight over the outputs and
+// every prefix of this order is a candidate left set, so only num_categories partitions are
+// evaluated rather than 2^num_categories. For a single output this finds the optimal partition.
+// get(bin, output) returns the cumulative histogram of the feature at the node, whose last bin
+// holds the rows missing the feature, and node_sums the gradient sums of the node.
+template <typename T, typename GetFn>
+CategoricalSplit<T> BestCategoricalSplit(GetFn get,
+                                         int32_t num_bins,
+                                         int32_t num_outputs,
+                                         int32_t num_words,
+                                         const std::vector<GPair>& node_sums,
+                                         const GradientQuantiser<T>& quantiser,
+                                         double eps)
+{
+  int32_t missing_bin = num_bins - 1;
+  auto bin_sum        = [&](int32_t bin, int32_t output) {
+    return bin == 0 ? get(0, output) : get(bin, output) - get(bin - 1, output);
+  };
+  std::vector<int32_t> categories;
+  std::vector<double> weight(missing_bin, 0.0);
+  for (int32_t bin = 0; bin < missing_bin; bin++) {
+    bool present = false;
+    for (int32_t output = 0; output < num_outputs; output++) {
+      auto sum    = bin_sum(bin, output);
+      present     = present || sum.grad != 0 || sum.hess != 0;
+      auto [G, H] = quantiser.Dequantise(sum);
+      weight[bin] -= G / (H + eps);
+    }
+    if (present) categories.push_back(bin);
+  }
+  std::stable_sort(categories.begin(), categories.end(), [&](int32_t a, int32_t b) {
+    return weight[a] < weight[b];
+  });
+  bool has_missing = false;
+  for (int32_t output = 0; output < num_outputs; output++) {
+    auto missing = bin_sum(missing_bin, output);
+    has_missing  = has_missing || missing.grad != 0 || missing.hess != 0;
+  }
+
+  CategoricalSplit<T> best;
+  int32_t best_num_left = 0;
+  std::vector<IntegerGPair<T>> prefix(num_outputs);
+  for (int32_t num_left = 1; num_left <= static_cast<int32_t>(categories.size()); num_left++) {
+    for (int32_t output = 0; output < num_outputs; output++) {
+      prefix[output] += bin_sum(categories[num_left - 1], output);
+    }
+    for (int missing_left = 0; missing_left <= static_cast<int>(has_missing); missing_left++) {
+      double gain = 0;
+      for (int32_t output = 0; output < num_outputs; output++) {
+        auto left = prefix[output];
+        if (missing_left) { left += bin_sum(missing_bin, output); }
+        auto [G_L, H_L] = quantiser.Dequantise(left);
+        auto [G, H]     = node_sums[output];
+        auto G_R        = G - G_L;
+        auto H_R        = H - H_L;
+        if (H_L <= 0.0 || H_R <= 0.0) {
+          gain = 0;
+          break;
+        }
+        gain += 0.5 * ((G_L * G_L) / (H_L + eps) + (G_R * G_R) / (H_R + eps) - (G * G) / (H + eps));
+      }
+      if (gain > best.gain) {
+        best.gain         = gain;
+        best.default_left = missing_left;
+        best_num_left     = num_left;
+      }
+    }
+  }
+  if (best_num_left == 0) return best;
+  best.categories.assign(num_words, 0);
+  best.left_sum.assign(num_outputs, IntegerGPair<T>{});
+  for (int32_t i = 0; i < best_num_left; i++) {
+    best.categories[categories[i] / 32] |= 1U << (categories[i] % 32);
+    for (int32_t output = 0; output < num_outputs; output++) {
+      best.left_sum[output] += bin_sum(categories[i], output);
+    }
+  }
+  if (best.default_left) {
+    for (int32_t output = 0; output < num_outputs; output++) {
+      best.left_sum[output] += bin_sum(missing_bin, output);
+    }
+  }
+  return best;
+}
+
+// Chooses the leaves to expand next
+// Depthwise expands every leaf of the current level, lossguide expands the leaf with the
+// highest gain. If the number of leaves is limited, leaves with higher gain are expanded first.
+// Every worker holds the same candidates so makes the same choices.
+class ExpandQueue {
+ public:
+  ExpandQueue(GrowPolicy policy, int32_t max_leaves) : policy(policy), max_leaves(max_leaves) {}
+
+  void Push(SplitCandidate candidate) { candidates.push_back(std::move(candidate)); }
+
+  // Returns the candidates to expand next
+  // Candidates that will never be expanded are moved to finished
+  std::vector<SplitCandidate> Pop(std::vector<SplitCandidate>& finished)
+  {
+    std::sort(candidates.begin(), candidates.end(), [](const auto& a, const auto& b) {
+      return a.gain > b.gain || (a.gain == b.gain && a.node_id < b.node_id);
+    });
+    int64_t budget =
+      max_leaves > 0 ? std::max<int64_t>(max_leaves - num_leaves, 0) : candidates.size();
+    int64_t num_expand = std::min<int64_t>(policy == GrowPolicy::kDepthwise ? candidates.size() : 1,
+                                           std::min<int64_t>(budget, candidates.size()));
+    std::vector<SplitCandidate> expand(std::make_move_iterator(candidates.begin()),
+                                       std::make_move_iterator(candidates.begin() + num_expand));
+    candidates.erase(candidates.begin(), candidates.begin() + num_expand);
+    // In depthwise growth, leaves not expanded at this level are final
+    if (policy == GrowPolicy::kDepthwise || num_expand == budget) {
+      std::move(candidates.begin(), candidates.end(), std::back_inserter(finished));
+      candidates.clear();
+    }
+    num_leaves += num_expand;
+    return expand;
+  }
+
+  // False once the leaf budget is used up, children then need no histograms
+  bool CanExpand() const { return max_leaves <= 0 || num_leaves < max_leaves; }
+
+ private:
+  GrowPolicy policy;
+  int32_t max_leaves;
+  int64_t num_leaves = 1;
+  std::vector<SplitCandidate> candidates;
 };
 
 class BuildTreeTask : public Task<BuildTreeTask, BUILD_TREE> {
  public:
   static void cpu_variant(legate::TaskContext context);
+#ifdef LEGATEBOOST_USE_OPENMP
+  static void omp_variant(legate::TaskContext context);
+#endif
 #ifdef LEGATEBOOST_USE_CUDA
   static void gpu_variant(legate::TaskContext context);
 #endif
@@ -0,0 +1,36 @@
+/* Copyright 2024 NVIDIA Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ *
+ */
+#include <thrust/execution_policy.h>  // for host
+#include "legate.h"
+#include "gradient.h"
+
+namespace legateboost {
+
+/*static*/ void ObjectiveGradientTask::cpu_variant(legate::TaskContext context)
+{
+  ObjectiveGradient(
+    context, thrust::host, [&](double* x, int count) { SumAllReduce(context, x, count); });
+}
+
+}  // namespace legateboost
+
+namespace  // unnamed
+{
+static void __attribute__((constructor)) register_tasks(void)
+{
+  legateboost::ObjectiveGradientTask::register_variants();
+}
+}  // namespace
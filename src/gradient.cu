@@ -0,0 +1,42 @@
+/* Copyright 2024 NVIDIA Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ *
+ */
+#include "cuda_help.h"
+#include "kernel_helper.cuh"
+#include "gradient.h"
+#include <thrust/system/cuda/execution_policy.h>
+
+namespace legateboost {
+
+/*static*/ void ObjectiveGradientTask::gpu_variant(legate::TaskContext context)
+{
+  auto stream             = legate::cuda::StreamPool::get_stream_pool().get_stream();
+  auto thrust_alloc       = ThrustAllocator(legate::Memory::GPU_FB_MEM);
+  auto thrust_exec_policy = DEFAULT_POLICY(thrust_alloc).on(stream);
+  // NCCL reduces device memory
+  ObjectiveGradient(context, thrust_exec_policy, [&](double* x, int count) {
+    auto buffer = legate::create_buffer<double>(count);
+    CHECK_CUDA(
+      cudaMemcpyAsync(buffer.ptr(0), x, count * sizeof(double), cudaMemcpyHostToDevice, stream));
+    SumAllReduce(context, buffer.ptr(0), count, stream);
+    CHECK_CUDA(
+      cudaMemcpyAsync(x, buffer.ptr(0), count * sizeof(double), cudaMemcpyDeviceToHost, stream));
+    CHECK_CUDA(cudaStreamSynchronize(stream));
+    buffer.destroy();
+  });
+  CHECK_CUDA_STREAM(stream);
+}
+
+}  // namespace legateboost
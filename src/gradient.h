@@ -0,0 +1,260 @@
+/* Copyright 2024 NVIDIA Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ *
+ */
+#pragma once
+#include <algorithm>
+#include <cfloat>
+#include <cmath>
+#include <cstdint>
+#include <thrust/iterator/counting_iterator.h>
+#include <thrust/for_each.h>
+#include <thrust/transform_reduce.h>
+#include "legate_library.h"
+#include "legateboost.h"
+#include "math.h"
+#include "utils.h"
+
+namespace legateboost {
+
+// Must match _native_objectives in objectives.py
+enum class Objective : int32_t {
+  kSquaredError  = 0,
+  kLogLoss       = 1,
+  kExponential   = 2,
+  kGammaDeviance = 3,
+  kGamma         = 4,
+  kQuantile      = 5,
+};
+
+// The hessian of these objectives is one, so the weighted hessian is the sample weight
+// and is written as a single column shared by every output
+__host__ __device__ inline bool ConstantHessian(Objective objective)
+{
+  return objective == Objective::kSquaredError || objective == Objective::kQuantile;
+}
+
+// Sums over every element of the weighted gradient and hessian
+// loss is only used by the quantile objective to scale its gradient
+struct GradientSums {
+  double abs_g = 0.0;
+  double abs_h = 0.0;
+  double loss  = 0.0;
+
+  __host__ __device__ GradientSums operator+(const GradientSums& b) const
+  {
+    return GradientSums{abs_g + b.abs_g, abs_h + b.abs_h, loss + b.loss};
+  }
+};
+
+// Computes the unweighted gradient and hessian of every output of row i from the
+// untransformed prediction, matching the gradient of the objective in Python
+// The hessian is not written for objectives with a constant hessian
+// Returns the contribution of the row to the loss
+template <typename YAccessor, typename PredAccessor, typename QAccessor, typename OutAccessor>
+__host__ __device__ inline double RowGradient(Objective objective,
+                                              int64_t i,
+                                              int32_t num_outputs,
+                                              const YAccessor& y,
+                                              const PredAccessor& pred,
+                                              const QAccessor& quantiles,
+                                              OutAccessor& g,
+                                              OutAccessor& h)
+{
+  double loss = 0.0;
+  switch (objective) {
+    case Objective::kSquaredError: {
+      for (int32_t k = 0; k < num_outputs; k++) { g[{i, k}] = pred[{i, k}] - y[{i, k}]; }
+      break;
+    }
+    case Objective::kLogLoss: {
+      if (num_outputs == 1) {
+        double p  = 1.0 / (1.0 + exp(-pred[{i, 0}]));
+        g[{i, 0}] = p - y[{i, 0}];
+        h[{i, 0}] = p * (1.0 - p);
+        break;
+      }
+      // softmax over the classes
+      auto label = static_cast<int32_t>(y[{i, 0}]);
+      double max = pred[{i, 0}];
+      for (int32_t k = 1; k < num_outputs; k++) { max = fmax(max, pred[{i, k}]); }
+      double sum = 0.0;
+      for (int32_t k = 0; k < num_outputs; k++) { sum += exp(pred[{i, k}] - max); }
+      for (int32_t k = 0; k < num_outputs; k++) {
+        double p  = exp(pred[{i, k}] - max) / sum;
+        g[{i, k}] = p - (k == label ? 1.0 : 0.0);
+        h[{i, k}] = p * (1.0 - p);
+      }
+      break;
+    }
+    case Objective::kExponential: {
+      // Undoing the transform recovers the prediction itself
+      if (num_outputs == 1) {
+        double adjusted_y = 2.0 * y[{i, 0}] - 1.0;
+        double e          = exp(-pred[{i, 0}] * adjusted_y);
+        g[{i, 0}]         = -adjusted_y * e;
+        h[{i, 0}]         = e;
+        break;
+      }
+      // The constant removed by softmax cancels in y_k^T f as y_k sums to zero
+      auto label    = static_cast<int32_t>(y[{i, 0}]);
+      double K      = num_outputs;
+      double margin = 0.0;
+      for (int32_t k = 0; k < num_outputs; k++) {
+        margin += (k == label ? 1.0 : -1.0 / (K - 1.0)) * pred[{i, k}];
+      }
+      double e = exp(-margin / K);
+      for (int32_t k = 0; k < num_outputs; k++) {
+        double y_k = k == label ? 1.0 : -1.0 / (K - 1.0);
+        g[{i, k}]  = -1.0 / K * y_k * e;
+        h[{i, k}]  = 1.0 / (K * K) * y_k * y_k * e;
+      }
+      break;
+    }
+    case Objective::kGammaDeviance: {
+      for (int32_t k = 0; k < num_outputs; k++) {
+        double hess = y[{i, k}] * exp(-pred[{i, k}]);
+        g[{i, k}]   = 1.0 - hess;
+        h[{i, k}]   = hess;
+      }
+      break;
+    }
+    case Objective::kGamma: {
+      // Each target has a log shape and a log scale output
+      for (int32_t k = 0; k < num_outputs / 2; k++) {
+        double shape      = exp(pred[{i, 2 * k}]);
+        double scale      = exp(pred[{i, 2 * k + 1}]);
+        double label      = y[{i, k}];
+        g[{i, 2 * k}]     = shape * (calc_digamma(shape) + log(scale) - log(label));
+        g[{i, 2 * k + 1}] = shape - label / scale;
+        // Fisher information, the trigamma function is zeta(2, x)
+        h[{i, 2 * k}]     = zeta(2.0, shape) * shape * shape;
+        h[{i, 2 * k + 1}] = shape;
+      }
+      break;
+    }
+    case Objective::kQuantile: {
+      // The gradient is scaled by the mean loss once it is known
+      for (int32_t k = 0; k < num_outputs; k++) {
+        double diff      = y[{i, 0}] - pred[{i, k}];
+        double indicator = diff <= 0.0 ? 1.0 : 0.0;
+        loss += (quantiles[k] - indicator) * diff;
+        g[{i, k}] = indicator - quantiles[k];
+      }
+      break;
+    }
+  }
+  return loss;
+}
+
+// The bound used by preround in utils.py, with sum_abs the sum of absolute values of n elements
+__host__ __device__ inline double PreroundBound(double sum_abs, int64_t n)
+{
+  double delta = floor(sum_abs / (1.0 - 2.0 * n * DBL_EPSILON));
+  return exp2(ceil(log2(delta)));
+}
+
+// Computes weighted, clamped and prerounded gradients in two passes over the local rows
+// The first pass computes the gradients and their sums, which are reduced over all workers
+// before the second pass rounds them
+// Without prerounding only the quantile objective needs the reduction and second pass
+template <typename Policy, typename AllReduceFn>
+void ObjectiveGradient(legate::TaskContext context, const Policy& policy, AllReduceFn all_reduce)
+{
+  const auto& y       = context.input(0).data();
+  const auto& pred    = context.input(1).data();
+  const auto& w       = context.input(2).data();
+  auto pred_shape     = pred.shape<2>();
+  auto y_accessor     = y.read_accessor<double, 2>();
+  auto pred_accessor  = pred.read_accessor<double, 2>();
+  auto w_accessor     = w.read_accessor<double, 2>();
+  auto objective      = static_cast<Objective>(context.scalar(0).value<int32_t>());
+  auto learning_rate  = context.scalar(1).value<double>();
+  auto num_elements   = context.scalar(2).value<int64_t>();
+  auto preround       = context.scalar(3).value<bool>();
+  const auto& g_store = context.output(0).data();
+  const auto& h_store = context.output(1).data();
+  EXPECT_AXIS_ALIGNED(0, y.shape<2>(), pred_shape);
+  EXPECT_AXIS_ALIGNED(0, w.shape<2>(), pred_shape);
+  EXPECT_AXIS_ALIGNED(0, g_store.shape<2>(), pred_shape);
+  EXPECT_AXIS_ALIGNED(1, g_store.shape<2>(), pred_shape);
+  EXPECT_AXIS_ALIGNED(0, h_store.shape<2>(), pred_shape);
+  bool constant_hessian = ConstantHessian(objective);
+  if (!constant_hessian) { EXPECT_AXIS_ALIGNED(1, h_store.shape<2>(), pred_shape); }
+  auto g = g_store.write_accessor<double, 2>();
+  auto h = h_store.write_accessor<double, 2>();
+  // The quantiles are only passed for the quantile objective
+  legate::AccessorRO<double, 1> quantiles;
+  if (objective == Objective::kQuantile) {
+    const auto& quantile_store = context.input(3).data();
+    EXPECT_IS_BROADCAST(quantile_store.shape<1>());
+    quantiles = quantile_store.read_accessor<double, 1>();
+  }
+
+  int32_t num_outputs = pred_shape.hi[1] - pred_shape.lo[1] + 1;
+  int64_t num_rows    = std::max<int64_t>(pred_shape.hi[0] - pred_shape.lo[0] + 1, 0);
+  int64_t row_offset  = pred_shape.lo[0];
+  int32_t h_columns   = constant_hessian ? 1 : num_outputs;
+
+  auto rows         = thrust::make_counting_iterator<int64_t>(0);
+  GradientSums sums = thrust::transform_reduce(
+    policy,
+    rows,
+    rows + num_rows,
+    [=] __host__ __device__(int64_t row) mutable {
+      int64_t i = row_offset + row;
+      GradientSums result;
+      result.loss =
+        RowGradient(objective, i, num_outputs, y_accessor, pred_accessor, quantiles, g, h);
+      double weight = w_accessor[{i, 0}];
+      for (int32_t k = 0; k < num_outputs; k++) {
+        g[{i, k}] *= weight * learning_rate;
+        result.abs_g += fabs(g[{i, k}]);
+      }
+      for (int32_t k = 0; k < h_columns; k++) {
+        // ensure hessians are not too small for numerical stability
+        h[{i, k}] = fmax((constant_hessian ? 1.0 : h[{i, k}]) * weight, 1e-8);
+        result.abs_h += h[{i, k}];
+      }
+      return result;
+    },
+    GradientSums{},
+    thrust::plus<GradientSums>());
+
+  if (!preround && objective != Objective::kQuantile) return;
+  all_reduce(reinterpret_cast<double*>(&sums), 3);
+
+  // Polyak step size of the quantile objective, see QuantileObjective.gradient
+  double scale   = objective == Objective::kQuantile ? sums.loss * 2.0 / num_elements : 1.0;
+  double g_bound = preround ? PreroundBound(sums.abs_g * fabs(scale), num_elements) : 0.0;
+  double h_bound =
+    preround ? PreroundBound(sums.abs_h, num_elements / num_outputs * h_columns) : 0.0;
+  thrust::for_each_n(policy, rows, num_rows, [=] __host__ __device__(int64_t row) mutable {
+    int64_t i = row_offset + row;
+    for (int32_t k = 0; k < num_outputs; k++) {
+      g[{i, k}] = (g[{i, k}] * scale + g_bound) - g_bound;
+    }
+    for (int32_t k = 0; k < h_columns; k++) { h[{i, k}] = (h[{i, k}] + h_bound) - h_bound; }
+  });
+}
+
+class ObjectiveGradientTask : public Task<ObjectiveGradientTask, OBJECTIVE_GRADIENT> {
+ public:
+  static void cpu_variant(legate::TaskContext context);
+#ifdef LEGATEBOOST_USE_CUDA
+  static void gpu_variant(legate::TaskContext context);
+#endif
+};
+
+}  // namespace legateboost
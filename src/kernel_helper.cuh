@@ -53,6 +53,31 @@ void SumAllReduce(legate::TaskContext context, T* x, int count, cudaStream_t str
       CHECK_NCCL(ncclAllReduce(x, x, count, ncclFloat, ncclSum, *nccl_comm, stream));
     } else if (std::is_same<T, double>::value) {
       CHECK_NCCL(ncclAllReduce(x, x, count, ncclDouble, ncclSum, *nccl_comm, stream));
+    } else if (std::is_same<T, int32_t>::value) {
+      CHECK_NCCL(ncclAllReduce(x, x, count, ncclInt32, ncclSum, *nccl_comm, stream));
+    } else if (std::is_same<T, int64_t>::value) {
+      CHECK_NCCL(ncclAllReduce(x, x, count, ncclInt64, ncclSum, *nccl_comm, stream));
+    } else {
+      EXPECT(false, "Unsupported type for all reduce.");
+    }
+    CHECK_CUDA_STREAM(stream);
+  }
+}
+
+template <typename T>
+void MaxAllReduce(legate::TaskContext context, T* x, int count, cudaStream_t stream)
+{
+  auto domain      = context.get_launch_domain();
+  size_t num_ranks = domain.get_volume();
+  EXPECT(num_ranks == 1 || context.num_communicators() > 0,
+         "Expected a GPU communicator for multi-rank task.");
+  if (context.num_communicators() == 0) return;
+  auto comm             = context.communicator(0);
+  ncclComm_t* nccl_comm = comm.get<ncclComm_t*>();
+
+  if (num_ranks > 1) {
+    if (std::is_same<T, double>::value) {
+      CHECK_NCCL(ncclAllReduce(x, x, count, ncclDouble, ncclMax, *nccl_comm, stream));
     } else {
       EXPECT(false, "Unsupported type for all reduce.");
     }
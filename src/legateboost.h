@@ -13,7 +13,12 @@ enum LegateBoostOpCode {
   DIGAMMA = 7,
   ZETA    = 8,
   /**/
-  GATHER = 9,
+  GATHER             = 9,
+  QUANTILE_SKETCH    = 10,
+  QUANTISE           = 11,
+  PREDICT_FOREST     = 12,
+  OBJECTIVE_GRADIENT = 13,
+  QUANTILE_MERGE     = 14,
 };
 
 #endif  // __LEGATEBOOST_C_H__
@@ -13,6 +13,7 @@
  * limitations under the License.
  *
  */
+#include <algorithm>
 #include "predict.h"
 #include "utils.h"
 
@@ -21,16 +22,22 @@ namespace legateboost {
 namespace {
 struct predict_fn {
   template <legate::Type::Code CODE>
-  void operator()(legate::TaskContext context)
+  void operator()(legate::TaskContext context, int num_threads)
   {
     using T         = legate::type_of<CODE>;
     auto X          = context.input(0).data();
     auto X_shape    = X.shape<2>();
     auto X_accessor = X.read_accessor<T, 2>();
 
-    auto leaf_value  = context.input(1).data().read_accessor<double, 2>();
-    auto feature     = context.input(2).data().read_accessor<int32_t, 1>();
-    auto split_value = context.input(3).data().read_accessor<double, 1>();
+    auto leaf_value   = context.input(1).data().read_accessor<double, 2>();
+    auto feature      = context.input(2).data().read_accessor<int32_t, 1>();
+    auto split_value  = context.input(3).data().read_accessor<double, 1>();
+    auto children     = context.input(4).data().read_accessor<int32_t, 2>();
+    auto default_left = context.input(5).data().read_accessor<bool, 1>();
+    auto categorical  = context.input(6).data().read_accessor<bool, 1>();
+    auto categories   = context.input(7).data().read_accessor<uint32_t, 2>();
+    auto num_words    = context.input(7).data().shape<2>().hi[1] -
+                        context.input(7).data().shape<2>().lo[1] + 1;
 
     auto pred          = context.output(0).data();
     auto pred_shape    = pred.shape<2>();
@@ -44,26 +51,124 @@ struct predict_fn {
     EXPECT_IS_BROADCAST(context.input(1).data().shape<2>());
     EXPECT_IS_BROADCAST(context.input(2).data().shape<1>());
     EXPECT_IS_BROADCAST(context.input(3).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(4).data().shape<2>());
+    EXPECT_IS_BROADCAST(context.input(5).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(6).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(7).data().shape<2>());
 
+#pragma omp parallel for num_threads(num_threads) schedule(static)
     for (int64_t i = X_shape.lo[0]; i <= X_shape.hi[0]; i++) {
       int pos = 0;
-      // Use a max depth of 100 to avoid infinite loops
-      for (int depth = 0; depth < 100; depth++) {
-        if (feature[pos] == -1) break;
-        auto x = X_accessor[{i, feature[pos]}];
-        pos    = x <= split_value[pos] ? pos * 2 + 1 : pos * 2 + 2;
+      // Children are numbered after their parent, so every row reaches a leaf
+      while (feature[pos] != -1) {
+        auto x    = X_accessor[{i, feature[pos]}];
+        bool left = GoLeft(
+          x, split_value[pos], default_left[pos], categorical[pos], categories, pos, num_words);
+        pos = children[{pos, left ? 0 : 1}];
       }
       for (int64_t j = 0; j < n_outputs; j++) { pred_accessor[{i, j}] = leaf_value[{pos, j}]; }
     }
   }
 };
+
+// Sums the predictions of every tree of a packed forest
+// Node arrays of all trees are concatenated, child indices are relative to the root of their tree
+struct predict_forest_fn {
+  template <legate::Type::Code CODE>
+  void operator()(legate::TaskContext context, int num_threads)
+  {
+    using T         = legate::type_of<CODE>;
+    auto X          = context.input(0).data();
+    auto X_shape    = X.shape<2>();
+    auto X_accessor = X.read_accessor<T, 2>();
+
+    auto leaf_value   = context.input(1).data().read_accessor<double, 2>();
+    auto feature      = context.input(2).data().read_accessor<int32_t, 1>();
+    auto split_value  = context.input(3).data().read_accessor<double, 1>();
+    auto children     = context.input(4).data().read_accessor<int32_t, 2>();
+    auto tree_offset  = context.input(5).data().read_accessor<int64_t, 1>();
+    auto num_trees    = context.input(5).data().shape<1>().volume() - 1;
+    auto default_left = context.input(6).data().read_accessor<bool, 1>();
+    auto categorical  = context.input(7).data().read_accessor<bool, 1>();
+    auto categories   = context.input(8).data().read_accessor<uint32_t, 2>();
+    auto num_words    = context.input(8).data().shape<2>().hi[1] -
+                        context.input(8).data().shape<2>().lo[1] + 1;
+
+    auto pred          = context.output(0).data();
+    auto pred_shape    = pred.shape<2>();
+    auto pred_accessor = pred.write_accessor<double, 2>();
+    auto n_outputs     = pred.shape<2>().hi[1] - pred.shape<2>().lo[1] + 1;
+
+    // We should have one output prediction per row of X
+    EXPECT_AXIS_ALIGNED(0, X_shape, pred_shape);
+
+    // We should have the whole forest
+    EXPECT_IS_BROADCAST(context.input(1).data().shape<2>());
+    EXPECT_IS_BROADCAST(context.input(2).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(3).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(4).data().shape<2>());
+    EXPECT_IS_BROADCAST(context.input(5).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(6).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(7).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(8).data().shape<2>());
+
+    // Rows are processed in blocks so the nodes of a tree stay in cache for the whole block
+    const int64_t kBlockSize = 64;
+    int64_t num_rows         = std::max<int64_t>(X_shape.hi[0] - X_shape.lo[0] + 1, 0);
+    int64_t num_blocks       = (num_rows + kBlockSize - 1) / kBlockSize;
+#pragma omp parallel for num_threads(num_threads) schedule(static)
+    for (int64_t block = 0; block < num_blocks; block++) {
+      int64_t begin = X_shape.lo[0] + block * kBlockSize;
+      int64_t end   = std::min<int64_t>(begin + kBlockSize, X_shape.hi[0] + 1);
+      for (int64_t i = begin; i < end; i++) {
+        for (int64_t j = 0; j < n_outputs; j++) { pred_accessor[{i, j}] = 0.0; }
+      }
+      for (int64_t t = 0; t < num_trees; t++) {
+        int64_t root = tree_offset[t];
+        for (int64_t i = begin; i < end; i++) {
+          int64_t pos = root;
+          // Children are numbered after their parent, so every row reaches a leaf
+          while (feature[pos] != -1) {
+            auto x    = X_accessor[{i, feature[pos]}];
+            bool left = GoLeft(
+              x, split_value[pos], default_left[pos], categorical[pos], categories, pos, num_words);
+            pos       = root + children[{pos, left ? 0 : 1}];
+          }
+          for (int64_t j = 0; j < n_outputs; j++) { pred_accessor[{i, j}] += leaf_value[{pos, j}]; }
+        }
+      }
+    }
+  }
+};
 }  // namespace
 
 /*static*/ void PredictTask::cpu_variant(legate::TaskContext context)
 {
   const auto& X = context.input(0).data();
-  type_dispatch_float(X.code(), predict_fn(), context);
+  type_dispatch_float(X.code(), predict_fn(), context, 1);
+}
+
+#ifdef LEGATEBOOST_USE_OPENMP
+/*static*/ void PredictTask::omp_variant(legate::TaskContext context)
+{
+  const auto& X = context.input(0).data();
+  type_dispatch_float(X.code(), predict_fn(), context, OmpMaxThreads());
+}
+#endif
+
+/*static*/ void PredictForestTask::cpu_variant(legate::TaskContext context)
+{
+  const auto& X = context.input(0).data();
+  type_dispatch_float(X.code(), predict_forest_fn(), context, 1);
+}
+
+#ifdef LEGATEBOOST_USE_OPENMP
+/*static*/ void PredictForestTask::omp_variant(legate::TaskContext context)
+{
+  const auto& X = context.input(0).data();
+  type_dispatch_float(X.code(), predict_forest_fn(), context, OmpMaxThreads());
 }
+#endif
 
 }  // namespace legateboost
 
@@ -72,5 +177,6 @@ namespace  // unnamed
 static void __attribute__((constructor)) register_tasks(void)
 {
   legateboost::PredictTask::register_variants();
+  legateboost::PredictForestTask::register_variants();
 }
 }  // namespace
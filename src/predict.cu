@@ -35,9 +35,15 @@ struct predict_fn {
 
     // The tree structure stores all have 1 extra 'dummy' dimension
     // due to broadcasting
-    auto leaf_value  = context.input(1).data().read_accessor<double, 2>();
-    auto feature     = context.input(2).data().read_accessor<int32_t, 1>();
-    auto split_value = context.input(3).data().read_accessor<double, 1>();
+    auto leaf_value   = context.input(1).data().read_accessor<double, 2>();
+    auto feature      = context.input(2).data().read_accessor<int32_t, 1>();
+    auto split_value  = context.input(3).data().read_accessor<double, 1>();
+    auto children     = context.input(4).data().read_accessor<int32_t, 2>();
+    auto default_left = context.input(5).data().read_accessor<bool, 1>();
+    auto categorical  = context.input(6).data().read_accessor<bool, 1>();
+    auto categories   = context.input(7).data().read_accessor<uint32_t, 2>();
+    auto num_words    = context.input(7).data().shape<2>().hi[1] -
+                        context.input(7).data().shape<2>().lo[1] + 1;
 
     auto pred          = context.output(0).data();
     auto pred_shape    = pred.shape<2>();
@@ -51,18 +57,23 @@ struct predict_fn {
     EXPECT_IS_BROADCAST(context.input(1).data().shape<2>());
     EXPECT_IS_BROADCAST(context.input(2).data().shape<1>());
     EXPECT_IS_BROADCAST(context.input(3).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(4).data().shape<2>());
+    EXPECT_IS_BROADCAST(context.input(5).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(6).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(7).data().shape<2>());
 
     // rowwise kernel
     auto prediction_lambda = [=] __device__(size_t idx) {
       int64_t pos              = 0;
       legate::Point<2> x_point = {X_shape.lo[0] + (int64_t)idx, 0};
 
-      // Use a max depth of 100 to avoid infinite loops
-      for (int depth = 0; depth < 100; depth++) {
-        if (feature[pos] == -1) break;
+      // Children are numbered after their parent, so every row reaches a leaf
+      while (feature[pos] != -1) {
         x_point[1]   = feature[pos];
         double X_val = X_accessor[x_point];
-        pos          = X_val <= split_value[pos] ? pos * 2 + 1 : pos * 2 + 2;
+        bool left    = GoLeft(
+          X_val, split_value[pos], default_left[pos], categorical[pos], categories, pos, num_words);
+        pos = children[{pos, left ? 0 : 1}];
       }
       for (int64_t j = 0; j < n_outputs; j++) {
         pred_accessor[{X_shape.lo[0] + (int64_t)idx, j}] = leaf_value[{pos, j}];
@@ -75,6 +86,77 @@ struct predict_fn {
     CHECK_CUDA_STREAM(stream);
   }
 };
+
+struct predict_forest_fn {
+  template <legate::Type::Code CODE>
+  void operator()(legate::TaskContext context)
+  {
+    using T         = legate::type_of<CODE>;
+    const auto& X   = context.input(0).data();
+    auto X_shape    = X.shape<2>();
+    auto X_accessor = X.read_accessor<T, 2>();
+
+    auto leaf_value   = context.input(1).data().read_accessor<double, 2>();
+    auto feature      = context.input(2).data().read_accessor<int32_t, 1>();
+    auto split_value  = context.input(3).data().read_accessor<double, 1>();
+    auto children     = context.input(4).data().read_accessor<int32_t, 2>();
+    auto tree_offset  = context.input(5).data().read_accessor<int64_t, 1>();
+    auto num_trees    = context.input(5).data().shape<1>().volume() - 1;
+    auto default_left = context.input(6).data().read_accessor<bool, 1>();
+    auto categorical  = context.input(7).data().read_accessor<bool, 1>();
+    auto categories   = context.input(8).data().read_accessor<uint32_t, 2>();
+    auto num_words    = context.input(8).data().shape<2>().hi[1] -
+                        context.input(8).data().shape<2>().lo[1] + 1;
+
+    auto pred          = context.output(0).data();
+    auto pred_shape    = pred.shape<2>();
+    auto pred_accessor = pred.write_accessor<double, 2>();
+    auto n_outputs     = pred.shape<2>().hi[1] - pred.shape<2>().lo[1] + 1;
+
+    // We should have one output prediction per row of X
+    EXPECT_AXIS_ALIGNED(0, X_shape, pred_shape);
+
+    // We should have the whole forest
+    EXPECT_IS_BROADCAST(context.input(1).data().shape<2>());
+    EXPECT_IS_BROADCAST(context.input(2).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(3).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(4).data().shape<2>());
+    EXPECT_IS_BROADCAST(context.input(5).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(6).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(7).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(8).data().shape<2>());
+
+    // rowwise kernel, each thread accumulates every tree for its row
+    auto prediction_lambda = [=] __device__(size_t idx) {
+      int64_t row              = X_shape.lo[0] + (int64_t)idx;
+      legate::Point<2> x_point = {row, 0};
+      for (int64_t j = 0; j < n_outputs; j++) { pred_accessor[{row, j}] = 0.0; }
+      for (int64_t t = 0; t < num_trees; t++) {
+        int64_t root = tree_offset[t];
+        int64_t pos  = root;
+        // Children are numbered after their parent, so every row reaches a leaf
+        while (feature[pos] != -1) {
+          x_point[1]   = feature[pos];
+          double X_val = X_accessor[x_point];
+          bool left    = GoLeft(X_val,
+                             split_value[pos],
+                             default_left[pos],
+                             categorical[pos],
+                             categories,
+                             pos,
+                             num_words);
+          pos          = root + children[{pos, left ? 0 : 1}];
+        }
+        for (int64_t j = 0; j < n_outputs; j++) { pred_accessor[{row, j}] += leaf_value[{pos, j}]; }
+      }
+    };
+
+    auto stream = legate::cuda::StreamPool::get_stream_pool().get_stream();
+    LaunchN(X_shape.hi[0] - X_shape.lo[0] + 1, stream, prediction_lambda);
+
+    CHECK_CUDA_STREAM(stream);
+  }
+};
 }  // namespace
 
 /*static*/ void PredictTask::gpu_variant(legate::TaskContext context)
@@ -83,4 +165,10 @@ struct predict_fn {
   type_dispatch_float(X.code(), predict_fn(), context);
 }
 
+/*static*/ void PredictForestTask::gpu_variant(legate::TaskContext context)
+{
+  auto X = context.input(0).data();
+  type_dispatch_float(X.code(), predict_forest_fn(), context);
+}
+
 }  // namespace legateboost
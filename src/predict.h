@@ -17,12 +17,59 @@
 #pragma once
 #include "legate_library.h"
 #include "legateboost.h"
+#include <thrust/detail/config.h>
 
 namespace legateboost {
 
+// Whether category x is in the bitset of categories going left at a node
+// Categories are non-negative integers, other values are in no set
+template <typename AccessorT>
+__host__ __device__ inline bool InCategories(double x,
+                                             const AccessorT& categories,
+                                             int32_t node,
+                                             int32_t num_words)
+{
+  if (!(x >= 0.0) || x >= 32.0 * num_words) return false;
+  auto category = static_cast<int32_t>(x);
+  if (category != x) return false;
+  return (categories[{node, category / 32}] >> (category % 32)) & 1U;
+}
+
+// Whether a row with feature value x goes to the left child of a node
+// Missing values (NaN) follow the default direction learned for the split
+// Categorical splits send the categories in the bitset of the node left
+template <typename AccessorT>
+__host__ __device__ inline bool GoLeft(double x,
+                                       double split_value,
+                                       bool default_left,
+                                       bool categorical,
+                                       const AccessorT& categories,
+                                       int32_t node,
+                                       int32_t num_words)
+{
+  // Only NaN compares unequal to itself
+  if (x != x) return default_left;
+  if (categorical) return InCategories(x, categories, node, num_words);
+  return x <= split_value;
+}
+
 class PredictTask : public Task<PredictTask, PREDICT> {
  public:
   static void cpu_variant(legate::TaskContext context);
+#ifdef LEGATEBOOST_USE_OPENMP
+  static void omp_variant(legate::TaskContext context);
+#endif
+#ifdef LEGATEBOOST_USE_CUDA
+  static void gpu_variant(legate::TaskContext context);
+#endif
+};
+
+class PredictForestTask : public Task<PredictForestTask, PREDICT_FOREST> {
+ public:
+  static void cpu_variant(legate::TaskContext context);
+#ifdef LEGATEBOOST_USE_OPENMP
+  static void omp_variant(legate::TaskContext context);
+#endif
 #ifdef LEGATEBOOST_USE_CUDA
   static void gpu_variant(legate::TaskContext context);
 #endif
@@ -0,0 +1,187 @@
+/* Copyright 2023 NVIDIA Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ *
+ */
+#include <algorithm>
+#include <cmath>
+#include "legate_library.h"
+#include "legateboost.h"
+#include "utils.h"
+
+namespace legateboost {
+
+// Summarises each tile of rows with a fixed number of weighted points per feature
+// The rank error of the merged sketch is at most the inverse of the summary size
+// Features are summarised independently, so threads take whole features
+struct quantile_sketch_fn {
+  template <legate::Type::Code CODE>
+  void operator()(legate::TaskContext context, int num_threads)
+  {
+    using T           = legate::type_of<CODE>;
+    const auto& X     = context.input(0).data();
+    auto X_shape      = X.shape<2>();
+    auto X_accessor   = X.read_accessor<T, 2>();
+    auto num_features = X_shape.hi[1] - X_shape.lo[1] + 1;
+    const auto& w     = context.input(1).data();
+    EXPECT_AXIS_ALIGNED(0, X.shape<2>(), w.shape<2>());
+    auto w_accessor = w.read_accessor<double, 2>();
+
+    // One summary of summary_size points per tile
+    auto summary_value   = context.output(0).data();
+    auto summary_weight  = context.output(1).data();
+    auto summary_shape   = summary_value.shape<2>();
+    int64_t summary_size = summary_shape.hi[0] - summary_shape.lo[0] + 1;
+    auto value_accessor  = summary_value.write_accessor<double, 2>();
+    auto weight_accessor = summary_weight.write_accessor<double, 2>();
+    EXPECT(summary_size > 0, "Expected a summary of at least one point.");
+
+    // Each point represents the weight of the rows since the previous point
+#pragma omp parallel num_threads(num_threads)
+    {
+      std::vector<std::pair<T, double>> column;
+#pragma omp for schedule(dynamic)
+      for (int64_t j = 0; j < num_features; j++) {
+        for (int64_t k = 0; k < summary_size; k++) {
+          value_accessor[{summary_shape.lo[0] + k, j}]  = 0.0;
+          weight_accessor[{summary_shape.lo[0] + k, j}] = 0.0;
+        }
+        column.clear();
+        double total_weight = 0.0;
+        for (int64_t i = X_shape.lo[0]; i <= X_shape.hi[0]; i++) {
+          double weight = w_accessor[{i, 0}];
+          T x           = X_accessor[{i, j}];
+          // Missing values are binned separately
+          if (weight <= 0.0 || std::isnan(x)) continue;
+          column.push_back({x, weight});
+        }
+        // Sorting the pairs makes the summary a function of the rows of the tile
+        // only, not of their order
+        std::sort(column.begin(), column.end());
+        for (const auto& entry : column) { total_weight += entry.second; }
+        int64_t point       = 0;
+        double cumulative   = 0.0;
+        double point_weight = 0.0;
+        for (std::size_t k = 0; k < column.size(); k++) {
+          cumulative += column[k].second;
+          point_weight += column[k].second;
+          bool is_last = k + 1 == column.size();
+          // Never split equal values between points
+          if (!is_last && column[k + 1].first == column[k].first) continue;
+          if (is_last || cumulative >= total_weight * (point + 1) / summary_size) {
+            value_accessor[{summary_shape.lo[0] + point, j}] = column[k].first;
+            weight_accessor[{summary_shape.lo[0] + point, j}] += point_weight;
+            point_weight = 0.0;
+            point        = std::min(point + 1, summary_size - 1);
+          }
+        }
+      }
+    }
+  }
+};
+
+class QuantileSketchTask : public Task<QuantileSketchTask, QUANTILE_SKETCH> {
+ public:
+  static void cpu_variant(legate::TaskContext context)
+  {
+    const auto& X = context.input(0).data();
+    type_dispatch_float(X.code(), quantile_sketch_fn(), context, 1);
+  }
+#ifdef LEGATEBOOST_USE_OPENMP
+  static void omp_variant(legate::TaskContext context)
+  {
+    const auto& X = context.input(0).data();
+    type_dispatch_float(X.code(), quantile_sketch_fn(), context, OmpMaxThreads());
+  }
+#endif
+};
+
+// Merges the summaries of every tile for a block of features
+// Each feature is merged independently, so threads take whole features
+struct quantile_merge_fn {
+  template <legate::Type::Code CODE>
+  void operator()(legate::TaskContext context, int num_threads)
+  {
+    using T                = legate::type_of<CODE>;
+    const auto& all_value  = context.input(0).data();
+    const auto& all_weight = context.input(1).data();
+    auto summary_shape     = all_value.shape<2>();
+    auto value_accessor    = all_value.read_accessor<double, 2>();
+    auto weight_accessor   = all_weight.read_accessor<double, 2>();
+    auto split_proposals   = context.output(0).data();
+    auto split_shape       = split_proposals.shape<2>();
+    auto num_bins          = split_shape.hi[0] - split_shape.lo[0] + 1;
+    auto split_accessor    = split_proposals.write_accessor<T, 2>();
+    if (split_shape.empty()) return;
+    EXPECT(num_bins > 0, "Expected at least one bin.");
+    EXPECT_AXIS_ALIGNED(1, summary_shape, split_shape);
+
+#pragma omp parallel num_threads(num_threads)
+    {
+      std::vector<std::pair<double, double>> merged;
+#pragma omp for schedule(dynamic)
+      for (int64_t j = split_shape.lo[1]; j <= split_shape.hi[1]; j++) {
+        merged.clear();
+        for (int64_t k = summary_shape.lo[0]; k <= summary_shape.hi[0]; k++) {
+          if (weight_accessor[{k, j}] <= 0.0) continue;
+          merged.push_back({value_accessor[{k, j}], weight_accessor[{k, j}]});
+        }
+        std::sort(merged.begin(), merged.end());
+        double total_weight = 0.0;
+        for (const auto& entry : merged) { total_weight += entry.second; }
+        std::size_t k     = 0;
+        double cumulative = merged.empty() ? 0.0 : merged[0].second;
+        for (int64_t bin = 0; bin < num_bins; bin++) {
+          // The last proposal is the maximum value so every row falls in some bin
+          double target =
+            bin == num_bins - 1 ? total_weight : total_weight * (bin + 1) / num_bins;
+          while (k + 1 < merged.size() && cumulative < target) {
+            cumulative += merged[++k].second;
+          }
+          if (bin == num_bins - 1 && !merged.empty()) { k = merged.size() - 1; }
+          split_accessor[{split_shape.lo[0] + bin, j}] =
+            merged.empty() ? T(0) : T(merged[k].first);
+        }
+      }
+    }
+  }
+};
+
+// Merges the summaries of every tile, with one task per block of features
+// The tiles and so the merged result do not depend on the number of processors
+class QuantileMergeTask : public Task<QuantileMergeTask, QUANTILE_MERGE> {
+ public:
+  static void cpu_variant(legate::TaskContext context)
+  {
+    const auto& split_proposals = context.output(0).data();
+    type_dispatch_float(split_proposals.code(), quantile_merge_fn(), context, 1);
+  }
+#ifdef LEGATEBOOST_USE_OPENMP
+  static void omp_variant(legate::TaskContext context)
+  {
+    const auto& split_proposals = context.output(0).data();
+    type_dispatch_float(split_proposals.code(), quantile_merge_fn(), context, OmpMaxThreads());
+  }
+#endif
+};
+
+}  // namespace legateboost
+
+namespace  // unnamed
+{
+static void __attribute__((constructor)) register_tasks(void)
+{
+  legateboost::QuantileSketchTask::register_variants();
+  legateboost::QuantileMergeTask::register_variants();
+}
+}  // namespace
@@ -0,0 +1,77 @@
+/* Copyright 2024 NVIDIA Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ *
+ */
+#include "legate.h"
+#include "legate_library.h"
+#include "legateboost.h"
+#include "utils.h"
+#include "quantise.h"
+
+namespace legateboost {
+
+namespace {
+template <typename T>
+struct quantise_fn {
+  template <legate::Type::Code BIN_CODE>
+  void operator()(legate::TaskContext context)
+  {
+    using BinT                  = legate::type_of<BIN_CODE>;
+    const auto& X               = context.input(0).data();
+    auto X_shape                = X.shape<2>();
+    auto X_accessor             = X.read_accessor<T, 2>();
+    const auto& split_proposals = context.input(1).data();
+    EXPECT_AXIS_ALIGNED(1, split_proposals.shape<2>(), X_shape);
+    EXPECT_IS_BROADCAST(split_proposals.shape<2>());
+    auto split_proposal_accessor = split_proposals.read_accessor<double, 2>();
+    auto num_bins        = split_proposals.shape<2>().hi[0] - split_proposals.shape<2>().lo[0] + 1;
+    const auto& X_binned = context.output(0).data();
+    EXPECT_AXIS_ALIGNED(0, X_binned.shape<2>(), X_shape);
+    EXPECT_AXIS_ALIGNED(1, X_binned.shape<2>(), X_shape);
+    auto X_binned_accessor = X_binned.write_accessor<BinT, 2>();
+
+    for (int64_t i = X_shape.lo[0]; i <= X_shape.hi[0]; i++) {
+      for (int64_t j = X_shape.lo[1]; j <= X_shape.hi[1]; j++) {
+        X_binned_accessor[{i, j}] =
+          FindBin(X_accessor[{i, j}], split_proposal_accessor, j, num_bins);
+      }
+    }
+  }
+};
+
+struct dispatch_fn {
+  template <legate::Type::Code CODE>
+  void operator()(legate::TaskContext context)
+  {
+    using T = legate::type_of<CODE>;
+    type_dispatch_bin(context.output(0).data().code(), quantise_fn<T>(), context);
+  }
+};
+}  // namespace
+
+/*static*/ void QuantiseTask::cpu_variant(legate::TaskContext context)
+{
+  const auto& X = context.input(0).data();
+  type_dispatch_float(X.code(), dispatch_fn(), context);
+}
+
+}  // namespace legateboost
+
+namespace  // unnamed
+{
+static void __attribute__((constructor)) register_tasks(void)
+{
+  legateboost::QuantiseTask::register_variants();
+}
+}  // namespace
@@ -0,0 +1,57 @@
+/* Copyright 2024 NVIDIA Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ *
+ */
+#pragma once
+#include "legate_library.h"
+#include "legateboost.h"
+#include <thrust/detail/config.h>
+
+namespace legateboost {
+
+// Split proposals are sorted ascending for each feature and a row goes left of
+// proposal b if x <= split_proposals[b, feature]
+// Returns the first bin whose proposal is >= x. Values larger than every proposal
+// (rows the sketch ignored) are placed in the last bin, so they never go left.
+// Missing values (NaN) are placed in bin num_bins, after every proposal.
+template <typename T, typename AccessorT>
+__host__ __device__ inline int32_t FindBin(T x,
+                                           const AccessorT& split_proposals,
+                                           int32_t feature,
+                                           int32_t num_bins)
+{
+  // Only NaN compares unequal to itself
+  if (x != x) return num_bins;
+  int32_t lo = 0;
+  int32_t hi = num_bins - 1;
+  while (lo < hi) {
+    int32_t mid = lo + (hi - lo) / 2;
+    if (split_proposals[{mid, feature}] < x) {
+      lo = mid + 1;
+    } else {
+      hi = mid;
+    }
+  }
+  return lo;
+}
+
+class QuantiseTask : public Task<QuantiseTask, QUANTISE> {
+ public:
+  static void cpu_variant(legate::TaskContext context);
+#ifdef LEGATEBOOST_USE_CUDA
+  static void gpu_variant(legate::TaskContext context);
+#endif
+};
+
+}  // namespace legateboost
@@ -16,12 +16,14 @@
 #include "legate_library.h"
 #include "legateboost.h"
 #include "utils.h"
+#include "build_tree.h"
+#include "predict.h"
 
 namespace legateboost {
 
 struct update_tree_fn {
   template <legate::Type::Code CODE>
-  void operator()(legate::TaskContext context)
+  void operator()(legate::TaskContext context, int num_threads)
   {
     using T           = legate::type_of<CODE>;
     const auto& X     = context.input(0).data();
@@ -33,63 +35,102 @@ struct update_tree_fn {
     const auto& h     = context.input(2).data();
     EXPECT_AXIS_ALIGNED(0, X.shape<2>(), g.shape<2>());
     EXPECT_AXIS_ALIGNED(0, g.shape<2>(), h.shape<2>());
-    EXPECT_AXIS_ALIGNED(1, g.shape<2>(), h.shape<2>());
     auto g_shape     = context.input(1).data().shape<2>();
     auto num_outputs = g.shape<2>().hi[1] - g.shape<2>().lo[1] + 1;
     auto g_accessor  = g.read_accessor<double, 2>();
-    auto h_accessor  = h.read_accessor<double, 2>();
+    auto h_accessor  = HessianAccessor(h, num_outputs);
 
     // Tree structure
-    auto feature     = context.input(3).data().read_accessor<int32_t, 1>();
-    auto split_value = context.input(4).data().read_accessor<double, 1>();
+    auto feature      = context.input(3).data().read_accessor<int32_t, 1>();
+    auto split_value  = context.input(4).data().read_accessor<double, 1>();
+    auto children     = context.input(5).data().read_accessor<int32_t, 2>();
+    auto default_left = context.input(6).data().read_accessor<bool, 1>();
+    auto categorical  = context.input(7).data().read_accessor<bool, 1>();
+    auto categories   = context.input(8).data().read_accessor<uint32_t, 2>();
+    auto num_words    = context.input(8).data().shape<2>().hi[1] -
+                        context.input(8).data().shape<2>().lo[1] + 1;
 
     // We should have the whole tree
     EXPECT_IS_BROADCAST(context.input(3).data().shape<1>());
     EXPECT_IS_BROADCAST(context.input(4).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(5).data().shape<2>());
+    EXPECT_IS_BROADCAST(context.input(6).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(7).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(8).data().shape<2>());
+
+    auto total_rows = context.scalars().at(0).value<int64_t>();
+
+    // Gradients are summed in fixed point so the tree does not depend on the number of workers
+    GPair max_abs = MaxAbsGradient(g_accessor, h_accessor, g_shape);
+    MaxAllReduce(context, reinterpret_cast<double*>(&max_abs), 2);
+    GradientQuantiser<int64_t> quantiser(max_abs, total_rows);
 
     auto feature_shape  = context.input(3).data().shape<1>();
     auto num_nodes      = feature_shape.hi[0] - feature_shape.lo[0] + 1;
     auto new_leaf_value = legate::create_buffer<double, 2>({num_nodes, num_outputs});
-    auto new_gradient   = legate::create_buffer<double, 2>({num_nodes, num_outputs});
     auto new_hessian    = legate::create_buffer<double, 2>({num_nodes, num_outputs});
+    auto new_sums = legate::create_buffer<IntegerGPair<int64_t>, 2>({num_nodes, num_outputs});
 
     for (int i = 0; i < num_nodes; i++) {
       for (int j = 0; j < num_outputs; j++) {
         new_leaf_value[{i, j}] = 0.0;
-        new_gradient[{i, j}]   = 0.0;
         new_hessian[{i, j}]    = 0.0;
+        new_sums[{i, j}]       = IntegerGPair<int64_t>{};
       }
     }
 
     // Walk through the tree and add the new statistics
-    for (int64_t i = X_shape.lo[0]; i <= X_shape.hi[0]; i++) {
-      int pos = 0;
-      // Use a max depth of 100 to avoid infinite loops
-      for (int depth = 0; depth < 100; depth++) {
+    // Each thread accumulates into its own copy of the statistics, the first thread uses the
+    // output buffers and the other copies are added to them
+    int64_t stats_size = num_nodes * num_outputs;
+    auto thread_stats  = legate::create_buffer<IntegerGPair<int64_t>, 1>(
+      std::max<int64_t>((num_threads - 1) * stats_size, 1));
+#pragma omp parallel num_threads(num_threads)
+    {
+      int thread = OmpThreadId();
+      IntegerGPair<int64_t>* sums =
+        thread == 0 ? new_sums.ptr({0, 0}) : thread_stats.ptr((thread - 1) * stats_size);
+      if (thread > 0) { std::fill(sums, sums + stats_size, IntegerGPair<int64_t>{}); }
+      // The fixed point gradient of a row is added to every node on its path
+      std::vector<IntegerGPair<int64_t>> gpair(num_outputs);
+#pragma omp for schedule(static)
+      for (int64_t i = X_shape.lo[0]; i <= X_shape.hi[0]; i++) {
         for (int k = 0; k < num_outputs; k++) {
-          new_gradient[{pos, k}] += g_accessor[{i, k}];
-          new_hessian[{pos, k}] += h_accessor[{i, k}];
+          gpair[k] = quantiser.Quantise(g_accessor[{i, k}], h_accessor[{i, k}], i, k);
+        }
+        int pos = 0;
+        // Children are numbered after their parent, so every row reaches a leaf
+        while (true) {
+          for (int k = 0; k < num_outputs; k++) { sums[pos * num_outputs + k] += gpair[k]; }
+          if (feature[pos] == -1) break;
+          auto x    = X_accessor[{i, feature[pos]}];
+          bool left = GoLeft(
+            x, split_value[pos], default_left[pos], categorical[pos], categories, pos, num_words);
+          pos = children[{pos, left ? 0 : 1}];
+        }
+      }
+#pragma omp for schedule(static)
+      for (int64_t i = 0; i < stats_size; i++) {
+        for (int t = 0; t < num_threads - 1; t++) {
+          new_sums.ptr({0, 0})[i] += thread_stats[t * stats_size + i];
         }
-        if (feature[pos] == -1) break;
-        auto x = X_accessor[{i, feature[pos]}];
-        pos    = x <= split_value[pos] ? pos * 2 + 1 : pos * 2 + 2;
       }
     }
+    thread_stats.destroy();
 
     // Sync the new statistics
-    SumAllReduce(context, new_gradient.ptr({0, 0}), num_nodes * num_outputs);
-    SumAllReduce(context, new_hessian.ptr({0, 0}), num_nodes * num_outputs);
+    SumAllReduce(context, reinterpret_cast<int64_t*>(new_sums.ptr({0, 0})), stats_size * 2);
 
     // Update tree
     for (int i = 0; i < num_nodes; i++) {
       for (int j = 0; j < num_outputs; j++) {
-        auto H = new_hessian[{i, j}];
+        auto [G, H] = quantiser.Dequantise(new_sums[{i, j}]);
         if (H > 0.0) {
-          new_leaf_value[{i, j}] = -new_gradient[{i, j}] / H;
+          new_leaf_value[{i, j}] = -G / H;
         } else {
           new_leaf_value[{i, j}] = 0.0;
         }
-        new_hessian[{i, j}] = new_hessian[{i, j}];
+        new_hessian[{i, j}] = H;
       }
     }
 
@@ -112,8 +153,15 @@ class UpdateTreeTask : public Task<UpdateTreeTask, UPDATE_TREE> {
   static void cpu_variant(legate::TaskContext context)
   {
     const auto& X = context.input(0).data();
-    type_dispatch_float(X.code(), update_tree_fn(), context);
+    type_dispatch_float(X.code(), update_tree_fn(), context, 1);
+  }
+#ifdef LEGATEBOOST_USE_OPENMP
+  static void omp_variant(legate::TaskContext context)
+  {
+    const auto& X = context.input(0).data();
+    type_dispatch_float(X.code(), update_tree_fn(), context, OmpMaxThreads());
   }
+#endif
 };
 
 }  // namespace legateboost
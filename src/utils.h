@@ -18,6 +18,10 @@
 #include "legate_library.h"
 #include <core/type/type_info.h>
 #include "core/comm/coll.h"
+#include <vector>
+#ifdef LEGATEBOOST_USE_OPENMP
+#include <omp.h>
+#endif
 
 namespace legateboost {
 
@@ -67,30 +71,117 @@ constexpr decltype(auto) type_dispatch_float(legate::Type::Code code, Functor f,
   return f.template operator()<legate::Type::Code::FLOAT32>(std::forward<Fnargs>(args)...);
 }
 
+// Task bodies are shared by the CPU and OpenMP variants and take the number of threads to use
+// The CPU variant runs on a single core so always uses one thread
+inline int OmpMaxThreads()
+{
+#ifdef LEGATEBOOST_USE_OPENMP
+  return omp_get_max_threads();
+#else
+  return 1;
+#endif
+}
+
+inline int OmpThreadId()
+{
+#ifdef LEGATEBOOST_USE_OPENMP
+  return omp_get_thread_num();
+#else
+  return 0;
+#endif
+}
+
+// Quantised features are stored as the smallest unsigned type holding every bin index
+template <typename Functor, typename... Fnargs>
+constexpr decltype(auto) type_dispatch_bin(legate::Type::Code code, Functor f, Fnargs&&... args)
+{
+  switch (code) {
+    case legate::Type::Code::UINT8: {
+      return f.template operator()<legate::Type::Code::UINT8>(std::forward<Fnargs>(args)...);
+    }
+    case legate::Type::Code::UINT16: {
+      return f.template operator()<legate::Type::Code::UINT16>(std::forward<Fnargs>(args)...);
+    }
+    default: break;
+  }
+  EXPECT(false, "Expected quantised data.");
+  return f.template operator()<legate::Type::Code::UINT8>(std::forward<Fnargs>(args)...);
+}
+
 template <typename T>
-void SumAllReduce(legate::TaskContext context, T* x, int count)
+legate::comm::coll::CollDataType CollType()
+{
+  if (std::is_same<T, float>::value) return legate::comm::coll::CollDataType::CollFloat;
+  if (std::is_same<T, double>::value) return legate::comm::coll::CollDataType::CollDouble;
+  if (std::is_same<T, int32_t>::value) return legate::comm::coll::CollDataType::CollInt;
+  if (std::is_same<T, int64_t>::value) return legate::comm::coll::CollDataType::CollInt64;
+  EXPECT(false, "Unsupported type.");
+  return legate::comm::coll::CollDataType::CollDouble;
+}
+
+// Gather count elements of x from every rank
+// The result is ordered by rank and has size num_ranks * count
+template <typename T>
+std::vector<T> AllGather(legate::TaskContext context, const T* x, int count)
 {
   auto domain      = context.get_launch_domain();
   size_t num_ranks = domain.get_volume();
   EXPECT(num_ranks == 1 || context.num_communicators() > 0,
          "Expected a CPU communicator for multi-rank task.");
-  if (count == 0 || context.num_communicators() == 0) return;
+  if (count == 0 || context.num_communicators() == 0) { return std::vector<T>(x, x + count); }
   auto comm = context.communicator(0);
   std::vector<T> gather_result(num_ranks * count);
-  legate::comm::coll::CollDataType type;
-  if (std::is_same<T, float>::value)
-    type = legate::comm::coll::CollDataType::CollFloat;
-  else if (std::is_same<T, double>::value)
-    type = legate::comm::coll::CollDataType::CollDouble;
-  else
-    EXPECT(false, "Unsupported type.");
   auto result = legate::comm::coll::collAllgather(
-    x, gather_result.data(), count, type, comm.get<legate::comm::coll::CollComm>());
+    x, gather_result.data(), count, CollType<T>(), comm.get<legate::comm::coll::CollComm>());
   EXPECT(result == legate::comm::coll::CollSuccess, "CPU communicator failed.");
+  return gather_result;
+}
+
+template <typename T>
+void SumAllReduce(legate::TaskContext context, T* x, int count)
+{
+  auto domain      = context.get_launch_domain();
+  size_t num_ranks = domain.get_volume();
+  if (num_ranks == 1 || count == 0) return;
+  auto gather_result = AllGather(context, x, count);
   for (std::size_t j = 0; j < count; j++) { x[j] = 0.0; }
   for (std::size_t i = 0; i < num_ranks; i++) {
     for (std::size_t j = 0; j < count; j++) { x[j] += gather_result[i * count + j]; }
   }
 }
 
+// Sums x over every rank, where x holds num_ranks blocks of count elements
+// Rank i receives only the sum of block i
+template <typename T>
+std::vector<T> SumReduceScatter(legate::TaskContext context, const T* x, int count)
+{
+  auto domain      = context.get_launch_domain();
+  size_t num_ranks = domain.get_volume();
+  EXPECT(num_ranks == 1 || context.num_communicators() > 0,
+         "Expected a CPU communicator for multi-rank task.");
+  if (count == 0 || context.num_communicators() == 0) { return std::vector<T>(x, x + count); }
+  auto comm = context.communicator(0);
+  std::vector<T> blocks(num_ranks * count);
+  auto result = legate::comm::coll::collAlltoall(
+    x, blocks.data(), count, CollType<T>(), comm.get<legate::comm::coll::CollComm>());
+  EXPECT(result == legate::comm::coll::CollSuccess, "CPU communicator failed.");
+  std::vector<T> sum(count, 0);
+  for (std::size_t i = 0; i < num_ranks; i++) {
+    for (std::size_t j = 0; j < count; j++) { sum[j] += blocks[i * count + j]; }
+  }
+  return sum;
+}
+
+template <typename T>
+void MaxAllReduce(legate::TaskContext context, T* x, int count)
+{
+  auto domain      = context.get_launch_domain();
+  size_t num_ranks = domain.get_volume();
+  if (num_ranks == 1 || count == 0) return;
+  auto gather_result = AllGather(context, x, count);
+  for (std::size_t i = 0; i < num_ranks; i++) {
+    for (std::size_t j = 0; j < count; j++) { x[j] = std::max(x[j], gather_result[i * count + j]); }
+  }
+}
+
 }  // namespace legateboost